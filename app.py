@@ -3,22 +3,50 @@ import json
 import datetime
 import re
 import io
+import gzip
+import hashlib
 import smtplib
-from datetime import datetime
+import shutil
+import tempfile
+import threading
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+import time
 from functools import wraps
+from collections import OrderedDict
 from flask import (
     Flask, request, jsonify, render_template, session,
-    redirect, url_for, make_response, send_file
+    redirect, url_for, make_response, send_file, Response,
+    stream_with_context, g, Request
 )
 from werkzeug.utils import secure_filename
-from openai import OpenAI
 from email.mime.text import MIMEText
-from utils import allowed_file, extract_text_from_file
+from utils import allowed_file, extract_pdf_text, extract_text_from_stream, prune_old_files
+from cache import ResultCache, make_key
+from jobs import JobQueue, JobStore, QueueFull
+from parsing import (
+    JsonArrayStreamParser, clean_question, clean_flashcard, parse_json_array, parse_json_object,
+    parse_quiz_items, parse_flashcard_items
+)
+from storage import Storage, DuplicateEmail, QUIZ_FIELDS
+from llm import create_gateway, current_user, RateLimited
+from summarize import count_tokens, chunk_text, map_reduce_summary
+from dedup import LSHIndex, signature
+from export import PdfCache, write_export_zip
+from batch import (
+    LocalBatchRunner, OpenAIBatchRunner, Throughput, create_extract_pool,
+    extract_files, unpack_zip
+)
+from bank import source_key, valid_question, question_key, new_questions, sample_questions, top_up
+from attempts import AttemptWriter, grade_attempt, with_answers
+from assets import StaticAssets
+from sessions import ServerSessionInterface, create_session_store
+import metrics
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
 
 # Optional: enable CORS in development to allow fetch from another origin
 try:
@@ -41,35 +69,561 @@ if HAVE_FLASK_CORS:
 # Limit upload size (default 16MB, configurable via env)
 app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("MAX_UPLOAD_BYTES", 16 * 1024 * 1024))
 
-# --- OpenAI client (check API key) ---
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise RuntimeError("OPENAI_API_KEY environment variable missing. Add it to .env before running.")
-client = OpenAI(api_key=OPENAI_API_KEY)
+# --- Model gateway (OpenAI client behind rate limits, retries and coalescing) ---
+# LLM_BACKEND=stub swaps in a local fake model for offline load tests
+gateway = create_gateway()
 
 # --- Upload folder ---
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# --- In-memory stores (dev only) ---
-users = [
-    {
-        "id": 1,
-        "name": "John Doe",
-        "email": "john@example.com",
-        "password": generate_password_hash("password"),  # hashed dev password
-        "quizzes": []
-    }
-]
-leaderboard = []
+# --- Upload streaming + raw file retention ---
+# TXT/DOCX are parsed straight from the request stream. Small PDFs stay in
+# memory; larger ones are spooled once to a named temp file that the upload
+# job takes over, so the bytes are never copied again.
+# UPLOAD_RETENTION=keep moves raw uploads into UPLOAD_FOLDER (pruned after
+# UPLOAD_RETENTION_SECONDS, 0 = never); the default drops them after extraction.
+UPLOAD_RETENTION = os.getenv("UPLOAD_RETENTION", "none").lower()
+UPLOAD_RETENTION_SECONDS = int(os.getenv("UPLOAD_RETENTION_SECONDS", 0))
+PDF_SPOOL_MEMORY_BYTES = int(os.getenv("PDF_SPOOL_MEMORY_BYTES", 512 * 1024))
+UPLOAD_SPOOL_DIR = os.path.join(UPLOAD_FOLDER, ".spool")
+# Spooled PDFs are removed by their job; anything older than this was orphaned
+# by a crash or restart mid-upload
+UPLOAD_SPOOL_MAX_AGE_SECONDS = int(os.getenv("UPLOAD_SPOOL_MAX_AGE_SECONDS", 24 * 3600))
+os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if filename and filename.lower().endswith(".pdf"):
+            if total_content_length is not None and total_content_length <= PDF_SPOOL_MEMORY_BYTES:
+                return io.BytesIO()
+            spooled = tempfile.NamedTemporaryFile(
+                "wb+", dir=UPLOAD_SPOOL_DIR, prefix="upload-", suffix=".pdf", delete=False
+            )
+            self.__dict__.setdefault("spooled_paths", []).append(spooled.name)
+            return spooled
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+    @property
+    def max_content_length(self):
+        # Course-wide batch uploads get their own, larger limit
+        if self.path == "/batch_upload":
+            return BATCH_MAX_UPLOAD_BYTES
+        return super().max_content_length
+
+app.request_class = UploadRequest
+
+@app.teardown_request
+def remove_unclaimed_spool_files(exc):
+    # Spooled files not handed to an upload job (e.g. rejected requests)
+    for path in request.__dict__.get("spooled_paths", ()):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# --- Result cache (summaries / quizzes / flashcards keyed on content hash) ---
+cache = ResultCache(
+    os.getenv("CACHE_PATH", os.path.join(app.instance_path, "cache.db")),
+    ttl_seconds=int(os.getenv("CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", 5000)),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", 200 * 1024 * 1024)),
+    touch_seconds=int(os.getenv("CACHE_TOUCH_SECONDS", 300))
+)
+
+# Combined summary + quiz + flashcards generation for uploads (one model call)
+COMBINED_GENERATION = os.getenv("COMBINED_GENERATION", "true").lower() == "true"
+
+# --- Upload job pool (caps concurrent extract -> summarize -> quiz pipelines) ---
+# Job status lives in SQLite so any worker process can answer a poll
+job_store = JobStore(os.getenv("JOB_PATH", os.path.join(app.instance_path, "jobs.db")))
+upload_jobs = JobQueue(
+    max_workers=int(os.getenv("UPLOAD_WORKERS", 4)),
+    max_pending=int(os.getenv("UPLOAD_QUEUE_LIMIT", 100)),
+    name="upload-job",
+    observer=lambda stage, seconds: metrics.STAGE_SECONDS.observe(seconds, stage=stage),
+    store=job_store
+)
+
+# --- PDF export: per-quiz PDF cache + background "export all" zip jobs ---
+EXPORT_FOLDER = os.getenv("EXPORT_FOLDER", os.path.join(app.instance_path, "exports"))
+EXPORT_ZIP_FOLDER = os.path.join(EXPORT_FOLDER, "zip")
+EXPORT_ZIP_TTL_SECONDS = int(os.getenv("EXPORT_ZIP_TTL_SECONDS", 3600))
+os.makedirs(EXPORT_ZIP_FOLDER, exist_ok=True)
+pdf_cache = PdfCache(os.path.join(EXPORT_FOLDER, "pdf"),
+                     max_bytes=int(os.getenv("PDF_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+                     max_age_seconds=int(os.getenv("PDF_CACHE_MAX_AGE_SECONDS", 30 * 24 * 3600)))
+export_jobs = JobQueue(
+    max_workers=int(os.getenv("EXPORT_WORKERS", 1)),
+    max_pending=int(os.getenv("EXPORT_QUEUE_LIMIT", 20)),
+    ttl_seconds=EXPORT_ZIP_TTL_SECONDS,
+    name="export-job",
+    observer=lambda stage, seconds: metrics.STAGE_SECONDS.observe(seconds, stage=f"export_{stage}"),
+    store=job_store
+)
+
+# --- Batch ingestion (python batch.py ... / POST /batch_upload) ---
+# BATCH_BACKEND=openai sends prompts through the OpenAI Batch API (cheaper,
+# completes within 24h); "local" runs the same requests through the gateway.
+BATCH_FOLDER = os.getenv("BATCH_FOLDER", os.path.join(app.instance_path, "batches"))
+BATCH_BACKEND = os.getenv("BATCH_BACKEND", "local").lower()
+BATCH_WINDOW = int(os.getenv("BATCH_WINDOW", 100))
+BATCH_EXTRACT_WORKERS = int(os.getenv("BATCH_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", 30))
+BATCH_MAX_UPLOAD_BYTES = int(os.getenv("BATCH_MAX_UPLOAD_BYTES", 256 * 1024 * 1024))
+BATCH_MAX_UNZIPPED_BYTES = int(os.getenv("BATCH_MAX_UNZIPPED_BYTES", 1024 * 1024 * 1024))
+batch_jobs = JobQueue(
+    max_workers=1,
+    max_pending=int(os.getenv("BATCH_QUEUE_LIMIT", 10)),
+    ttl_seconds=24 * 3600,
+    name="batch-job",
+    observer=lambda stage, seconds: metrics.STAGE_SECONDS.observe(seconds, stage=f"batch_{stage}"),
+    store=job_store
+)
+
+# --- Chunk summary pool (shared cap on parallel per-chunk summary calls) ---
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 3000))
+QUIZ_INPUT_TOKENS = int(os.getenv("QUIZ_INPUT_TOKENS", 6000))
+summary_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SUMMARY_CONCURRENCY", 4)),
+    thread_name_prefix="summary-chunk"
+)
+
+# --- Model + prompt templates (part of the cache key, so edits invalidate old entries) ---
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+SUMMARY_PROMPT = (
+    "Summarize the following notes as clear, concise bullet points. "
+    "Use plain hyphens (-) for bullets, keep each point short (max 20 words), "
+    "and do not include headings, numbering, or extra text:\n\n"
+    "{content}:"
+)
+
+MERGE_SUMMARY_PROMPT = (
+    "The following are bullet-point summaries of consecutive sections of the same notes. "
+    "Merge them into one set of clear, concise bullet points, removing repetition. "
+    "Use plain hyphens (-) for bullets, keep each point short (max 20 words), "
+    "and do not include headings, numbering, or extra text:\n\n"
+    "{summaries}"
+)
+
+QUIZ_PROMPT = (
+    "Create 10 multiple-choice questions from the following study notes. "
+    "Return ONLY valid JSON in this exact format: "
+    '[{{"question": "...", "options": {{"A": "...", "B": "...", "C": "...", "D": "..."}}, "answer": "B"}}]. '
+    "No explanations, no extra text, only JSON.\n\n"
+    "Difficulty: {difficulty}.\n\nNotes:\n{text}"
+)
+
+# Bank refills: more questions on the same notes without repeating banked ones
+QUIZ_MORE_PROMPT = (
+    "Create 10 new multiple-choice questions from the following study notes. "
+    "Do not repeat or reword any of these existing questions:\n{existing}\n\n"
+    "Return ONLY valid JSON in this exact format: "
+    '[{{"question": "...", "options": {{"A": "...", "B": "...", "C": "...", "D": "..."}}, "answer": "B"}}]. '
+    "No explanations, no extra text, only JSON.\n\n"
+    "Difficulty: {difficulty}.\n\nNotes:\n{text}"
+)
+
+# One completion for everything the upload flow needs (saves resending the notes)
+STUDY_PACK_PROMPT = (
+    "From the following study notes, produce a summary, a quiz and flashcards. "
+    "Return ONLY valid JSON in this exact format: "
+    '{{"summary": ["- short bullet point", "..."], '
+    '"questions": [{{"question": "...", "options": {{"A": "...", "B": "...", "C": "...", "D": "..."}}, "answer": "B"}}], '
+    '"flashcards": [{{"question": "...", "answer": "..."}}]}}. '
+    "The summary is clear, concise bullet points (max 20 words each, plain hyphens, no headings). "
+    "Write exactly 10 multiple-choice questions and 10 concise flashcards. "
+    "No explanations, no extra text, only JSON.\n\n"
+    "Difficulty: {difficulty}.\n\nNotes:\n{text}"
+)
+
+FLASHCARDS_PROMPT = """
+    Create concise flashcards from the following text.
+    Respond in JSON array format where each item has:
+    - question (string)
+    - answer (string)
+
+    Text:
+    {summary}
+    """
+
+# All wrong answers of a quiz in one completion; ids map replies back to items
+EXPLAIN_PROMPT = (
+    "A student answered the following quiz questions. For each item, explain in 2-3 sentences "
+    "why the correct answer is right and why the student's choice is wrong. "
+    'Return ONLY valid JSON in this exact format: [{{"id": 1, "explanation": "..."}}], '
+    "one entry per item, no extra text.\n\n{items}"
+)
+
+# --- Storage (SQLite, shared by all worker processes) ---
+storage = Storage(os.getenv("DATABASE_PATH", os.path.join(app.instance_path, "students.db")))
+
+# --- Sessions + auth (config read once at startup) ---
+# Session data lives server-side (SESSION_BACKEND=sqlite|memory); the cookie
+# only carries the id. Static assets skip the session entirely.
+AUTO_LOGIN = os.getenv("AUTO_LOGIN", "true").lower() == "true"
+app.session_interface = ServerSessionInterface(
+    create_session_store(
+        os.getenv("SESSION_BACKEND", "sqlite").lower(),
+        os.getenv("SESSION_PATH", os.path.join(app.instance_path, "sessions.db")),
+        max_entries=int(os.getenv("SESSION_CACHE_ENTRIES", 10000)),
+        local_ttl=float(os.getenv("SESSION_CACHE_SECONDS", 5))
+    ),
+    ttl_seconds=int(os.getenv("SESSION_TTL_SECONDS", 7 * 24 * 3600)),
+    skip_prefixes=[app.static_url_path + "/"]
+)
+
+# Password hashing is deliberately slow. At most PASSWORD_HASH_WORKERS hashes
+# run at once, on the request thread; a sign-in beyond that gets a 503 straight
+# away rather than holding a request thread (or an ASGI adapter thread) while
+# it waits for a turn.
+password_slots = threading.BoundedSemaphore(int(os.getenv("PASSWORD_HASH_WORKERS", 2)))
+
+def run_password_work(fn, *args):
+    # Raises QueueFull when every hashing slot is busy
+    if not password_slots.acquire(blocking=False):
+        raise QueueFull("Too many sign-ins in progress, try again shortly")
+    try:
+        with metrics.stage("password"):
+            return fn(*args)
+    finally:
+        password_slots.release()
+
+# --- Near-duplicate index (MinHash/LSH over extracted upload text) ---
+# Uploads at least NEAR_DUP_THRESHOLD similar to a processed document reuse
+# its summary, questions and flashcards. The index lives in memory and is
+# caught up from the document table, so documents added by other workers
+# are picked up on the next lookup.
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", 0.9))
+doc_index = LSHIndex()
+_doc_index_lock = threading.Lock()
+
+def sync_document_index():
+    with _doc_index_lock:
+        for doc_id, sig in storage.iter_document_signatures(doc_index.last_id):
+            doc_index.add(doc_id, sig)
+
+def find_near_duplicate(sig, difficulty):
+    sync_document_index()
+    for score, doc_id in doc_index.query(sig, NEAR_DUP_THRESHOLD):
+        doc = storage.get_document(doc_id)
+        if doc and doc["difficulty"] == difficulty:
+            return doc, score
+    return None
+
+def remember_document(content, sig, difficulty, summary, questions, flashcards):
+    storage.add_document(
+        make_key(content), sig, difficulty, summary, questions, flashcards, datetime.now().isoformat()
+    )
+    sync_document_index()
+
+# --- Application factory ---
+# gunicorn "app:create_app()" (see gunicorn.conf.py), asgi.py and `python app.py`
+# call create_app(). Importing the module only defines the app; one-off
+# startup work happens here, and heavy libraries (model SDK, PDF/DOCX
+# parsers, reportlab) load on first use. Serving `app:app` directly still
+# works: the first request runs the same startup.
+_startup_lock = threading.Lock()
+_started = False
+
+def create_app():
+    global _started
+    with _startup_lock:
+        if not _started:
+            if not storage.has_users():
+                # Dev user for AUTO_LOGIN; hashed only when the database is empty
+                storage.seed_user(1, "John Doe", "john@example.com", generate_password_hash("password"))
+            sync_document_index()
+            static_assets.load()
+            _started = True
+    return app
+
+@app.before_request
+def ensure_started():
+    if not _started:
+        create_app()
+
+# --- Question bank (shared by all users quizzing on the same text) ---
+# Quizzes are sampled from the banked questions for a text and difficulty;
+# the model is only called when the bank can't fill a quiz. When a user has
+# fewer than QUIZ_SIZE banked questions they haven't just seen (and the bank is
+# below QUESTION_BANK_TARGET) a background refill asks for new questions, and
+# near-duplicates (TF-IDF cosine >= QUESTION_DUP_THRESHOLD) are dropped.
+QUIZ_SIZE = int(os.getenv("QUIZ_SIZE", 10))
+QUESTION_BANK_TARGET = int(os.getenv("QUESTION_BANK_TARGET", 40))
+QUESTION_DUP_THRESHOLD = float(os.getenv("QUESTION_DUP_THRESHOLD", 0.8))
+bank_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BANK_REFILL_WORKERS", 2)),
+    thread_name_prefix="bank-refill"
+)
+_bank_lock = threading.Lock()
+_bank_refilling = set()
+# (source, difficulty) -> bank size at which a refill found nothing new; LRU-bounded
+_bank_exhausted = OrderedDict()
+BANK_EXHAUSTED_ENTRIES = 10000
+
+def bank_add(source, difficulty, questions):
+    # Serialised so concurrent adds can't each let in the same near-duplicate
+    with _bank_lock:
+        banked = storage.bank_questions(source, difficulty)
+        fresh = new_questions(banked, questions, QUESTION_DUP_THRESHOLD)
+        if fresh:
+            storage.add_bank_questions(
+                source, difficulty, [(question_key(q), q) for q in fresh], datetime.now().isoformat()
+            )
+        return banked + fresh
+
+def schedule_bank_refill(text, source, difficulty, bank, exclude=()):
+    # Refill only when this user has less than a quiz's worth of questions left to see
+    key = (source, difficulty)
+    size = len(bank)
+    unserved = sum(1 for q in bank if question_key(q) not in exclude)
+    with _bank_lock:
+        if size >= QUESTION_BANK_TARGET or unserved >= QUIZ_SIZE or key in _bank_refilling:
+            return
+        if key in _bank_exhausted:
+            _bank_exhausted.move_to_end(key)
+            if _bank_exhausted[key] == size:
+                return
+        _bank_refilling.add(key)
+    bank_pool.submit(refill_bank, text, source, difficulty)
+
+def refill_bank(text, source, difficulty):
+    key = (source, difficulty)
+    try:
+        banked = storage.bank_questions(source, difficulty)
+        quiz = generate_quiz_from_text(text, difficulty, avoid=banked)
+        if len(bank_add(source, difficulty, quiz["questions"])) == len(banked):
+            # Nothing new came back; don't ask again until the bank changes
+            with _bank_lock:
+                _bank_exhausted[key] = len(banked)
+                _bank_exhausted.move_to_end(key)
+                if len(_bank_exhausted) > BANK_EXHAUSTED_ENTRIES:
+                    _bank_exhausted.popitem(last=False)
+    except Exception as e:
+        print("Question bank refill failed:", e)
+    finally:
+        with _bank_lock:
+            _bank_refilling.discard(key)
+
+def recent_question_keys(user_id):
+    latest = storage.latest_quiz(user_id) if user_id else None
+    if not latest:
+        return set()
+    return {question_key(q) for q in latest["questions"] if valid_question(q)}
+
+def assemble_quiz(text, difficulty="Easy", exclude=()):
+    source = source_key(text)
+    with metrics.stage("bank"):
+        bank = storage.bank_questions(source, difficulty)
+    generated = []
+    if len(bank) < QUIZ_SIZE:
+        quiz = generate_quiz_from_text(text, difficulty)
+        bank = bank_add(source, difficulty, quiz["questions"])
+        if not bank:
+            return quiz  # nothing bankable (e.g. questions without an answer key)
+        generated = quiz["questions"]
+    return quiz_from_bank(text, source, difficulty, bank, generated, exclude)
+
+def quiz_from_bank(text, source, difficulty, bank, generated=(), exclude=()):
+    schedule_bank_refill(text, source, difficulty, bank, exclude)
+    if len(bank) < QUIZ_SIZE:
+        # Dedup left the bank short of a full quiz: serve the questions just
+        # generated, topped up from the bank, rather than a short quiz
+        return {"questions": top_up(top_up([], generated, QUIZ_SIZE), bank, QUIZ_SIZE)}
+    return {"questions": sample_questions(bank, QUIZ_SIZE, exclude)}
+
+# --- Answer explanations: batched per quiz, cached per question + chosen option ---
+# EXPLAIN_PRECOMPUTE=true explains every distractor in the background as soon
+# as a quiz is created, so reviews after submitting are all cache hits.
+EXPLAIN_BATCH_SIZE = int(os.getenv("EXPLAIN_BATCH_SIZE", 10))
+EXPLAIN_PRECOMPUTE = os.getenv("EXPLAIN_PRECOMPUTE", "false").lower() == "true"
+explain_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("EXPLAIN_WORKERS", 1)),
+    thread_name_prefix="explain"
+)
+
+def explanation_key(q, chosen):
+    return make_key("explanation", EXPLAIN_PROMPT, OPENAI_MODEL, q["question"], q.get("options"), q["answer"], chosen)
+
+def explain_answers(items):
+    # items: [(question, chosen option)] -> explanations in the same order.
+    # Cached ones are reused; the rest go out EXPLAIN_BATCH_SIZE per completion.
+    keys = [explanation_key(q, chosen) for q, chosen in items]
+    found = {}
+    missing = {}
+    for key, item in zip(keys, items):
+        if key in found or key in missing:
+            continue
+        cached = cache.get(key)
+        if cached is not None:
+            found[key] = cached
+        else:
+            missing[key] = item
+    pending = list(missing.items())
+    for start in range(0, len(pending), EXPLAIN_BATCH_SIZE):
+        found.update(request_explanations(pending[start:start + EXPLAIN_BATCH_SIZE]))
+    return [found.get(key) or fallback_explanation(q) for key, (q, _) in zip(keys, items)]
+
+def request_explanations(batch):
+    # batch: [(cache key, (question, chosen))] -> {cache key: explanation}
+    lines = []
+    for i, (_, (q, chosen)) in enumerate(batch, 1):
+        options = q.get("options") or {}
+        lines.append(f"{i}. Question: {q['question']}")
+        if options:
+            lines.append("   Options: " + "; ".join(f"{k}) {v}" for k, v in options.items()))
+        lines.append(f"   Correct answer: {q['answer']}\n   Student chose: {chosen}")
+    resp = gateway.chat(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a patient teacher explaining quiz answers."},
+            {"role": "user", "content": EXPLAIN_PROMPT.format(items="\n".join(lines))}
+        ],
+        max_tokens=min(4000, 160 * len(batch)),
+        temperature=0.3
+    )
+    with metrics.stage("parse"):
+        items, _ = parse_json_array(resp.choices[0].message.content)
+    explained = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        n, text = item.get("id"), item.get("explanation")
+        if isinstance(n, int) and 1 <= n <= len(batch) and isinstance(text, str) and text.strip():
+            key = batch[n - 1][0]
+            explained[key] = text.strip()
+            cache.set(key, explained[key], "explanation")
+    return explained
+
+def fallback_explanation(q):
+    # Items the model skipped: state the answer, don't cache
+    answer = q["answer"]
+    text = (q.get("options") or {}).get(answer)
+    return f"The correct answer is {answer}: {text}." if text else f"The correct answer is {answer}."
+
+def schedule_explanations(questions):
+    if not EXPLAIN_PRECOMPUTE:
+        return
+    items = [(q, option) for q in questions if valid_question(q) for option in q["options"] if option != q["answer"]]
+    if items:
+        explain_pool.submit(precompute_explanations, items)
+
+def precompute_explanations(items):
+    try:
+        explain_answers(items)
+    except Exception as e:
+        print("Explanation precompute failed:", e)
+
+# --- Quiz attempts: graded server-side, written by one group-committing thread ---
+attempt_writer = AttemptWriter(
+    storage,
+    max_batch=int(os.getenv("ATTEMPT_BATCH_MAX", 500)),
+    linger=float(os.getenv("ATTEMPT_LINGER_MS", 2)) / 1000
+)
+ATTEMPT_WRITE_TIMEOUT = float(os.getenv("ATTEMPT_WRITE_TIMEOUT", 10))
+
+def store_served_quiz(user_id, summary, questions, difficulty):
+    # Keeps the answer key on the server so /save_attempt can grade against it
+    if not questions or not storage.get_user(user_id):
+        return None
+    quiz_id = storage.add_quiz(
+        user_id, datetime.now().isoformat(), questions, summary=summary, difficulty=difficulty
+    )["id"]
+    schedule_explanations(questions)
+    return quiz_id
+
+# --- Metrics: request latency, queue depths, cache hit rates ---
+# With PROFILING_ENABLED=true, send "X-Profile: 1" to get the per-stage breakdown
+# back in Server-Timing
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+
+metrics.GaugeCallback("notes2quiz_upload_queue_depth", "Upload jobs queued or running", upload_jobs.pending)
+metrics.GaugeCallback("notes2quiz_summary_queue_depth", "Chunk summaries waiting for a worker",
+                      lambda: summary_pool._work_queue.qsize())
+metrics.GaugeCallback("notes2quiz_llm_in_flight", "Distinct model calls in flight",
+                      lambda: gateway.stats()["in_flight"])
+metrics.GaugeCallback("notes2quiz_cache_lookups_total", "Result cache lookups",
+                      lambda: {"hit": cache.hits, "miss": cache.misses}, label="result", kind="counter")
+metrics.GaugeCallback("notes2quiz_cache_hit_ratio", "Result cache hit ratio since start",
+                      lambda: cache.hits / max(1, cache.hits + cache.misses))
+metrics.GaugeCallback("notes2quiz_attempt_queue_depth", "Graded attempts waiting to be committed",
+                      attempt_writer.pending)
+metrics.GaugeCallback("notes2quiz_attempt_commits_total", "Attempt log commits and attempts written",
+                      lambda: {"batches": attempt_writer.batches, "attempts": attempt_writer.written},
+                      label="kind", kind="counter")
+metrics.GaugeCallback("notes2quiz_pdf_cache_lookups_total", "Rendered PDF cache lookups",
+                      lambda: {"hit": pdf_cache.hits, "miss": pdf_cache.misses}, label="result", kind="counter")
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profile = metrics.start_profile() if PROFILING_ENABLED and request.headers.get("X-Profile") else None
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.get("request_started", time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    if g.get("profile") is not None:
+        breakdown = g.profile + [("total", elapsed)]
+        response.headers["Server-Timing"] = metrics.server_timing(breakdown)
+        response.headers["X-Stage-Breakdown"] = json.dumps({name: round(sec, 6) for name, sec in breakdown})
+        metrics.stop_profile()
+    return response
 
 # --- Dev convenience: auto-login (toggle with AUTO_LOGIN env) ---
 @app.before_request
 def auto_login():
-    if os.getenv("AUTO_LOGIN", "true").lower() == "true":
-        if "user_id" not in session:
-            session["user_id"] = 1
+    if request.endpoint == "static":
+        return
+    if AUTO_LOGIN and "user_id" not in session:
+        # Not persisted: cookieless requests must not each create a stored session
+        session.set_unsaved("user_id", 1)
+    # Model calls made while handling this request count against this user
+    current_user.set(session.get("user_id"))
+
+# --- Static assets + page caching ---
+# After `python assets.py`, templates link to content-hashed copies under
+# /static/dist/, served precompressed with a one-year immutable lifetime.
+# Unbuilt or unhashed files fall back to Flask's static handler.
+# Pages carry an ETag and revalidate on every visit (304 when unchanged);
+# pages without per-user context are rendered and gzipped once per process.
+static_assets = StaticAssets(app.static_folder, app.static_url_path,
+                             max_age=int(os.getenv("STATIC_MAX_AGE", 365 * 24 * 3600)))
+app.add_template_global(static_assets.url, "asset_url")
+
+def serve_static(filename):
+    if static_assets.is_hashed(filename):
+        return static_assets.send(filename, request.accept_encodings)
+    return app.send_static_file(filename)
+
+app.view_functions["static"] = serve_static
+
+_page_cache = {}
+
+def render_page(template, **context):
+    entry = None if context or app.debug else _page_cache.get(template)
+    if entry is None:
+        body = render_template(template, **context).encode("utf-8")
+        entry = (body, gzip.compress(body, 6, mtime=0), hashlib.sha256(body).hexdigest()[:32])
+        if not context:
+            _page_cache[template] = entry
+    body, compressed, etag = entry
+    gzipped = request.accept_encodings.quality("gzip") > 0 and len(compressed) < len(body)
+    response = make_response(compressed if gzipped else body)
+    response.mimetype = "text/html"
+    if gzipped:
+        response.headers["Content-Encoding"] = "gzip"
+    response.set_etag(etag + ("-gz" if gzipped else ""))
+    response.vary.add("Accept-Encoding")
+    response.cache_control.no_cache = True
+    if context:
+        response.cache_control.private = True
+    return response.make_conditional(request)
 
 # --- Email sending helper ---
 def send_welcome_email(user_email):
@@ -100,40 +654,226 @@ def clean_summary(text):
     text = re.sub(r"\n{3,}", "\n\n", text)
     return text.strip()
 
-# --- Quiz generation using OpenAI (robust parsing) ---
-def generate_quiz_from_text(text, difficulty="Easy"):
-    prompt = (
-        f"Create 10 multiple-choice questions from the following study notes. "
-        f"Return ONLY valid JSON in this exact format: "
-        f'[{{"question": "...", "options": {{"A": "...", "B": "...", "C": "...", "D": "..."}}, "answer": "B"}}]. '
-        f"No explanations, no extra text, only JSON.\n\n"
-        f"Difficulty: {difficulty}.\n\nNotes:\n{text}"
+# --- Summary generation (map-reduce over chunks, each chunk cached) ---
+def summary_key(content):
+    return make_key("summary", SUMMARY_PROMPT, OPENAI_MODEL, content)
+
+def summary_request(content):
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant who summarizes text clearly."},
+            {"role": "user", "content": SUMMARY_PROMPT.format(content=content)}
+        ],
+        "max_tokens": 800,
+        "temperature": 0.5
+    }
+
+def summarize_chunk(content):
+    key = summary_key(content)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    resp = gateway.chat(**summary_request(content))
+    summary = clean_summary(resp.choices[0].message.content.strip())
+    if summary:
+        cache.set(key, summary, "summary")
+    return summary
+
+def merge_summaries(summaries):
+    joined = "\n\n".join(summaries)
+    key = make_key("summary-merge", MERGE_SUMMARY_PROMPT, OPENAI_MODEL, joined)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    resp = gateway.chat(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant who summarizes text clearly."},
+            {"role": "user", "content": MERGE_SUMMARY_PROMPT.format(summaries=joined)}
+        ],
+        max_tokens=800,
+        temperature=0.3
     )
+    summary = clean_summary(resp.choices[0].message.content.strip())
+    if summary:
+        cache.set(key, summary, "summary")
+    return summary
+
+def generate_summary(content):
+    return map_reduce_summary(content, summarize_chunk, merge_summaries, summary_pool, SUMMARY_CHUNK_TOKENS)
+
+# --- Quiz generation using OpenAI (robust parsing, cached) ---
+def quiz_request(text, difficulty="Easy", avoid=None):
+    # (cache key, chat kwargs); shared with the async endpoints in asgi.py
+    if avoid:
+        # Bank refill: ask for questions other than the ones already banked
+        existing = "\n".join(f"- {q['question']}" for q in avoid[-QUESTION_BANK_TARGET:])
+        key = make_key("quiz-more", QUIZ_MORE_PROMPT, OPENAI_MODEL, difficulty, existing, text)
+        prompt = QUIZ_MORE_PROMPT.format(existing=existing, difficulty=difficulty, text=text)
+    else:
+        key = make_key("quiz", QUIZ_PROMPT, OPENAI_MODEL, difficulty, text)
+        prompt = QUIZ_PROMPT.format(difficulty=difficulty, text=text)
+    return key, {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are an expert teacher creating multiple-choice quizzes."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 1200,
+        "temperature": 0.7 if avoid else 0.3
+    }
+
+def quiz_from_response(key, resp):
+    quiz_text = resp.choices[0].message.content.strip()
+    with metrics.stage("parse"):
+        quiz = parse_quiz_response(quiz_text)
+    if quiz["questions"]:
+        cache.set(key, quiz, "quiz")
+    return quiz
+
+def generate_quiz_from_text(text, difficulty="Easy", avoid=None):
+    # Oversized input (e.g. a whole document) is condensed first
+    if count_tokens(text) > QUIZ_INPUT_TOKENS:
+        text = generate_summary(text)
+    key, chat_request = quiz_request(text, difficulty, avoid)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert teacher creating multiple-choice quizzes."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1200,
-            temperature=0.3
-        )
+        resp = gateway.chat(**chat_request)
+    except RateLimited:
+        raise
     except Exception as e:
         raise RuntimeError(f"OpenAI request failed: {e}")
+    return quiz_from_response(key, resp)
+
+# --- Streaming quiz generation: yields each question as soon as it is complete ---
+def stream_quiz_from_text(text, difficulty="Easy"):
+    if count_tokens(text) > QUIZ_INPUT_TOKENS:
+        text = generate_summary(text)
+    key, chat_request = quiz_request(text, difficulty)
+    cached = cache.get(key)
+    if cached is not None:
+        yield from cached["questions"]
+        return
 
-    quiz_text = resp.choices[0].message.content.strip()
-    cleaned_text = re.sub(r"```(?:json)?|```", "", quiz_text).strip()
     try:
-        return {"questions": json.loads(cleaned_text)}
-    except json.JSONDecodeError:
-        json_match = re.search(r"\[.*\]", cleaned_text, re.DOTALL)
-        if json_match:
-            try:
-                return {"questions": json.loads(json_match.group(0))}
-            except json.JSONDecodeError:
-                pass
-        return parse_quiz_text_fallback(cleaned_text)
+        stream = gateway.chat(**chat_request, stream=True)
+    except RateLimited:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"OpenAI request failed: {e}")
+
+    parser = JsonArrayStreamParser()
+    parts = []
+    questions = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content or ""
+        parts.append(delta)
+        for item in parser.feed(delta):
+            question = clean_question(item)
+            if question:
+                questions.append(question)
+                yield question
+    # A reply cut off by max_tokens: keep the last question if it is complete
+    for item in parser.close():
+        question = clean_question(item)
+        if question:
+            questions.append(question)
+            yield question
+
+    # Nothing came through incrementally (e.g. numbered text instead of JSON)
+    if not questions:
+        with metrics.stage("parse"):
+            questions = parse_quiz_response("".join(parts).strip())["questions"]
+        yield from questions
+    if questions:
+        cache.set(key, {"questions": questions}, "quiz")
+
+def stream_quiz(text, difficulty="Easy", exclude=()):
+    # A full quiz from the bank goes out at once; otherwise stream a new one and bank it
+    source = source_key(text)
+    with metrics.stage("bank"):
+        bank = storage.bank_questions(source, difficulty)
+    if len(bank) < QUIZ_SIZE:
+        questions = []
+        for question in stream_quiz_from_text(text, difficulty):
+            questions.append(question)
+            yield question
+        bank = bank_add(source, difficulty, questions)
+    else:
+        yield from sample_questions(bank, QUIZ_SIZE, exclude)
+    if bank:
+        schedule_bank_refill(text, source, difficulty, bank, exclude)
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# --- Combined generation: summary, questions and flashcards in one completion ---
+def generate_study_pack(content, difficulty="Easy"):
+    # Large documents are condensed chunk-wise first; the pack is built from that
+    if count_tokens(content) > SUMMARY_CHUNK_TOKENS:
+        content = generate_summary(content)
+
+    key = study_pack_key(content, difficulty)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    resp = gateway.chat(**study_pack_request(content, difficulty))
+    pack = parse_study_pack(resp.choices[0].message.content)
+    if pack["summary"] and pack["questions"]:
+        cache.set(key, pack, "study-pack")
+    return pack
+
+def study_pack_key(content, difficulty):
+    return make_key("study-pack", STUDY_PACK_PROMPT, OPENAI_MODEL, difficulty, content)
+
+def study_pack_request(content, difficulty):
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are an expert teacher creating study material."},
+            {"role": "user", "content": STUDY_PACK_PROMPT.format(difficulty=difficulty, text=content)}
+        ],
+        "max_tokens": 2800,
+        "temperature": 0.3
+    }
+
+def parse_study_pack(text):
+    # Tolerant single pass: a reply truncated inside "flashcards" keeps its
+    # summary, every complete question and every complete flashcard
+    data = parse_json_object(text)
+    if not isinstance(data, dict):
+        data = {}
+
+    summary = data.get("summary")
+    if isinstance(summary, list):
+        summary = "\n".join(s if s.lstrip().startswith("-") else f"- {s}" for s in summary if isinstance(s, str))
+    return {
+        "summary": clean_summary(summary) if isinstance(summary, str) else "",
+        "questions": _clean_items(data.get("questions"), clean_question),
+        "flashcards": _clean_items(data.get("flashcards"), clean_flashcard)
+    }
+
+def _clean_items(items, clean):
+    if not isinstance(items, list):
+        return []
+    return [item for item in map(clean, items) if item is not None]
+
+def parse_quiz_response(quiz_text):
+    # One tolerant pass over the JSON (fences, trailing commas, truncation);
+    # the line scanner is only for replies that came back as numbered text
+    questions = parse_quiz_items(quiz_text)
+    if questions:
+        return {"questions": questions}
+    return parse_quiz_text_fallback(re.sub(r"```(?:json)?|```", "", quiz_text).strip())
 
 def parse_quiz_text_fallback(quiz_text):
     questions = []
@@ -179,23 +919,23 @@ def login_required(f):
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_page('index.html')
 
 @app.route("/quiz.html")
 def quiz_page():
-    return render_template("quiz.html")
+    return render_page("quiz.html")
 
 @app.route('/signup_page')
 def signup_page():
-    return render_template('signup.html')
+    return render_page('signup.html')
 
 @app.route('/login_page')
 def login_page():
-    return render_template('login.html')
+    return render_page('login.html')
 
 @app.route('/flashcards_page')
 def flashcards_page():
-    return render_template('flashcards.html')
+    return render_page('flashcards.html')
 
 # ---- AUTH ----
 @app.route('/signup', methods=['POST'])
@@ -213,18 +953,19 @@ def signup():
     if not email or not password:
         return jsonify({"success": False, "message": "Email and password required"}), 400
 
-    if any(u['email'].lower() == email.lower() for u in users):
+    if storage.get_user_by_email(email):
         return jsonify({"success": False, "message": "Email already registered"}), 400
 
-    new_user = {
-        "id": max((u['id'] for u in users), default=0) + 1,
-        "name": name,
-        "email": email,
-        "password": generate_password_hash(password),
-        "quizzes": []
-    }
-    users.append(new_user)
+    try:
+        password_hash = run_password_work(generate_password_hash, password)
+    except QueueFull as e:
+        return jsonify({"success": False, "message": str(e)}), 503
+    try:
+        new_user = storage.create_user(name, email, password_hash)
+    except DuplicateEmail:
+        return jsonify({"success": False, "message": "Email already registered"}), 400
 
+    session.regenerate()
     session["user_id"] = new_user["id"]
     session["user_name"] = new_user["name"]
 
@@ -253,10 +994,17 @@ def login():
     if not email or not password:
         return jsonify({"success": False, "message": "Email and password required"}), 400
 
-    user = next((u for u in users if u["email"].lower() == email.lower()), None)
-    if not user or not check_password_hash(user.get("password", ""), password):
+    user = storage.get_user_by_email(email)
+    if not user:
+        return jsonify({"success": False, "message": "Invalid email or password"}), 401
+    try:
+        valid = run_password_work(check_password_hash, user.get("password", ""), password)
+    except QueueFull as e:
+        return jsonify({"success": False, "message": str(e)}), 503
+    if not valid:
         return jsonify({"success": False, "message": "Invalid email or password"}), 401
 
+    session.regenerate()
     session["user_id"] = user["id"]
     session["user_name"] = user["name"]
 
@@ -273,7 +1021,7 @@ def logout():
 
 @app.route('/me', methods=['GET'])
 def me():
-    user = next((u for u in users if u["id"] == session.get("user_id")), None)
+    user = storage.get_user(session.get("user_id"))
     if not user:
         return jsonify({"user": None})
     return jsonify({"user": {"id": user["id"], "name": user["name"], "email": user["email"]}})
@@ -299,30 +1047,66 @@ def api_quiz():
     if not user_id:
         return jsonify({"error": "Not logged in"}), 401
     
-    user = next((u for u in users if u["id"] == user_id), None)
-    if not user or not user.get("quizzes"):
-        return jsonify({"questions": []})  # no quiz yet
-    
+    # ?difficulty=... assembles a fresh quiz on the latest notes from the question bank
+    difficulty = request.args.get("difficulty")
+    if difficulty:
+        summary = storage.latest_summary(user_id)
+        if not summary:
+            return jsonify({"questions": []})
+        try:
+            with metrics.stage("quiz"):
+                quiz = assemble_quiz(summary, difficulty, recent_question_keys(user_id))
+        except RateLimited as e:
+            return jsonify({"error": str(e)}), 429
+        except Exception as e:
+            return jsonify({"error": f"Failed to generate quiz: {e}"}), 500
+        with metrics.stage("save"):
+            quiz_id = store_served_quiz(user_id, summary, quiz["questions"], difficulty)
+        return jsonify({"questions": quiz["questions"], "quiz_id": quiz_id})
+
     # Get the latest quiz for the user
-    latest_quiz = user["quizzes"][-1]
-    return jsonify({"questions": latest_quiz["questions"]})
+    latest_quiz = storage.latest_quiz(user_id)
+    if not latest_quiz:
+        return jsonify({"questions": []})  # no quiz yet
+    return jsonify({"questions": latest_quiz["questions"], "quiz_id": latest_quiz["id"]})
 
 
 
 
 
 # ---- Dashboard (protected) ----
+# Summaries and question lists are only sent when asked for via ?fields=
+DASHBOARD_FIELDS = ("id", "date", "score", "total", "difficulty")
+
 @app.route('/dashboard', methods=['GET'])
 @login_required
 def dashboard():
     # If API client requests JSON, return quizzes, else render HTML
-    user = next((u for u in users if u["id"] == session.get("user_id")), None)
+    user = storage.get_user(session.get("user_id"))
     if not user:
         return redirect(url_for('login_page'))
 
     if 'application/json' in request.headers.get('Accept', '') or request.args.get('format') == 'json':
-        return jsonify({"quizzes": user.get("quizzes", [])})
-    return render_template('dashboard.html', user={"id": user["id"], "name": user["name"], "email": user["email"]})
+        # Paginated history: ?limit=&cursor=<next_cursor>&fields=id,score,date
+        fields = request.args.get("fields")
+        fields = tuple(f for f in fields.split(",") if f in QUIZ_FIELDS) if fields else DASHBOARD_FIELDS
+        limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+        cursor = request.args.get("cursor", type=int)
+        quizzes, next_cursor = storage.list_quizzes(user["id"], fields or DASHBOARD_FIELDS, limit, cursor)
+        return jsonify({
+            "quizzes": quizzes,
+            "next_cursor": next_cursor,
+            "stats": storage.get_user_stats(user["id"])
+        })
+    return render_page('dashboard.html', user={"id": user["id"], "name": user["name"], "email": user["email"]})
+
+@app.route('/api/quizzes/<int:quiz_id>', methods=['GET'])
+@login_required
+def quiz_detail(quiz_id):
+    quiz = storage.get_quiz(session.get("user_id"), quiz_id)
+    if not quiz:
+        return jsonify({"error": "Quiz not found"}), 404
+    return jsonify({"quiz": quiz})
 
 # ---- Quiz endpoints ----
 @app.route('/generate_quiz', methods=['POST'])
@@ -332,85 +1116,293 @@ def generate_quiz():
     difficulty = data.get("difficulty", "Easy")
     if not summary:
         return jsonify({"error": "Summary required"}), 400
+    user_id = session.get("user_id")
     try:
-        quiz = generate_quiz_from_text(summary, difficulty)
+        with metrics.stage("quiz"):
+            quiz = assemble_quiz(summary, difficulty, recent_question_keys(user_id))
+    except RateLimited as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
         return jsonify({"error": f"Failed to generate quiz: {e}"}), 500
-    return jsonify({"quiz": quiz})
-
-@app.route('/save_quiz', methods=['POST'])
-def save_quiz():
-    user = next((u for u in users if u["id"] == session.get("user_id")), None)
-    if not user:
-        return jsonify({"error": "Not logged in"}), 401
+    with metrics.stage("save"):
+        quiz_id = store_served_quiz(user_id, summary, quiz["questions"], difficulty)
+    return jsonify({"quiz": quiz, "quiz_id": quiz_id})
+
+@app.route('/generate_quiz/stream', methods=['GET', 'POST'])
+def generate_quiz_stream():
+    # GET serves EventSource clients; POST allows long summaries in the body
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    summary = data.get("summary")
+    difficulty = data.get("difficulty", "Easy")
+    if not summary:
+        return jsonify({"error": "Summary required"}), 400
+    user_id = session.get("user_id")
+    exclude = recent_question_keys(user_id)
 
-    data = request.get_json() or {}
-    score = data.get("score")
-    total = data.get("total")
-    questions = data.get("questions")
+    def events():
+        questions = []
+        try:
+            for question in stream_quiz(summary, difficulty, exclude):
+                questions.append(question)
+                yield sse_event("question", question)
+        except Exception as e:
+            yield sse_event("error", {"error": f"Failed to generate quiz: {e}"})
+            return
+        quiz_id = store_served_quiz(user_id, summary, questions, difficulty)
+        yield sse_event("done", {"count": len(questions), "quiz_id": quiz_id})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-    try:
-        score = int(score)
-        total = int(total)
-    except Exception:
-        return jsonify({"error": "Invalid score or total"}), 400
-
-    quiz_record = {
-        "id": datetime.now().timestamp(),
-        "score": score,
-        "total": total,
-        "questions": questions,
-        "date": datetime.now().isoformat()
-    }
-    user["quizzes"].append(quiz_record)
-    leaderboard.append({
-        "name": user["name"],
-        "score": score,
-        "total": total,
-        "date": quiz_record["date"]
-    })
-    return jsonify({"message": "Quiz saved successfully", "quiz": quiz_record}), 200
+def leaderboard_period_start(period):
+    now = datetime.now()
+    if period == "daily":
+        return now.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    if period == "weekly":
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return (start - timedelta(days=start.weekday())).isoformat()
+    return None
 
 @app.route('/leaderboard', methods=['GET'])
 def get_leaderboard():
-    sorted_board = sorted(leaderboard, key=lambda x: (x["score"], x["date"]), reverse=True)
-    return jsonify({"leaderboard": sorted_board[:20]})
+    period = request.args.get("period", "all")
+    board = request.args.get("board", "scores")
+    if period not in ("all", "daily", "weekly") or board not in ("scores", "best"):
+        return jsonify({"error": "Invalid period or board"}), 400
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+    since = leaderboard_period_start(period)
+
+    # Cheap version check first so repeat polls get a 304 without a query
+    version, last_date = storage.leaderboard_version()
+    etag = f"lb-{board}-{period}-{since}-{limit}-{version}"
+    last_modified = datetime.fromisoformat(last_date).astimezone() if last_date else None
+    if request.if_none_match.contains(etag):
+        resp = make_response("", 304)
+    else:
+        if board == "best":
+            rows = storage.top_user_bests(limit, since)
+        else:
+            rows = storage.top_scores(limit, since)
+        resp = jsonify({"leaderboard": rows, "period": period, "board": board})
+    resp.set_etag(etag)
+    if last_modified:
+        resp.last_modified = last_modified
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 # ---- Explanations / batch explanations ----
+# Either point at a stored quiz ({quiz_id, ...}) or send the question itself
+# ({question, options, correct, chosen}) as older clients do.
+def payload_question(item):
+    if not isinstance(item, dict) or not isinstance(item.get("question"), str) or not item.get("correct"):
+        return None
+    options = item.get("options")
+    return {"question": item["question"], "options": options if isinstance(options, dict) else {},
+            "answer": str(item["correct"])}
+
+def stored_quiz_questions(quiz_id):
+    quiz = storage.get_quiz(session.get("user_id"), quiz_id) if isinstance(quiz_id, int) else None
+    return quiz["questions"] if quiz else None
+
 @app.route('/explain_answer', methods=['POST'])
 def explain_answer():
     data = request.get_json() or {}
-    question = data.get("question")
-    correct = data.get("correct")
     chosen = data.get("chosen")
-    explanation = f"The correct answer is {correct} because this concept is fundamental to the question: {question}"
+    if "quiz_id" in data:
+        questions = stored_quiz_questions(data["quiz_id"])
+        index = data.get("index")
+        if questions is None or not isinstance(index, int) or not 0 <= index < len(questions):
+            return jsonify({"error": "Question not found"}), 404
+        q = questions[index]
+        if not valid_question(q):
+            return jsonify({"error": "Question has no answer key"}), 400
+    else:
+        q = payload_question(data)
+        if q is None:
+            return jsonify({"error": "question and correct are required"}), 400
+    try:
+        with metrics.stage("explain"):
+            explanation = explain_answers([(q, chosen)])[0]
+    except RateLimited as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        print("Explanation failed:", e)
+        return jsonify({"error": "Failed to generate explanation"}), 500
     return jsonify({"explanation": explanation})
 
 @app.route('/batch_explanations', methods=['POST'])
 def batch_explanations():
     data = request.get_json() or {}
-    wrong_answers = data.get("wrongAnswers", [])
+    if "quiz_id" in data:
+        # Wrong answers are worked out from the stored answer key
+        questions = stored_quiz_questions(data["quiz_id"])
+        answers = data.get("answers")
+        if questions is None:
+            return jsonify({"error": "Quiz not found"}), 404
+        if not isinstance(answers, list):
+            return jsonify({"error": "answers must be a list"}), 400
+        result, _ = grade_attempt(questions, answers)
+        wrong = [(questions[r["index"]], r["chosen"], r["index"]) for r in result["results"] if not r["correct"]]
+    else:
+        wrong = [(q, item.get("chosen"), None) for item in data.get("wrongAnswers", [])
+                 for q in [payload_question(item)] if q is not None]
+    try:
+        with metrics.stage("explain"):
+            texts = explain_answers([(q, chosen) for q, chosen, _ in wrong])
+    except RateLimited as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        print("Batch explanations failed:", e)
+        return jsonify({"error": "Failed to generate explanations"}), 500
+
     explanations = []
-    for item in wrong_answers:
-        question = item.get("question")
-        correct = item.get("correct")
-        chosen = item.get("chosen")
-        explanations.append({
-            "question": question,
-            "correct": correct,
-            "chosen": chosen,
-            "explanation": f"The correct answer is {correct} because this concept is fundamental to the question: {question}"
-        })
+    for (q, chosen, index), text in zip(wrong, texts):
+        entry = {"question": q["question"], "correct": q["answer"], "chosen": chosen, "explanation": text}
+        if index is not None:
+            entry["index"] = index
+        explanations.append(entry)
     return jsonify({"explanations": explanations})
 
-# ---- Save attempt (generic) ----
+# ---- Quiz attempts (graded against the stored answer key) ----
 @app.route('/save_attempt', methods=['POST'])
 def save_attempt():
+    user = storage.get_user(session.get("user_id"))
+    if not user:
+        return jsonify({"error": "Not logged in"}), 401
+
     data = request.get_json() or {}
-    print("📌 Quiz attempt saved:", data)
-    return jsonify({"status": "success", "message": "Attempt saved successfully"})
+    quiz_id = data.get("quiz_id")
+    answers = data.get("answers")
+    if not isinstance(quiz_id, int) or not isinstance(answers, list):
+        return jsonify({"error": "quiz_id and a list of answers are required"}), 400
+    quiz = storage.get_quiz(user["id"], quiz_id)
+    if not quiz:
+        return jsonify({"error": "Quiz not found"}), 404
+
+    with metrics.stage("grade"):
+        result, graded = grade_attempt(quiz["questions"], answers)
+    if not result["total"]:
+        return jsonify({"error": "Quiz has no gradable questions"}), 400
+
+    record = dict(
+        user_id=user["id"], name=user["name"], quiz_id=quiz_id, date=datetime.now().isoformat(),
+        score=result["score"], total=result["total"], difficulty=quiz.get("difficulty"), graded=graded
+    )
+    try:
+        with metrics.stage("attempt_commit"):
+            attempt_writer.submit(record).result(timeout=ATTEMPT_WRITE_TIMEOUT)
+    except Exception as e:
+        print("Saving attempt failed:", e)
+        return jsonify({"error": "Could not record the attempt, try again"}), 503
+    return jsonify({"attempt": result}), 200
+
+@app.route('/api/quizzes/<int:quiz_id>/question_stats', methods=['GET'])
+@login_required
+def quiz_question_stats(quiz_id):
+    # How often each question of this quiz is answered correctly, across all users
+    quiz = storage.get_quiz(session.get("user_id"), quiz_id)
+    if not quiz:
+        return jsonify({"error": "Quiz not found"}), 404
+    keys = [question_key(q) if valid_question(q) else None for q in quiz["questions"]]
+    stats = storage.question_stats(k for k in keys if k)
+    return jsonify({"questions": [stats.get(k) if k else None for k in keys]})
+
+# ---- Upload & summary (runs as a background job) ----
+def run_upload_job(job, user_id, difficulty, saved_filename, content=None, pdf_path=None, pdf_bytes=None):
+    current_user.set(user_id)
+    if content is None:
+        job.set_stage("extract")
+        try:
+            content = extract_pdf_text(pdf_path or io.BytesIO(pdf_bytes))
+        except Exception as e:
+            raise RuntimeError(f"PDF read error: {e}")
+        finally:
+            retain_pdf_upload(saved_filename, pdf_path, pdf_bytes)
+
+    # Near-duplicate of a document we already processed: reuse its results
+    job.set_stage("dedup")
+    sig = signature(content)
+    match = find_near_duplicate(sig, difficulty)
+    if match:
+        doc, score = match
+        job.set_stage("save")
+        result = save_upload_result(user_id, doc["summary"], doc["questions"], doc["flashcards"], difficulty)
+        result["reused_document"] = {"id": doc["id"], "similarity": score}
+        return result
+
+    summary, questions, flashcards = generate_upload_material(job, content, difficulty)
+
+    # Step 3: Save quiz to the user who uploaded
+    job.set_stage("save")
+    remember_document(content, sig, difficulty, summary, questions, flashcards)
+    bank_add(source_key(summary), difficulty, questions)
+    return save_upload_result(user_id, summary, questions, flashcards, difficulty)
+
+def generate_upload_material(job, content, difficulty):
+    if COMBINED_GENERATION:
+        job.set_stage("generate")
+        try:
+            pack = generate_study_pack(content, difficulty)
+        except Exception as e:
+            raise RuntimeError(f"OpenAI request failed: {e}")
+        if pack["summary"] and pack["questions"]:
+            return pack["summary"], pack["questions"], pack["flashcards"]
+        # Malformed combined reply: fall through to the separate calls
+
+    # Step 1: Generate summary
+    job.set_stage("summarize")
+    try:
+        summary = generate_summary(content)
+    except Exception as e:
+        raise RuntimeError(f"OpenAI summary request failed: {e}")
+
+    # Step 2: Generate quiz from summary
+    job.set_stage("quiz")
+    try:
+        quiz_data = generate_quiz_from_text(summary, difficulty)
+    except Exception as e:
+        raise RuntimeError(f"Failed to generate quiz: {e}")
+    return summary, quiz_data["questions"], None
+
+def retain_pdf_upload(saved_filename, pdf_path=None, pdf_bytes=None):
+    target = os.path.join(app.config['UPLOAD_FOLDER'], saved_filename)
+    if UPLOAD_RETENTION != "keep":
+        if pdf_path:
+            os.remove(pdf_path)
+        return
+    if pdf_path:
+        os.replace(pdf_path, target)  # rename within UPLOAD_FOLDER, no copy
+    else:
+        with open(target, "wb") as f:
+            f.write(pdf_bytes)
+
+_last_upload_prune = 0.0
+
+def maybe_prune_uploads():
+    global _last_upload_prune
+    now = time.time()
+    if now - _last_upload_prune < 600:
+        return
+    _last_upload_prune = now
+    removed = prune_old_files(UPLOAD_SPOOL_DIR, UPLOAD_SPOOL_MAX_AGE_SECONDS)
+    if UPLOAD_RETENTION == "keep" and UPLOAD_RETENTION_SECONDS:
+        removed += prune_old_files(app.config['UPLOAD_FOLDER'], UPLOAD_RETENTION_SECONDS)
+    if removed:
+        print(f"Pruned {removed} old uploads")
+
+def save_upload_result(user_id, summary, questions, flashcards=None, difficulty=None):
+    quiz_id = None
+    if storage.get_user(user_id):
+        quiz_id = storage.add_quiz(
+            user_id, datetime.now().strftime("%Y-%m-%d"), questions, summary=summary, flashcards=flashcards,
+            difficulty=difficulty
+        )["id"]
+        schedule_explanations(questions)
+    return {"summary": summary, "quiz_id": quiz_id, "question_count": len(questions)}
 
-# ---- Upload & summary ----
 @app.route('/upload', methods=['POST'])
 def upload():
     file = request.files.get('file')
@@ -423,126 +1415,381 @@ def upload():
     filename = secure_filename(file.filename)
     timestamp = int(datetime.now().timestamp())
     saved_filename = f"{timestamp}_{filename}"
-    path = os.path.join(app.config['UPLOAD_FOLDER'], saved_filename)
-    try:
-        file.save(path)
-    except Exception as e:
-        return jsonify({"error": f"Failed to save file: {e}"}), 500
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    user_id = session.get("user_id")
+    difficulty = request.form.get("difficulty", "Easy")
+
+    source = {}
+    if ext == 'pdf':
+        # PDFs are extracted by the job (possibly on the process pool)
+        spooled = getattr(file.stream, "name", None)
+        if spooled in request.__dict__.get("spooled_paths", ()):
+            request.spooled_paths.remove(spooled)  # the job owns the file now
+            file.stream.flush()
+            source["pdf_path"] = spooled
+        else:
+            file.stream.seek(0)
+            source["pdf_bytes"] = file.stream.read()
+    else:
+        try:
+            with metrics.stage("extract"):
+                source["content"] = extract_text_from_stream(file.stream, file.filename)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        if UPLOAD_RETENTION == "keep":
+            try:
+                with metrics.stage("save_upload"):
+                    file.stream.seek(0)
+                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], saved_filename))
+            except Exception as e:
+                return jsonify({"error": f"Failed to save file: {e}"}), 500
 
     try:
-        content = extract_text_from_file(path, saved_filename)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-    # Step 1: Generate summary
-    summary_prompt = (
-        "Summarize the following notes as clear, concise bullet points. "
-        "Use plain hyphens (-) for bullets, keep each point short (max 20 words), "
-        "and do not include headings, numbering, or extra text:\n\n"
-        f"{content}:"
+        job = upload_jobs.submit(
+            run_upload_job, user_id, difficulty, saved_filename, owner=user_id, **source
+        )
+    except QueueFull as e:
+        if "pdf_path" in source:
+            os.remove(source["pdf_path"])
+        return jsonify({"error": str(e)}), 503
+    maybe_prune_uploads()
+
+    status_url = url_for("job_status", job_id=job.id)
+    # Plain form posts go straight to the quiz page, which polls the job
+    if request.accept_mimetypes.best == "text/html":
+        return redirect(url_for("quiz_page", job=job.id))
+    return jsonify({"job_id": job.id, "status": job.status, "status_url": status_url}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = upload_jobs.get(job_id) or export_jobs.get(job_id) or batch_jobs.get(job_id)
+    if not job or (job.owner is not None and job.owner != session.get("user_id")):
+        return jsonify({"error": "Job not found"}), 404
+    for stage, seconds in job.timings.items():
+        metrics.add_to_profile(f"job_{stage}", seconds)
+    return jsonify(job.to_dict())
+
+
+# ---- Batch ingestion: many files -> extraction pool -> batched prompts -> bulk save ----
+def create_batch_runner():
+    if BATCH_BACKEND == "openai":
+        return OpenAIBatchRunner(gateway.backend, poll_interval=BATCH_POLL_SECONDS)
+    return LocalBatchRunner(gateway.chat, BATCH_CONCURRENCY)
+
+def run_batch_requests(batch_id, runner, phase, requests):
+    # A provider batch submitted for exactly these requests before an
+    # interruption is picked up again instead of being paid for twice
+    if not requests:
+        return {}, {}
+    key = make_key("batch-requests", phase, [custom_id for custom_id, _ in requests])
+    ref = storage.get_batch(batch_id)["provider_ref"] or {}
+    previous = ref.get("id") if ref.get("key") == key else None
+    return runner.run(
+        requests, previous,
+        on_submit=lambda provider_id: storage.set_batch_provider_ref(batch_id, {"key": key, "id": provider_id})
     )
 
+def run_batch(batch_id, job=None, progress=None):
+    batch = storage.get_batch(batch_id)
+    runner = create_batch_runner()
+    meter = Throughput()
+    set_stage = job.set_stage if job else (lambda stage: None)
+    pool = create_extract_pool(BATCH_EXTRACT_WORKERS)
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant who summarizes text clearly."},
-                {"role": "user", "content": summary_prompt}
-            ],
-            max_tokens=800,
-            temperature=0.5
-        )
-        summary = clean_summary(resp.choices[0].message.content.strip())
-    except Exception as e:
-        return jsonify({"error": f"OpenAI summary request failed: {e}"}), 500
-
-    # Step 2: Generate quiz from summary
+        while True:
+            items = storage.pending_batch_items(batch_id, BATCH_WINDOW)
+            if not items:
+                break
+            done, failed = process_batch_window(batch, items, runner, pool, set_stage)
+            meter.add(done, failed)
+            if progress:
+                progress(dict(meter.to_dict(), **storage.batch_progress(batch_id)))
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    return dict(meter.to_dict(), batch_id=batch_id, progress=storage.batch_progress(batch_id))
+
+def process_batch_window(batch, items, runner, pool, set_stage):
+    difficulty = batch["difficulty"]
+    failures = []
+
+    set_stage("extract")
+    texts = {}
+    for item_id, text, error in extract_files([(item["id"], item["path"]) for item in items], pool):
+        if error or not (text or "").strip():
+            failures.append((item_id, error or "No text could be extracted"))
+        else:
+            texts[item_id] = text
+
+    # Near-duplicates of processed documents (or of another file in this
+    # window) reuse those results instead of being generated again
+    set_stage("dedup")
+    results = {}
+    sigs = {}
+    aliases = {}
+    window_index = LSHIndex()
+    for item_id, text in texts.items():
+        sigs[item_id] = signature(text)
+        match = find_near_duplicate(sigs[item_id], difficulty)
+        if match:
+            doc = match[0]
+            results[item_id] = {"document_id": doc["id"], "summary": doc["summary"],
+                                "questions": doc["questions"], "flashcards": doc["flashcards"]}
+            continue
+        same = window_index.query(sigs[item_id], NEAR_DUP_THRESHOLD)
+        if same:
+            aliases[item_id] = same[0][1]
+        else:
+            window_index.add(item_id, sigs[item_id])
+    todo = {i: t for i, t in texts.items() if i not in results and i not in aliases}
+
+    # Large documents are condensed first: one request per uncached chunk
+    set_stage("summarize")
+    content = {}
+    chunked = {}
+    chunk_summaries = {}
+    requests = []
+    for item_id, text in todo.items():
+        if count_tokens(text) <= SUMMARY_CHUNK_TOKENS:
+            content[item_id] = text
+            continue
+        chunked[item_id] = chunk_text(text, SUMMARY_CHUNK_TOKENS)
+        for n, chunk in enumerate(chunked[item_id]):
+            key = summary_key(chunk)
+            cached = cache.get(key)
+            if cached is not None:
+                chunk_summaries[key] = cached
+            elif key not in chunk_summaries:
+                chunk_summaries[key] = None
+                requests.append((f"chunk-{item_id}-{n}", summary_request(chunk)))
+    answers, errors = run_batch_requests(batch["id"], runner, "chunks", requests)
+    for custom_id, answer in answers.items():
+        _, item_id, n = custom_id.split("-")
+        key = summary_key(chunked[int(item_id)][int(n)])
+        summary = clean_summary(answer.strip())
+        if summary:
+            chunk_summaries[key] = summary
+            cache.set(key, summary, "summary")
+    for item_id, chunks in chunked.items():
+        parts = [chunk_summaries.get(summary_key(chunk)) for chunk in chunks]
+        if all(parts):
+            content[item_id] = "\n".join(parts)
+        else:
+            error = next((e for cid, e in errors.items() if cid.startswith(f"chunk-{item_id}-")), None)
+            failures.append((item_id, error or "Chunk summary failed"))
+
+    # Summary + quiz + flashcards per document, all in one batch
+    set_stage("generate")
+    packs = {}
+    requests = []
+    for item_id, text in content.items():
+        cached = cache.get(study_pack_key(text, difficulty))
+        if cached is not None:
+            packs[item_id] = cached
+        else:
+            requests.append((f"pack-{item_id}", study_pack_request(text, difficulty)))
+    answers, errors = run_batch_requests(batch["id"], runner, "packs", requests)
+    for custom_id, answer in answers.items():
+        item_id = int(custom_id.split("-")[1])
+        pack = parse_study_pack(answer)
+        if pack["summary"] and pack["questions"]:
+            cache.set(study_pack_key(content[item_id], difficulty), pack, "study-pack")
+            packs[item_id] = pack
+        else:
+            errors[custom_id] = "Model reply could not be parsed"
+    for item_id in content:
+        if item_id not in packs:
+            failures.append((item_id, errors.get(f"pack-{item_id}", "Generation failed")))
+    for item_id, pack in packs.items():
+        results[item_id] = dict(pack, document_id=None)
+    for item_id, original in aliases.items():
+        if original in results:
+            results[item_id] = dict(results[original], document_id=None)
+        else:
+            failures.append((item_id, "Generation failed"))
+
+    set_stage("save")
+    rows = []
+    for item_id, result in results.items():
+        source = source_key(result["summary"])
+        fresh = new_questions(storage.bank_questions(source, difficulty), result["questions"], QUESTION_DUP_THRESHOLD)
+        rows.append(dict(
+            result, item_id=item_id, difficulty=difficulty, text_hash=make_key(texts[item_id]),
+            minhash=sigs[item_id], bank_source=source, bank_questions=[(question_key(q), q) for q in fresh]
+        ))
+    storage.save_batch_results(batch["user_id"], rows, failures, datetime.now().isoformat())
+    sync_document_index()
+    return len(rows), len(failures)
+
+def run_batch_job(job, batch_id):
+    return run_batch(batch_id, job)
+
+def queue_batch(batch_id, user_id):
     try:
-        quiz_data = generate_quiz_from_text(summary)
-    except Exception as e:
-        return jsonify({"error": f"Failed to generate quiz: {e}"}), 500
-
-    # Step 3: Save quiz to current user
+        job = batch_jobs.submit(run_batch_job, batch_id, owner=user_id)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({
+        "batch_id": batch_id,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for("job_status", job_id=job.id),
+        "batch_url": url_for("batch_status", batch_id=batch_id)
+    }), 202
+
+@app.route('/batch_upload', methods=['POST'])
+def batch_upload():
     user_id = session.get("user_id")
-    user = next((u for u in users if u["id"] == user_id), None)
-    if user:
-        quiz_record = {
-            "id": datetime.now().timestamp(),
-            "summary": summary,
-            "questions": quiz_data["questions"],
-            "date": datetime.now().strftime("%Y-%m-%d")
-        }
-        user["quizzes"].append(quiz_record)
-
-    # Step 4: Redirect to quiz page
-    return redirect(url_for("quiz_page"))
-
-
-# Example storage (replace with DB later)
-user_quizzes = {
-    # user_id: [ { "quiz_id": 1, "summary": "AI summary here...", "questions": [...], "score": 8, "total": 10, "date": "2025-08-10" } ]
-}
-
-@app.route("/download_summary/<quiz_id>")
-def download_summary(quiz_id):
+    if not user_id:
+        return jsonify({"error": "Not logged in"}), 401
+    files = request.files.getlist("files") + request.files.getlist("file")
+    if not files:
+        return jsonify({"error": "No files uploaded"}), 400
+    difficulty = request.form.get("difficulty", "Easy")
+
+    # Files (and zip members) are kept until the batch is processed, so an
+    # interrupted batch can be resumed from disk
+    batch_id = uuid.uuid4().hex
+    folder = os.path.join(BATCH_FOLDER, batch_id)
+    items = []
+    try:
+        with metrics.stage("save_upload"):
+            for file in files:
+                name = secure_filename(file.filename or "")
+                if name.lower().endswith(".zip"):
+                    stem = os.path.splitext(name)[0]
+                    items += unpack_zip(file.stream, os.path.join(folder, stem), f"{stem}/", BATCH_MAX_UNZIPPED_BYTES)
+                elif allowed_file(name):
+                    os.makedirs(folder, exist_ok=True)
+                    file.save(os.path.join(folder, name))
+                    items.append((name, os.path.join(folder, name)))
+    except (zipfile.BadZipFile, ValueError) as e:
+        shutil.rmtree(folder, ignore_errors=True)
+        return jsonify({"error": f"Invalid archive: {e}"}), 400
+    if not items:
+        return jsonify({"error": "No PDF, DOCX or TXT files found"}), 400
+
+    storage.create_batch(batch_id, user_id, difficulty, items, datetime.now().isoformat())
+    return queue_batch(batch_id, user_id)
+
+@app.route('/batches/<batch_id>', methods=['GET'])
+def batch_status(batch_id):
+    batch = storage.get_batch(batch_id)
+    if not batch or batch["user_id"] != session.get("user_id"):
+        return jsonify({"error": "Batch not found"}), 404
+    return jsonify({
+        "batch_id": batch_id,
+        "difficulty": batch["difficulty"],
+        "created": batch["created"],
+        "progress": storage.batch_progress(batch_id),
+        "failures": storage.batch_failures(batch_id)
+    })
+
+@app.route('/batches/<batch_id>/resume', methods=['POST'])
+def resume_batch(batch_id):
+    batch = storage.get_batch(batch_id)
+    if not batch or batch["user_id"] != session.get("user_id"):
+        return jsonify({"error": "Batch not found"}), 404
+    if (request.get_json(silent=True) or {}).get("retry_failed"):
+        storage.reset_failed_batch_items(batch_id)
+    return queue_batch(batch_id, batch["user_id"])
+
+# ---- PDF export (rendered from stored quiz records, cached on disk) ----
+def send_quiz_pdf(quiz_id, kind, download_name):
     user_id = session.get("user_id")
-    if not user_id or user_id not in user_quizzes:
+    if not user_id:
         return "Unauthorized", 401
 
-    quiz = next((q for q in user_quizzes[user_id] if str(q["quiz_id"]) == quiz_id), None)
+    quiz = storage.get_quiz(user_id, quiz_id)
     if not quiz:
         return "Quiz not found", 404
+    if kind == "summary" and not quiz.get("summary"):
+        return "This quiz has no summary", 404
+    if kind == "quiz":
+        quiz = add_chosen_answers(user_id, [quiz])[0]
 
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(100, 750, "Notes Summary")
-    p.setFont("Helvetica", 12)
-    p.drawString(100, 720, quiz["summary"])
-    p.showPage()
-    p.save()
+    with metrics.stage("render"):
+        path = pdf_cache.get_or_render(quiz, kind)
+    return send_file(path, as_attachment=True, download_name=download_name, mimetype="application/pdf")
 
-    buffer.seek(0)
-    filename = f"summary_quiz_{quiz_id}.pdf"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype="application/pdf")
+@app.route("/download_summary/<int:quiz_id>")
+def download_summary(quiz_id):
+    return send_quiz_pdf(quiz_id, "summary", f"summary_quiz_{quiz_id}.pdf")
 
-@app.route("/download_quiz/<quiz_id>")
+@app.route("/download_quiz/<int:quiz_id>")
 def download_quiz(quiz_id):
+    return send_quiz_pdf(quiz_id, "quiz", f"quiz_review_{quiz_id}.pdf")
+
+def add_chosen_answers(user_id, quizzes):
+    # The review shows what the user picked on the attempt that scored the quiz
+    answers = storage.first_attempt_answers(user_id, [q["id"] for q in quizzes if q.get("questions")])
+    return [dict(q, questions=with_answers(q["questions"], answers[q["id"]])) if q["id"] in answers else q
+            for q in quizzes]
+
+def iter_user_quizzes(user_id):
+    cursor = None
+    while True:
+        quizzes, cursor = storage.list_quizzes(user_id, QUIZ_FIELDS, 50, cursor)
+        yield from add_chosen_answers(user_id, quizzes)
+        if cursor is None:
+            return
+
+def run_export_job(job, user_id):
+    job.set_stage("render")
+    path = os.path.join(EXPORT_ZIP_FOLDER, f"{job.id}.zip")
+    count = write_export_zip(path, iter_user_quizzes(user_id), pdf_cache)
+    return {"quizzes": count, "bytes": os.path.getsize(path)}
+
+@app.route("/export", methods=["POST"])
+def export_all():
     user_id = session.get("user_id")
-    if not user_id or user_id not in user_quizzes:
-        return "Unauthorized", 401
-
-    quiz = next((q for q in user_quizzes[user_id] if str(q["quiz_id"]) == quiz_id), None)
-    if not quiz:
-        return "Quiz not found", 404
-
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(100, 750, f"Quiz Review - {quiz['date']}")
-    p.setFont("Helvetica", 12)
-
-    y = 720
-    for i, q in enumerate(quiz["questions"], 1):
-        p.drawString(100, y, f"Q{i}: {q['question']}")
-        y -= 20
-        p.drawString(120, y, f"Your answer: {q.get('user_answer', 'N/A')}")
-        y -= 20
-        p.drawString(120, y, f"Correct answer: {q['correct_answer']}")
-        y -= 30
-        if y < 50:  # New page if space is low
-            p.showPage()
-            y = 750
+    if not user_id:
+        return jsonify({"error": "Not logged in"}), 401
+    prune_old_files(EXPORT_ZIP_FOLDER, EXPORT_ZIP_TTL_SECONDS)
+    try:
+        job = export_jobs.submit(run_export_job, user_id, owner=user_id)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for("job_status", job_id=job.id),
+        "download_url": url_for("download_export", job_id=job.id)
+    }), 202
+
+@app.route("/export/<job_id>/download")
+def download_export(job_id):
+    job = export_jobs.get(job_id)
+    if not job or job.owner != session.get("user_id"):
+        return jsonify({"error": "Export not found"}), 404
+    if job.status != "done":
+        return jsonify({"status": job.status, "error": job.error}), 409
+    path = os.path.join(EXPORT_ZIP_FOLDER, f"{job.id}.zip")
+    if not os.path.exists(path):
+        return jsonify({"error": "Export expired"}), 410
+    # send_file streams the archive from disk in blocks
+    return send_file(path, as_attachment=True, download_name="notes2quiz-export.zip", mimetype="application/zip")
 
-    p.showPage()
-    p.save()
 
-    buffer.seek(0)
-    filename = f"quiz_review_{quiz_id}.pdf"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype="application/pdf")
+# ---- Flashcards generation ----
+def flashcards_key(summary):
+    return make_key("flashcards", FLASHCARDS_PROMPT, OPENAI_MODEL, summary)
+
+def flashcards_request(summary):
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [{"role": "user", "content": FLASHCARDS_PROMPT.format(summary=summary)}],
+        "temperature": 0.7
+    }
 
+def flashcards_from_response(key, resp):
+    content = resp.choices[0].message.content.strip()
+    with metrics.stage("parse"):
+        flashcards = parse_flashcard_items(content)
+    if flashcards:
+        cache.set(key, flashcards, "flashcards")
+    return flashcards
 
-# ---- Flashcards generation ----
 @app.route('/generate_flashcards', methods=['POST'])
 def generate_flashcards():
     data = request.get_json() or {}
@@ -550,33 +1797,40 @@ def generate_flashcards():
     if not summary:
         return jsonify({"error": "No summary provided"}), 400
 
-    prompt = f"""
-    Create concise flashcards from the following text.
-    Respond in JSON array format where each item has:
-    - question (string)
-    - answer (string)
+    # Flashcards produced alongside the quiz at upload time are served from storage
+    user_id = session.get("user_id")
+    if user_id:
+        stored = storage.find_flashcards(user_id, summary)
+        if stored:
+            return jsonify({"flashcards": stored})
+
+    key = flashcards_key(summary)
+    cached = cache.get(key)
+    if cached is not None:
+        return jsonify({"flashcards": cached})
 
-    Text:
-    {summary}
-    """
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
-        )
-        content = resp.choices[0].message.content.strip()
-        cleaned = re.sub(r"```(?:json)?|```", "", content).strip()
-        try:
-            flashcards = json.loads(cleaned)
-        except json.JSONDecodeError:
-            match = re.search(r"\[.*\]", cleaned, re.DOTALL)
-            flashcards = json.loads(match.group(0)) if match else []
-        return jsonify({"flashcards": flashcards})
+        resp = gateway.chat(**flashcards_request(summary))
+        return jsonify({"flashcards": flashcards_from_response(key, resp)})
+    except RateLimited as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
         print("Flashcards generation failed:", e)
         return jsonify({"error": "Failed to generate flashcards"}), 500
 
+# ---- Cache / model gateway stats ----
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(cache.stats())
+
+@app.route('/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify(gateway.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 # --- Run app ---
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import asyncio
+
+from a2wsgi import WSGIMiddleware
+from werkzeug.wrappers import Request as WsgiRequest
+
+import metrics
+from app import (
+    create_app, cache, gateway, storage, AUTO_LOGIN, PROFILING_ENABLED, QUIZ_INPUT_TOKENS, QUIZ_SIZE,
+    quiz_request, quiz_from_response, flashcards_key, flashcards_request, flashcards_from_response,
+    generate_summary, bank_add, quiz_from_bank, recent_question_keys, store_served_quiz
+)
+from bank import source_key
+from llm import create_async_backend, current_user, RateLimited
+from summarize import count_tokens
+
+# --- ASGI serving mode ---
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000
+# /generate_quiz and /generate_flashcards await the model through AsyncOpenAI,
+# so an open generation holds a coroutine instead of an OS thread. Every other
+# route (pages, auth, uploads, exports, SSE) runs in the Flask app on a
+# bounded thread pool. `wsgi` is the Flask app alone behind the same adapter,
+# for comparison (benchmarks/load_asgi.py).
+# Uploads stay in Flask: they return 202 at once and the model work runs on
+# the upload job pool, so they never held a request thread for the round-trip.
+
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 16))
+
+flask_app = create_app()
+
+if gateway.async_backend is None:
+    gateway.async_backend = create_async_backend()
+
+wsgi = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+
+
+# ---- Requests / responses ----
+
+class AsyncRequest:
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.method = scope["method"]
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        self.body = body
+        self.session = {}
+
+    def load_session(self):
+        # Read-only view of the Flask session; these endpoints never write it
+        environ = {"REQUEST_METHOD": self.method, "HTTP_COOKIE": self.headers.get("cookie", "")}
+        self.session = flask_app.session_interface.open_session(flask_app, WsgiRequest(environ)) or {}
+
+    @property
+    def user_id(self):
+        user_id = self.session.get("user_id")
+        if user_id is None and AUTO_LOGIN:
+            return 1  # mirrors the auto_login hook in app.py
+        return user_id
+
+    def get_json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            return None
+
+
+async def read_body(receive, limit):
+    parts, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if limit and size > limit:
+            return None
+        parts.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(parts)
+
+
+async def send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    headers += [(k.encode("latin-1"), v.encode("latin-1")) for k, v in extra_headers]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+# ---- Async endpoints ----
+# Handlers return (status, payload). Every SQLite call (session, cache, bank,
+# storage) runs in a worker thread: even a cache hit writes its access time,
+# and a locked database must not stall the event loop.
+
+routes = {}
+
+
+def route(path):
+    def register(handler):
+        routes[path] = handler
+        return handler
+    return register
+
+
+async def generate_quiz_from_text(text, difficulty="Easy"):
+    if count_tokens(text) > QUIZ_INPUT_TOKENS:
+        # Whole documents pasted as a summary: condensed by the threaded map-reduce
+        text = await asyncio.to_thread(generate_summary, text)
+    key, chat_request = quiz_request(text, difficulty)
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        return cached
+
+    try:
+        resp = await gateway.achat(**chat_request)
+    except RateLimited:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"OpenAI request failed: {e}")
+    return await asyncio.to_thread(quiz_from_response, key, resp)
+
+
+async def assemble_quiz(text, difficulty="Easy", exclude=()):
+    # Same flow as app.assemble_quiz
+    source = source_key(text)
+    with metrics.stage("bank"):
+        bank = await asyncio.to_thread(storage.bank_questions, source, difficulty)
+    generated = []
+    if len(bank) < QUIZ_SIZE:
+        quiz = await generate_quiz_from_text(text, difficulty)
+        bank = await asyncio.to_thread(bank_add, source, difficulty, quiz["questions"])
+        if not bank:
+            return quiz
+        generated = quiz["questions"]
+    return await asyncio.to_thread(quiz_from_bank, text, source, difficulty, bank, generated, exclude)
+
+
+@route("/generate_quiz")
+async def generate_quiz(req):
+    data = req.get_json() or {}
+    summary = data.get("summary")
+    difficulty = data.get("difficulty", "Easy")
+    if not summary:
+        return 400, {"error": "Summary required"}
+    try:
+        with metrics.stage("quiz"):
+            exclude = await asyncio.to_thread(recent_question_keys, req.user_id)
+            quiz = await assemble_quiz(summary, difficulty, exclude)
+    except RateLimited as e:
+        return 429, {"error": str(e)}
+    except Exception as e:
+        return 500, {"error": f"Failed to generate quiz: {e}"}
+    with metrics.stage("save"):
+        quiz_id = await asyncio.to_thread(store_served_quiz, req.user_id, summary, quiz["questions"], difficulty)
+    return 200, {"quiz": quiz, "quiz_id": quiz_id}
+
+
+@route("/generate_flashcards")
+async def generate_flashcards(req):
+    data = req.get_json() or {}
+    summary = data.get("summary", "")
+    if not summary:
+        return 400, {"error": "No summary provided"}
+
+    user_id = req.user_id
+    if user_id:
+        stored = await asyncio.to_thread(storage.find_flashcards, user_id, summary)
+        if stored:
+            return 200, {"flashcards": stored}
+
+    key = flashcards_key(summary)
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        return 200, {"flashcards": cached}
+
+    try:
+        resp = await gateway.achat(**flashcards_request(summary))
+        return 200, {"flashcards": await asyncio.to_thread(flashcards_from_response, key, resp)}
+    except RateLimited as e:
+        return 429, {"error": str(e)}
+    except Exception as e:
+        print("Flashcards generation failed:", e)
+        return 500, {"error": "Failed to generate flashcards"}
+
+
+async def handle(handler, scope, receive, send):
+    start = time.perf_counter()
+    profile = None
+    if scope["method"] != "POST":
+        status, payload = 405, {"error": "Method not allowed"}
+    else:
+        body = await read_body(receive, flask_app.config.get("MAX_CONTENT_LENGTH"))
+        if body is None:
+            status, payload = 413, {"error": "Request body too large"}
+        else:
+            req = AsyncRequest(scope, body)
+            await asyncio.to_thread(req.load_session)
+            if PROFILING_ENABLED and req.headers.get("x-profile"):
+                profile = metrics.start_profile()
+            # Model calls made while handling this request count against this user
+            current_user.set(req.user_id)
+            status, payload = await handler(req)
+
+    elapsed = time.perf_counter() - start
+    metrics.REQUEST_SECONDS.observe(elapsed, endpoint=scope["path"], method=scope["method"], status=status)
+    headers = []
+    if profile is not None:
+        breakdown = profile + [("total", elapsed)]
+        headers.append(("Server-Timing", metrics.server_timing(breakdown)))
+        headers.append(("X-Stage-Breakdown", json.dumps({name: round(sec, 6) for name, sec in breakdown})))
+        metrics.stop_profile()
+    await send_json(send, status, payload, headers)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            backend = gateway.async_backend
+            # A client that was never used was never built; nothing to close
+            if getattr(backend, "loaded", True) and getattr(backend, "close", None) is not None:
+                await backend.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    handler = routes.get(scope["path"]) if scope["type"] == "http" else None
+    if handler is None:
+        await wsgi(scope, receive, send)
+        return
+    await handle(handler, scope, receive, send)
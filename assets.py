@@ -0,0 +1,141 @@
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+import mimetypes
+
+from flask import send_file, abort
+from werkzeug.security import safe_join
+
+# Optional: brotli copies next to the gzip ones when the package is installed
+try:
+    import brotli
+    HAVE_BROTLI = True
+except Exception:
+    HAVE_BROTLI = False
+
+# --- Static asset build: content-hashed names + precompressed copies ---
+#   python assets.py        (gunicorn.conf.py also runs it before forking)
+# Every file under static/ is copied to static/dist/ under a name carrying a
+# hash of its content (css/home.css -> dist/css/home.1a2b3c4d5e.css); text
+# assets also get .gz (and .br) copies. manifest.json maps original names to
+# hashed ones, and templates link through asset_url(), so a changed file gets
+# a new URL and every hashed URL can be cached forever. url(/static/...)
+# references inside CSS are rewritten to hashed URLs before the CSS itself is
+# hashed. Old hashed files are left in place for pages still linking to them.
+
+DIST = "dist"
+MANIFEST = "manifest.json"
+HASH_LENGTH = 10
+COMPRESSIBLE = {".css", ".js", ".json", ".svg", ".txt", ".html", ".map"}
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+CSS_URL = re.compile(r"""url\((['"]?)/static/([^'")?#]+)\1\)""")
+
+
+def _sources(static_dir):
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir):
+            dirs[:] = [d for d in dirs if d != DIST]
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if not name.startswith("."):
+                yield os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, "/")
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(static_dir, url_path="/static"):
+    manifest = {}
+    written = 0
+    # CSS last, so the files it references already have hashed names
+    for rel in sorted(_sources(static_dir), key=lambda r: (r.endswith(".css"), r)):
+        with open(os.path.join(static_dir, rel), "rb") as f:
+            data = f.read()
+        if rel.endswith(".css"):
+            css = data.decode("utf-8")
+            css = CSS_URL.sub(
+                lambda m: f"url({m.group(1)}{url_path}/{manifest.get(m.group(2), m.group(2))}{m.group(1)})", css
+            )
+            data = css.encode("utf-8")
+        root, ext = os.path.splitext(rel)
+        name = f"{DIST}/{root}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+        manifest[rel] = name
+        target = os.path.join(static_dir, name)
+        if os.path.exists(target):
+            continue
+        _write(target, data)
+        written += 1
+        if ext.lower() in COMPRESSIBLE:
+            compressed = gzip.compress(data, 9, mtime=0)
+            if len(compressed) < len(data):
+                _write(target + ".gz", compressed)
+            if HAVE_BROTLI:
+                compressed = brotli.compress(data)
+                if len(compressed) < len(data):
+                    _write(target + ".br", compressed)
+    _write(os.path.join(static_dir, DIST, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+    return manifest, written
+
+
+class StaticAssets:
+    def __init__(self, static_dir, url_path="/static", max_age=365 * 24 * 3600):
+        self.static_dir = static_dir
+        self.url_path = url_path
+        self.max_age = max_age
+        self.manifest = {}
+
+    def load(self):
+        try:
+            with open(os.path.join(self.static_dir, DIST, MANIFEST), encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}  # not built: plain /static URLs
+        return self.manifest
+
+    def url(self, filename):
+        return f"{self.url_path}/{self.manifest.get(filename, filename)}"
+
+    def send(self, filename, accept_encodings):
+        # Hashed files only: precompressed copy when the client takes it, cached for good
+        path = safe_join(self.static_dir, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        encoding = None
+        for name, suffix in ENCODINGS:
+            if accept_encodings.quality(name) > 0 and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, name
+                break
+        response = send_file(path, mimetype=mimetype, max_age=self.max_age, conditional=True)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    def is_hashed(self, filename):
+        return filename.startswith(DIST + "/") and filename != f"{DIST}/{MANIFEST}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build content-hashed, precompressed static assets")
+    parser.add_argument("--static", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+    args = parser.parse_args(argv)
+    manifest, written = build(args.static)
+    print(f"{len(manifest)} assets, {written} new files in {os.path.join(args.static, DIST)}"
+          f"{'' if HAVE_BROTLI else ' (gzip only: brotli not installed)'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
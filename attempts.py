@@ -0,0 +1,98 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from bank import valid_question, question_key
+
+# --- Quiz attempts: server-side grading + group-committed attempt log ---
+# Attempts are graded against the quiz as stored, never against a score sent
+# by the client. Graded attempts are handed to a single writer thread that
+# commits whatever has queued up in one transaction, so a burst at the end of
+# an exam costs one commit per batch rather than one per submission. Each
+# submitter waits for the commit that contains its attempt.
+
+
+def grade_attempt(questions, answers):
+    # answers: chosen option key per question, by position (None = skipped)
+    results = []
+    graded = []
+    score = 0
+    for i, q in enumerate(questions):
+        if not valid_question(q):
+            continue
+        chosen = answers[i] if i < len(answers) else None
+        chosen = chosen.strip().upper() if isinstance(chosen, str) and chosen.strip() else None
+        correct = chosen == q["answer"]
+        score += correct
+        results.append({"index": i, "chosen": chosen, "answer": q["answer"], "correct": correct})
+        graded.append((question_key(q), chosen, correct))
+    return {"score": score, "total": len(results), "results": results}, graded
+
+
+def with_answers(questions, chosen):
+    # Stored answers skip invalid questions the same way grade_attempt does
+    chosen = iter(chosen)
+    return [dict(q, user_answer=next(chosen, None)) if valid_question(q) else q for q in questions]
+
+
+class AttemptWriter:
+    def __init__(self, storage, max_batch=500, linger=0.002):
+        self.storage = storage
+        self.max_batch = max_batch
+        self.linger = linger  # extra wait for stragglers once a batch has started
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.written = 0
+
+    def submit(self, record):
+        # Returns a Future that resolves once the record is committed
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((record, future))
+        return future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_thread(self):
+        # Started on first use, so a pre-fork server gets one writer per worker
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="attempt-writer", daemon=True)
+                self._thread.start()
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self.storage.save_attempts([record for record, _ in batch])
+            except Exception as e:
+                print(f"Attempt batch of {len(batch)} failed:", e)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.written += len(batch)
+            for _, future in batch:
+                future.set_result(True)
@@ -0,0 +1,103 @@
+import re
+import math
+import random
+from collections import Counter
+
+from cache import make_key
+
+# --- Shared question bank helpers: validation, TF-IDF dedup, sampling ---
+# Questions are banked per source text and difficulty. A new question is
+# dropped when its TF-IDF cosine similarity to a banked one (or to one kept
+# earlier in the same batch) reaches the threshold, so reworded repeats of
+# the same question don't inflate the bank.
+
+_word_re = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by does did do for from has have how in is it its of on or "
+    "that the their this to was were what when where which who whom why with".split()
+)
+
+
+def source_key(text):
+    return make_key("question-source", text.strip())
+
+
+def valid_question(q):
+    if not isinstance(q, dict) or not isinstance(q.get("question"), str) or not q["question"].strip():
+        return False
+    options = q.get("options")
+    if not isinstance(options, dict) or len(options) < 2:
+        return False
+    return q.get("answer") in options
+
+
+def question_key(q):
+    return make_key(" ".join(_word_re.findall(q["question"].lower())))
+
+
+def _terms(q):
+    text = q["question"] + " " + " ".join(str(v) for v in q["options"].values())
+    return [t for t in _word_re.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+def _vectors(term_lists):
+    df = Counter()
+    for terms in term_lists:
+        df.update(set(terms))
+    n = len(term_lists)
+    vectors = []
+    for terms in term_lists:
+        vec = {t: (1 + math.log(c)) * (math.log((1 + n) / (1 + df[t])) + 1) for t, c in Counter(terms).items()}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        vectors.append({t: w / norm for t, w in vec.items()})
+    return vectors
+
+
+def _cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(t, 0.0) for t, w in a.items())
+
+
+def new_questions(banked, candidates, threshold=0.8):
+    # Returns the candidates that are valid and not near-duplicates, in order
+    candidates = [q for q in candidates if valid_question(q)]
+    if not candidates:
+        return []
+    vectors = _vectors([_terms(q) for q in banked] + [_terms(q) for q in candidates])
+    kept_vectors = vectors[:len(banked)]
+    seen = {question_key(q) for q in banked}
+    kept = []
+    for q, vec in zip(candidates, vectors[len(banked):]):
+        key = question_key(q)
+        if key in seen or any(_cosine(vec, other) >= threshold for other in kept_vectors):
+            continue
+        seen.add(key)
+        kept.append(q)
+        kept_vectors.append(vec)
+    return kept
+
+
+def sample_questions(bank, count, exclude=()):
+    # Prefers questions the user has not just seen; tops up from the rest
+    fresh = [q for q in bank if question_key(q) not in exclude]
+    picked = random.sample(fresh, min(count, len(fresh)))
+    if len(picked) < count:
+        rest = [q for q in bank if question_key(q) in exclude]
+        picked += random.sample(rest, min(count - len(picked), len(rest)))
+    random.shuffle(picked)
+    return picked
+
+
+def top_up(picked, extra, count):
+    # Fills picked up to count from extra, skipping questions already picked
+    seen = {question_key(q) for q in picked}
+    picked = list(picked)
+    for q in extra:
+        if len(picked) >= count:
+            break
+        key = question_key(q)
+        if valid_question(q) and key not in seen:
+            seen.add(key)
+            picked.append(q)
+    return picked
@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import argparse
+from datetime import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from werkzeug.utils import secure_filename
+
+from cache import make_key
+from metrics import LLM_TOKENS
+from utils import allowed_file, extract_pdf_text, extract_text_from_file
+
+# --- Batch ingestion: whole course folders / zips -> summaries + quizzes ---
+# Extraction fans out over a process pool. Prompts go to the provider's batch
+# API (BATCH_BACKEND=openai) or to a local stand-in that runs the same
+# requests through the model gateway. Per-file progress is kept in the batch
+# tables, so running the same batch again skips the files already done.
+
+
+# ---- Inputs ----
+
+def _safe_relpath(name):
+    parts = [secure_filename(p) for p in name.replace("\\", "/").split("/")]
+    return "/".join(p for p in parts if p)
+
+
+def unpack_zip(source, dest, prefix="", max_bytes=512 * 1024 * 1024):
+    # Unpacks supported files from a zip (path or file object); returns [(name, path)]
+    items = []
+    with zipfile.ZipFile(source) as zf:
+        members = [m for m in zf.infolist() if not m.is_dir() and allowed_file(m.filename)]
+        if sum(m.file_size for m in members) > max_bytes:
+            raise ValueError("Zip archive is too large once unpacked")
+        for member in members:
+            name = _safe_relpath(member.filename)
+            if not name:
+                continue
+            target = os.path.join(dest, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with zf.open(member) as src, open(target, "wb") as out:
+                shutil.copyfileobj(src, out)
+            items.append((f"{prefix}{name}", target))
+    return items
+
+
+def collect_inputs(paths, unpack_dir):
+    # Expands folders and zips into [(name, path)] of supported files
+    items = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            base = os.path.dirname(path)
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for f in sorted(files):
+                    if allowed_file(f):
+                        full = os.path.join(root, f)
+                        items.append((os.path.relpath(full, base), full))
+        elif path.lower().endswith(".zip"):
+            stem = os.path.splitext(os.path.basename(path))[0]
+            items += unpack_zip(path, os.path.join(unpack_dir, stem), prefix=f"{stem}/")
+        elif allowed_file(path):
+            items.append((os.path.basename(path), path))
+    return items
+
+
+# ---- Extraction (process pool) ----
+
+def create_extract_pool(workers):
+    # spawn, not fork: the web app is multi-threaded
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _extract(path):
+    try:
+        if path.lower().endswith(".pdf"):
+            # One process per file already; don't fan pages out again
+            return extract_pdf_text(path, workers=1), None
+        return extract_text_from_file(path, path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def extract_files(items, pool=None):
+    # items: [(key, path)]; yields (key, text, error) as files finish
+    if pool is None:
+        for key, path in items:
+            yield (key, *_extract(path))
+        return
+    futures = {pool.submit(_extract, path): key for key, path in items}
+    for future in as_completed(futures):
+        yield (futures[future], *future.result())
+
+
+# ---- Model requests ----
+# A request is (custom_id, chat_kwargs); run() returns ({custom_id: text}, {custom_id: error}).
+
+class LocalBatchRunner:
+    # Stand-in for a provider batch API: the same requests, run through the gateway
+    name = "local"
+
+    def __init__(self, chat, concurrency=4):
+        self.chat = chat
+        self.concurrency = concurrency
+
+    def run(self, requests, ref=None, on_submit=None):
+        results, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-local") as pool:
+            futures = {pool.submit(self.chat, **body): custom_id for custom_id, body in requests}
+            for future in as_completed(futures):
+                custom_id = futures[future]
+                try:
+                    results[custom_id] = future.result().choices[0].message.content
+                except Exception as e:
+                    errors[custom_id] = str(e)
+        return results, errors
+
+
+class OpenAIBatchRunner:
+    # OpenAI Batch API: one JSONL upload per request set, polled until it finishes.
+    # `ref` is the provider batch id from an earlier, interrupted run.
+    name = "openai"
+    TERMINAL = ("completed", "failed", "expired", "cancelled")
+
+    def __init__(self, client, poll_interval=30):
+        self.client = client
+        self.poll_interval = poll_interval
+
+    def run(self, requests, ref=None, on_submit=None):
+        batch = self.client.batches.retrieve(ref) if ref else None
+        if batch is None or batch.status in ("failed", "expired", "cancelled"):
+            batch = self._submit(requests)
+            if on_submit:
+                on_submit(batch.id)
+        while batch.status not in self.TERMINAL:
+            time.sleep(self.poll_interval)
+            batch = self.client.batches.retrieve(batch.id)
+
+        results, errors = {}, {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                body = response.get("body") or {}
+                if response.get("status_code") == 200 and body.get("choices"):
+                    results[record["custom_id"]] = body["choices"][0]["message"]["content"]
+                    usage = body.get("usage") or {}
+                    LLM_TOKENS.inc(usage.get("prompt_tokens", 0), model=body.get("model", ""), kind="prompt")
+                    LLM_TOKENS.inc(usage.get("completion_tokens", 0), model=body.get("model", ""), kind="completion")
+                else:
+                    errors[record["custom_id"]] = json.dumps(record.get("error") or body)
+        for custom_id, _ in requests:
+            if custom_id not in results and custom_id not in errors:
+                errors[custom_id] = f"Batch {batch.id} ended with status {batch.status}"
+        return results, errors
+
+    def _submit(self, requests):
+        payload = "\n".join(
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body})
+            for custom_id, body in requests
+        )
+        upload = self.client.files.create(file=("batch.jsonl", payload.encode("utf-8")), purpose="batch")
+        return self.client.batches.create(
+            input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+
+
+# ---- Progress ----
+
+class Throughput:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.done = 0
+        self.failed = 0
+
+    def add(self, done=0, failed=0):
+        self.done += done
+        self.failed += failed
+
+    def per_minute(self):
+        return self.done * 60 / max(time.monotonic() - self.started, 1e-6)
+
+    def to_dict(self):
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "seconds": round(time.monotonic() - self.started, 2),
+            "docs_per_minute": round(self.per_minute(), 2)
+        }
+
+
+# ---- CLI ----
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Pre-generate summaries and quizzes for a folder, zip or list of notes. "
+                    "Re-running the same command resumes an interrupted batch."
+    )
+    parser.add_argument("paths", nargs="*", help="files, folders or .zip archives")
+    parser.add_argument("--difficulty", default="Easy")
+    parser.add_argument("--user-id", type=int, help="also save each quiz to this user's history")
+    parser.add_argument("--batch-id", help="defaults to a hash of the inputs, so reruns resume")
+    parser.add_argument("--retry-failed", action="store_true", help="retry files that failed last time")
+    args = parser.parse_args(argv)
+    if not args.paths and not args.batch_id:
+        parser.error("give input paths, or --batch-id to resume a batch")
+
+    # Imported here: batch.py is also loaded by the extraction worker processes
+    import app as notes2quiz
+    notes2quiz.create_app()
+
+    batch_id = args.batch_id or make_key(
+        "batch", sorted(os.path.abspath(p) for p in args.paths), args.difficulty, args.user_id
+    )[:16]
+    if args.paths:
+        items = collect_inputs(args.paths, os.path.join(notes2quiz.BATCH_FOLDER, batch_id))
+        notes2quiz.storage.create_batch(batch_id, args.user_id, args.difficulty, items, datetime.now().isoformat())
+    elif notes2quiz.storage.get_batch(batch_id) is None:
+        parser.error(f"unknown batch {batch_id}")
+    if args.retry_failed:
+        notes2quiz.storage.reset_failed_batch_items(batch_id)
+
+    print(f"Batch {batch_id}: {notes2quiz.storage.batch_progress(batch_id)}")
+    summary = notes2quiz.run_batch(batch_id, progress=lambda p: print(json.dumps(p)))
+    print(json.dumps(summary))
+    return 0 if not summary["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
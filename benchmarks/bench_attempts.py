@@ -0,0 +1,77 @@
+# Benchmark: attempt ingestion, one transaction per submission vs the
+# group-committing AttemptWriter.
+#
+#   python benchmarks/bench_attempts.py --threads 64 --attempts 5000
+#
+# Simulates the end of an exam: many students submit at once. Each submitter
+# grades its attempt and waits until it is committed, as /save_attempt does.
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from storage import Storage
+from attempts import AttemptWriter, grade_attempt
+
+
+def setup(path, users, questions_per_quiz):
+    storage = Storage(path)
+    quizzes = []
+    for u in range(users):
+        user = storage.create_user(f"Student {u}", f"s{u}@example.com", "x")
+        questions = [
+            {"question": f"Question {i} about topic {i % 7} for exam?",
+             "options": {"A": "alpha", "B": "beta", "C": "gamma", "D": "delta"}, "answer": "ABCD"[i % 4]}
+            for i in range(questions_per_quiz)
+        ]
+        quiz = storage.add_quiz(user["id"], "2026-01-01T09:00:00", questions, difficulty="Medium")
+        quizzes.append((user, quiz))
+    return storage, quizzes
+
+
+def run(label, storage, quizzes, attempts, threads, submit):
+    def one(i):
+        user, quiz = quizzes[i % len(quizzes)]
+        answers = [random.choice("ABCD") for _ in quiz["questions"]]
+        result, graded = grade_attempt(quiz["questions"], answers)
+        submit(dict(user_id=user["id"], name=user["name"], quiz_id=quiz["id"], date="2026-01-01T10:00:00",
+                    score=result["score"], total=result["total"], difficulty="Medium", graded=graded))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(attempts)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:22} {attempts / elapsed:9.0f} attempts/s   ({elapsed:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark attempt ingestion")
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--attempts", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage, quizzes = setup(os.path.join(tmp, "direct.db"), args.users, args.questions)
+        run("commit per attempt", storage, quizzes, args.attempts, args.threads,
+            lambda record: storage.save_attempts([record]))
+
+        storage, quizzes = setup(os.path.join(tmp, "grouped.db"), args.users, args.questions)
+        writer = AttemptWriter(storage)
+        run("group commit", storage, quizzes, args.attempts, args.threads,
+            lambda record: writer.submit(record).result())
+        print(f"{'':22} {writer.batches} commits, {writer.written / max(1, writer.batches):.1f} attempts per commit")
+
+        count = storage._conn().execute("SELECT COUNT(*) FROM attempt").fetchone()[0]
+        print(f"{'':22} {count} attempt rows, question stats rows: "
+              f"{storage._conn().execute('SELECT COUNT(*) FROM question_stats').fetchone()[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Benchmark: MinHash/LSH near-duplicate index lookup time and memory vs corpus size.
+#
+#   python benchmarks/bench_minhash.py --sizes 1000 10000 100000
+#
+# Corpus signatures are synthetic (random bins, i.e. unrelated documents);
+# signature cost on real text is measured separately on a ~10k-word note.
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dedup import LSHIndex, NUM_PERM, signature
+
+WORDS = ("cell membrane protein enzyme energy glucose oxygen carbon nitrogen water light "
+         "plant animal tissue organ system blood heart lung brain nerve muscle bone").split()
+
+
+def random_signature(rng):
+    return array("I", (rng.getrandbits(32) for _ in range(NUM_PERM)))
+
+
+def near_copy(sig, rng, changed_bins=6):
+    # ~95% of bins equal: what a re-exported PDF with a new footer looks like
+    copy = array("I", sig)
+    for i in rng.sample(range(NUM_PERM), changed_bins):
+        copy[i] = rng.getrandbits(32)
+    return copy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MinHash/LSH index scaling")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    text = " ".join(rng.choice(WORDS) for _ in range(10000))
+    start = time.perf_counter()
+    signature(text)
+    print(f"signature of a 10k-word note: {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    print(f"{'docs':>8} {'build':>8} {'memory':>9} {'hit lookup':>11} {'miss lookup':>12} {'recall':>7}")
+    for size in args.sizes:
+        corpus = [random_signature(rng) for _ in range(size)]
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = LSHIndex()
+        for doc_id, sig in enumerate(corpus, 1):
+            index.add(doc_id, sig)
+        build = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        picks = [rng.randrange(size) for _ in range(args.queries)]
+        probes = [near_copy(corpus[i], rng) for i in picks]
+        start = time.perf_counter()
+        found = sum(1 for i, probe in zip(picks, probes) if any(d == i + 1 for _, d in index.query(probe, 0.9)))
+        hit = (time.perf_counter() - start) / args.queries
+
+        misses = [random_signature(rng) for _ in range(args.queries)]
+        start = time.perf_counter()
+        for probe in misses:
+            index.query(probe, 0.9)
+        miss = (time.perf_counter() - start) / args.queries
+
+        print(f"{size:>8} {build:>7.2f}s {memory / 1e6:>7.1f}MB {hit * 1e6:>9.0f}us {miss * 1e6:>10.0f}us "
+              f"{found / args.queries:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Benchmark: regex-fallback parsing (original) vs the single-pass tolerant
+# parser, over the corpus of malformed model replies in parser_corpus/.
+#
+#   python benchmarks/bench_parser.py [--repeat 2000]
+#
+# For each reply it reports how many usable questions/flashcards each parser
+# recovers and the time per parse. The expected counts in expected.json are
+# checked too (and the answer keys, where a case lists them); the script exits
+# non-zero if the new parser misses any.
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from parsing import clean_question, clean_flashcard, parse_quiz_items, parse_flashcard_items
+
+CORPUS = os.path.join(HERE, "parser_corpus")
+
+
+# ---- Original parsing, as it was in app.py ----
+
+def legacy_quiz(text):
+    cleaned_text = re.sub(r"```(?:json)?|```", "", text).strip()
+    try:
+        return json.loads(cleaned_text)
+    except json.JSONDecodeError:
+        json_match = re.search(r"\[.*\]", cleaned_text, re.DOTALL)
+        if json_match:
+            try:
+                return json.loads(json_match.group(0))
+            except json.JSONDecodeError:
+                pass
+        return legacy_text_fallback(cleaned_text)
+
+
+def legacy_text_fallback(quiz_text):
+    questions = []
+    lines = [l.strip() for l in quiz_text.splitlines() if l.strip()]
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.lower().startswith('q') and '.' in line:
+            q_text = line.split('.', 1)[1].strip()
+            opts = {}
+            i += 1
+            for _ in range(4):
+                if i >= len(lines):
+                    break
+                part = lines[i]
+                if len(part) >= 2 and part[0] in ['A', 'B', 'C', 'D']:
+                    opts[part[0]] = part[2:].strip() if len(part) > 2 else ""
+                    i += 1
+                else:
+                    break
+            answer = None
+            if i < len(lines) and lines[i].lower().startswith('answer'):
+                if ':' in lines[i]:
+                    answer = lines[i].split(':', 1)[1].strip().split()[0]
+                i += 1
+            questions.append({"question": q_text, "options": opts, "answer": answer or ''})
+        else:
+            i += 1
+    return questions
+
+
+def legacy_flashcards(text):
+    cleaned = re.sub(r"```(?:json)?|```", "", text).strip()
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        match = re.search(r"\[.*\]", cleaned, re.DOTALL)
+        try:
+            return json.loads(match.group(0)) if match else []
+        except json.JSONDecodeError:
+            return []
+
+
+def usable(items, clean):
+    # What the app can actually show: items that pass the schema check
+    if not isinstance(items, list):
+        return 0
+    return sum(1 for item in items if clean(item) is not None)
+
+
+def time_per_call(fn, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quiz/flashcard reply parsing")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(os.path.join(CORPUS, "expected.json")) as f:
+        expected = json.load(f)
+
+    print(f"{'reply':40} {'want':>4} {'old':>4} {'new':>4} {'old us':>8} {'new us':>8}")
+    misses = 0
+    totals = [0, 0, 0.0, 0.0]
+    for name, case in sorted(expected.items()):
+        with open(os.path.join(CORPUS, name)) as f:
+            text = f.read()
+        if case["kind"] == "quiz":
+            old_fn, new_fn, clean = legacy_quiz, parse_quiz_items, clean_question
+        else:
+            old_fn, new_fn, clean = legacy_flashcards, parse_flashcard_items, clean_flashcard
+        old_n = usable(old_fn(text), clean)
+        new_items = new_fn(text)
+        new_n = len(new_items)
+        if "answers" in case and [q["answer"] for q in new_items] != case["answers"]:
+            new_n = sum(q["answer"] == a for q, a in zip(new_items, case["answers"]))  # wrong keys don't count
+        old_us = time_per_call(old_fn, text, args.repeat)
+        new_us = time_per_call(new_fn, text, args.repeat)
+        misses += new_n < case["expected"]
+        totals = [totals[0] + old_n, totals[1] + new_n, totals[2] + old_us, totals[3] + new_us]
+        flag = "" if new_n >= case["expected"] else "  <-- MISSED"
+        print(f"{name:40} {case['expected']:>4} {old_n:>4} {new_n:>4} {old_us:>8.1f} {new_us:>8.1f}{flag}")
+    print(f"{'total':40} {sum(c['expected'] for c in expected.values()):>4} "
+          f"{totals[0]:>4} {totals[1]:>4} {totals[2]:>8.1f} {totals[3]:>8.1f}")
+    return 1 if misses else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# Benchmark: worker start-up cost, measured with `python -X importtime`.
+#
+#   python benchmarks/bench_startup.py --runs 5
+#
+# Each run is a fresh interpreter that imports app, calls create_app() and
+# serves one GET /leaderboard, against throwaway database/cache paths and no
+# OpenAI key. Reports wall time per phase, the slowest imports, and whether
+# any of the heavy libraries (model SDK, PDF/DOCX parsers, reportlab) were
+# loaded along the way; they should only load on first upload/export/model call.
+# create_app() on a fresh database includes hashing the dev user's password.
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+HEAVY = ("openai", "PyPDF2", "docx2txt", "reportlab", "tiktoken")
+
+CHILD = """
+import sys, time, json
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+status = app.app.test_client().get("/leaderboard").status_code
+t3 = time.perf_counter()
+print(json.dumps({
+    "import": t1 - t0, "create_app": t2 - t1, "first_request": t3 - t2, "status": status,
+    "heavy": sorted(m for m in %r if m in sys.modules)
+}))
+""" % (HEAVY,)
+
+
+def parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package", nesting shown by indentation
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), int(self_us), name[1:].rstrip()))
+    return rows
+
+
+def run_once(workdir):
+    env = dict(
+        os.environ,
+        DATABASE_PATH=os.path.join(workdir, "students.db"), CACHE_PATH=os.path.join(workdir, "cache.db"),
+        SESSION_PATH=os.path.join(workdir, "sessions.db"), JOB_PATH=os.path.join(workdir, "jobs.db"),
+        UPLOAD_FOLDER=os.path.join(workdir, "uploads"),
+        EXPORT_FOLDER=os.path.join(workdir, "exports"), BATCH_FOLDER=os.path.join(workdir, "batches"),
+        OPENAI_API_KEY=""
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app start-up time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest top-level imports to list")
+    args = parser.parse_args()
+
+    results, imports = [], None
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            result, imports = run_once(workdir)
+        results.append(result)
+
+    for phase in ("import", "create_app", "first_request"):
+        values = sorted(r[phase] for r in results)
+        print(f"{phase:14} median {values[len(values) // 2] * 1000:8.1f}ms   min {values[0] * 1000:8.1f}ms")
+    print(f"{'leaderboard':14} status {results[-1]['status']}")
+    print(f"{'heavy loaded':14} {', '.join(results[-1]['heavy']) or 'none'}")
+
+    # Modules app imports directly (importtime indents nested imports two spaces per level)
+    top_level = [row for row in imports if row[2].startswith("  ") and not row[2].startswith("   ")]
+    top_level.sort(reverse=True)
+    print("\nslowest imports (last run, cumulative):")
+    for cumulative, _, name in top_level[:args.top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name.strip()}")
+    return 1 if results[-1]["heavy"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# Benchmark: save-then-reread uploads (original) vs parsing from the request stream.
+#
+#   python benchmarks/bench_upload_io.py --sizes 100000 1000000 8000000
+#
+# Bytes copied are read from /proc/self/io (rchar/wchar: bytes moved through
+# read/write syscalls), so they are only reported on Linux.
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+from reportlab.pdfgen import canvas
+
+from utils import extract_text_from_file, extract_text_from_stream
+
+LINE = "Mitochondria are the powerhouse of the cell and produce ATP through respiration. "
+
+
+def make_txt(size):
+    return (LINE * (size // len(LINE) + 1)).encode()[:size]
+
+
+def make_docx(size):
+    # Store uncompressed so the payload really is `size` bytes
+    body = "".join(f"<w:p><w:r><w:t>{LINE}</w:t></w:r></w:p>" for _ in range(size // (len(LINE) + 40) + 1))
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as z:
+        z.writestr("[Content_Types].xml", '<?xml version="1.0"?><Types/>')
+        z.writestr("word/document.xml",
+                   '<?xml version="1.0"?><w:document xmlns:w="http://schemas.openxmlformats.org/'
+                   f'wordprocessingml/2006/main"><w:body>{body}</w:body></w:document>')
+    return buf.getvalue()
+
+
+def make_pdf(size):
+    buf = io.BytesIO()
+    p = canvas.Canvas(buf, pageCompression=0)
+    written = 0
+    while written < size:
+        for line in range(45):
+            p.drawString(40, 800 - line * 17, LINE)
+        p.showPage()
+        written += 45 * (len(LINE) + 30)
+    p.save()
+    return buf.getvalue()
+
+
+def io_counters():
+    try:
+        with open("/proc/self/io") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return int(values["rchar"]) + int(values["wchar"])
+    except OSError:
+        return None
+
+
+def parsed_upload(data, filename):
+    builder = EnvironBuilder(method="POST", data={"file": (io.BytesIO(data), filename)})
+    return Request(builder.get_environ()).files["file"]
+
+
+def save_then_extract(file, filename, folder):
+    path = os.path.join(folder, filename)
+    file.save(path)
+    try:
+        return extract_text_from_file(path, filename)
+    finally:
+        os.remove(path)
+
+
+def stream_extract(file, filename, folder):
+    return extract_text_from_stream(file.stream, filename)
+
+
+def measure(fn, data, filename, folder, repeat):
+    times = []
+    copied = 0
+    for _ in range(repeat):
+        file = parsed_upload(data, filename)  # multipart parsing is the same for both paths
+        before = io_counters()
+        start = time.perf_counter()
+        fn(file, filename, folder)
+        times.append(time.perf_counter() - start)
+        after = io_counters()
+        if before is not None:
+            copied += after - before
+    return min(times), copied // repeat if before is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload I/O: save+reread vs stream parsing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 8_000_000])
+    parser.add_argument("--types", nargs="+", default=["txt", "docx", "pdf"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    makers = {"txt": make_txt, "docx": make_docx, "pdf": make_pdf}
+
+    print(f"{'type':>5} {'size':>10} {'saved+reread':>13} {'copied':>10} {'stream':>9} {'copied':>10}")
+    with tempfile.TemporaryDirectory() as folder:
+        for kind in args.types:
+            for size in args.sizes:
+                data = makers[kind](size)
+                name = f"bench.{kind}"
+                old_t, old_b = measure(save_then_extract, data, name, folder, args.repeat)
+                new_t, new_b = measure(stream_extract, data, name, folder, args.repeat)
+                fmt = lambda b: "n/a" if b is None else f"{b / 1e6:.2f}MB"
+                print(f"{kind:>5} {len(data):>10} {old_t * 1000:>11.1f}ms {fmt(old_b):>10} "
+                      f"{new_t * 1000:>7.1f}ms {fmt(new_b):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Local OpenAI-compatible model server for load tests (no API key, no cost).
+#
+#   python benchmarks/fake_model_server.py --port 8900 --latency 1.0
+#   OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=fake uvicorn asgi:application
+#
+# Serves POST /v1/chat/completions (plain and stream=true) with the same
+# canned replies as the stub backend, after a fixed latency. Failures are
+# injected as 429/500/503 at the given rate.
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import uvicorn
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from llm import stub_reply
+
+
+def create_app(latency=1.0, failure_rate=0.0, tokens_per_second=0.0):
+    async def read_json(receive):
+        parts = []
+        while True:
+            message = await receive()
+            parts.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return json.loads(b"".join(parts) or b"{}")
+
+    async def respond(send, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        if scope["path"] != "/v1/chat/completions" or scope["method"] != "POST":
+            await respond(send, 404, {"error": {"message": "not found"}})
+            return
+        request = await read_json(receive)
+        await asyncio.sleep(latency)
+        if failure_rate and random.random() < failure_rate:
+            status = random.choice([429, 500, 503])
+            await respond(send, status, {"error": {"message": f"injected {status}", "type": "fake"}})
+            return
+
+        messages = request.get("messages") or []
+        text = stub_reply(messages[-1]["content"] if messages else "")
+        created = int(time.time())
+        model = request.get("model", "fake")
+        if not request.get("stream"):
+            if tokens_per_second:
+                await asyncio.sleep(len(text) / 4 / tokens_per_second)
+            await respond(send, 200, {
+                "id": f"chatcmpl-fake-{random.getrandbits(32):x}", "object": "chat.completion",
+                "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": sum(len(m.get("content", "")) // 4 for m in messages),
+                          "completion_tokens": len(text) // 4,
+                          "total_tokens": sum(len(m.get("content", "")) // 4 for m in messages) + len(text) // 4}
+            })
+            return
+
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")]})
+        step = 16
+        for i in range(0, len(text), step):
+            if tokens_per_second:
+                await asyncio.sleep(step / 4 / tokens_per_second)
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": text[i:i + step]}, "finish_reason": None}]}
+            await send({"type": "http.response.body", "body": f"data: {json.dumps(chunk)}\n\n".encode(),
+                        "more_body": True})
+        await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds before each reply")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="0 = reply all at once")
+    args = parser.parse_args()
+    app = create_app(args.latency, args.failure_rate, args.tokens_per_second)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", backlog=4096)
+
+
+if __name__ == "__main__":
+    main()
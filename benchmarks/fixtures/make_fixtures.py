@@ -0,0 +1,74 @@
+# Regenerates the upload fixtures for benchmarks/suite.py:
+#
+#   python benchmarks/fixtures/make_fixtures.py
+#
+# lecture.txt is the source; lecture.pdf and lecture.docx carry the same text.
+# Each file contains the marker VARIANT-0000 exactly once, stored uncompressed,
+# so the suite can swap in a same-length per-request value (VARIANT-0042) and
+# every upload is a cache miss without re-rendering the document (the PDF is
+# patched in place; the DOCX is re-zipped, since its entries carry a CRC).
+import io
+import os
+import zipfile
+from xml.sax.saxutils import escape
+
+from reportlab.pdfgen import canvas
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MARKER = "VARIANT-0000"
+
+
+def make_pdf(lines):
+    buf = io.BytesIO()
+    # Uncompressed page streams keep the marker patchable; invariant drops timestamps
+    p = canvas.Canvas(buf, pageCompression=0, invariant=1)
+    y = 800
+    for line in lines:
+        if y < 50:
+            p.showPage()
+            y = 800
+        p.drawString(40, y, line)
+        y -= 16
+    p.showPage()
+    p.save()
+    return buf.getvalue()
+
+
+def make_docx(lines):
+    body = "".join(f"<w:p><w:r><w:t>{escape(line)}</w:t></w:r></w:p>" for line in lines)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as z:
+        for name in ("[Content_Types].xml", "word/document.xml"):
+            info = zipfile.ZipInfo(name, date_time=(2024, 1, 1, 0, 0, 0))
+            if name == "[Content_Types].xml":
+                z.writestr(info, '<?xml version="1.0"?><Types/>')
+            else:
+                z.writestr(info, '<?xml version="1.0"?><w:document xmlns:w="http://schemas.openxmlformats.org/'
+                                 f'wordprocessingml/2006/main"><w:body>{body}</w:body></w:document>')
+    return buf.getvalue()
+
+
+def main():
+    with open(os.path.join(HERE, "lecture.txt"), encoding="utf-8") as f:
+        text = f.read()
+    assert text.count(MARKER) == 1, "lecture.txt must contain the marker once"
+    # Wrap to PDF line width
+    lines = []
+    for paragraph in text.splitlines():
+        words, line = paragraph.split(), ""
+        for word in words:
+            if len(line) + len(word) + 1 > 90:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        lines.append(line)
+    for name, data in (("lecture.pdf", make_pdf(lines)), ("lecture.docx", make_docx(text.splitlines()))):
+        assert data.count(MARKER.encode()) == 1, name
+        with open(os.path.join(HERE, name), "wb") as f:
+            f.write(data)
+        print(f"{name}: {len(data)} bytes")
+
+
+if __name__ == "__main__":
+    main()
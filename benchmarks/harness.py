@@ -0,0 +1,159 @@
+# Shared pieces for the load tests: start the fake model server and the app
+# under uvicorn in throwaway directories, and drive them with a small raw
+# asyncio HTTP/1.1 client (one connection per request, like a browser burst).
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import subprocess
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+HOST = "127.0.0.1"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def wait_listening(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def start_model_server(latency=1.0, failure_rate=0.0, tokens_per_second=0.0):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_model_server.py"), "--port", str(port),
+         "--latency", str(latency), "--failure-rate", str(failure_rate),
+         "--tokens-per-second", str(tokens_per_second)]
+    )
+    wait_listening(port)
+    return proc, port
+
+
+def app_env(workdir, model_port, **overrides):
+    # Every path the app writes to lives under workdir; model calls go to the fake server
+    env = dict(
+        os.environ,
+        LLM_BACKEND="openai", OPENAI_API_KEY="fake", OPENAI_BASE_URL=f"http://{HOST}:{model_port}/v1",
+        LLM_RATE="100000", LLM_BURST="100000", LLM_USER_RATE="100000", LLM_USER_BURST="100000",
+        QUESTION_BANK_TARGET="10",  # no background bank refills during a run
+        DATABASE_PATH=os.path.join(workdir, "students.db"), CACHE_PATH=os.path.join(workdir, "cache.db"),
+        SESSION_PATH=os.path.join(workdir, "sessions.db"), JOB_PATH=os.path.join(workdir, "jobs.db"),
+        UPLOAD_FOLDER=os.path.join(workdir, "uploads"),
+        EXPORT_FOLDER=os.path.join(workdir, "exports"), BATCH_FOLDER=os.path.join(workdir, "batches")
+    )
+    env.update({k: str(v) for k, v in overrides.items()})
+    return env
+
+
+def serve(target, env):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--host", HOST, "--port", str(port),
+         "--log-level", "warning", "--no-access-log", "--backlog", "4096"],
+        cwd=ROOT, env=env
+    )
+    try:
+        wait_ready(f"http://{HOST}:{port}/cache/stats")
+    except RuntimeError:
+        proc.terminate()
+        raise
+    return proc, port
+
+
+def stop(proc):
+    proc.terminate()
+    proc.wait()
+
+
+def _dechunk(body):
+    out, pos = [], 0
+    while True:
+        end = body.index(b"\r\n", pos)
+        size = int(body[pos:end].split(b";")[0], 16)
+        if size == 0:
+            return b"".join(out)
+        out.append(body[end + 2:end + 2 + size])
+        pos = end + 4 + size
+
+
+async def request(port, method, path, body=b"", headers=()):
+    # Returns (status, headers, body)
+    reader, writer = await asyncio.open_connection(HOST, port)
+    head = f"{method} {path} HTTP/1.1\r\nHost: {HOST}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in headers)
+    writer.write(head.encode("latin-1") + b"\r\n" + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    raw_head, _, payload = response.partition(b"\r\n\r\n")
+    lines = raw_head.decode("latin-1").split("\r\n")
+    response_headers = {k.strip().lower(): v.strip() for k, v in (line.split(":", 1) for line in lines[1:])}
+    if response_headers.get("transfer-encoding") == "chunked":
+        payload = _dechunk(payload)
+    return int(lines[0].split(" ", 2)[1]), response_headers, payload
+
+
+async def post_json(port, path, payload):
+    return await request(port, "POST", path, json.dumps(payload).encode("utf-8"),
+                         [("Content-Type", "application/json")])
+
+
+async def post_file(port, path, filename, data, fields=None):
+    boundary = f"bench{time.monotonic_ns():x}"
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return await request(port, "POST", path, b"".join(parts),
+                         [("Content-Type", f"multipart/form-data; boundary={boundary}"), ("Accept", "application/json")])
+
+
+async def run_load(requests, concurrency, one):
+    # one(i) -> status; returns (elapsed, latencies, statuses)
+    latencies, statuses = [], {}
+    gate = asyncio.Semaphore(concurrency)
+
+    async def timed(i):
+        async with gate:
+            start = time.perf_counter()
+            try:
+                status = await one(i)
+            except OSError:
+                status = "connect-error"
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(requests)))
+    return time.perf_counter() - start, latencies, statuses
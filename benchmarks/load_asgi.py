@@ -0,0 +1,59 @@
+# Load test: Flask-only (threads) vs ASGI mode for the model-bound endpoints.
+#
+#   python benchmarks/load_asgi.py --concurrency 200 --requests 1000 --latency 1.0
+#
+# Starts benchmarks/fake_model_server.py, then serves the app twice under
+# uvicorn against it: "sync" is the Flask app alone (asgi:wsgi, a fixed pool
+# of --threads), "async" is asgi:application with the same pool for the
+# non-model routes. Each request asks for a quiz or flashcards on a fresh
+# summary, so every one is a real (fake) model round-trip.
+import time
+import asyncio
+import argparse
+import tempfile
+
+from harness import app_env, post_json, run_load, serve, start_model_server, stop, percentile
+
+
+def load(port, requests, concurrency, tag):
+    async def one(i):
+        path = "/generate_quiz" if i % 2 == 0 else "/generate_flashcards"
+        payload = {"summary": f"- {tag} lecture {i}: cell membranes, transport and osmosis", "difficulty": "Easy"}
+        status, _, _ = await post_json(port, path, payload)
+        return status
+
+    return asyncio.run(run_load(requests, concurrency, one))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare threaded Flask with ASGI mode under model latency")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake model latency in seconds")
+    parser.add_argument("--threads", type=int, default=16, help="WSGI thread pool size in both modes")
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+
+    model, model_port = start_model_server(args.latency)
+    targets = {"sync": "asgi:wsgi", "async": "asgi:application"}
+    try:
+        print(f"{args.requests} requests, {args.concurrency} concurrent, model latency {args.latency}s, "
+              f"{args.threads} WSGI threads")
+        for mode in args.modes.split(","):
+            with tempfile.TemporaryDirectory() as workdir:
+                proc, port = serve(targets[mode], app_env(workdir, model_port, ASGI_WSGI_THREADS=args.threads,
+                                                          UPLOAD_WORKERS=1))
+                try:
+                    elapsed, latencies, statuses = load(port, args.requests, args.concurrency,
+                                                        f"{mode}-{time.time()}")
+                finally:
+                    stop(proc)
+            print(f"{mode:6} {args.requests / elapsed:8.1f} req/s   "
+                  f"p50 {percentile(latencies, 50) * 1000:7.0f}ms   p99 {percentile(latencies, 99) * 1000:7.0f}ms   "
+                  f"{statuses}")
+    finally:
+        stop(model)
+
+
+if __name__ == "__main__":
+    main()
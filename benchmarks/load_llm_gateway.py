@@ -0,0 +1,80 @@
+# Offline load test for the model gateway using the stub backend.
+#
+#   python benchmarks/load_llm_gateway.py --threads 50 --requests 500 --failure-rate 0.1
+#
+# Simulates a lecture-hall burst: many users, a share of identical prompts
+# (coalesced), and injected 429/5xx errors (retried with backoff).
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from llm import ModelGateway, StubBackend, RateLimited
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the model gateway offline")
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--duplicate-share", type=float, default=0.3, help="share of requests reusing a hot prompt")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=50, help="global requests/second")
+    parser.add_argument("--burst", type=float, default=50)
+    parser.add_argument("--user-rate", type=float, default=2)
+    parser.add_argument("--user-burst", type=float, default=5)
+    args = parser.parse_args()
+
+    gateway = ModelGateway(
+        StubBackend(latency=args.latency, failure_rate=args.failure_rate),
+        rate=args.rate, burst=args.burst, user_rate=args.user_rate, user_burst=args.user_burst,
+        base_delay=0.1, max_delay=2, acquire_timeout=60
+    )
+    hot_prompts = [f"Summarize lecture {i}" for i in range(5)]
+    latencies = []
+    outcomes = {"ok": 0, "rate_limited": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def one(i):
+        if random.random() < args.duplicate_share:
+            prompt = random.choice(hot_prompts)
+        else:
+            prompt = f"Summarize note {i}"
+        start = time.perf_counter()
+        try:
+            gateway.chat(user_id=random.randrange(args.users), model="stub",
+                         messages=[{"role": "user", "content": prompt}])
+            outcome = "ok"
+        except RateLimited:
+            outcome = "rate_limited"
+        except Exception:
+            outcome = "failed"
+        elapsed = time.perf_counter() - start
+        with lock:
+            outcomes[outcome] += 1
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - start
+
+    print(f"requests     {args.requests} in {wall:.2f}s ({args.requests / wall:.1f} req/s)")
+    print(f"latency      p50 {percentile(latencies, 50) * 1000:.0f} ms, p99 {percentile(latencies, 99) * 1000:.0f} ms")
+    print(f"outcomes     {outcomes}")
+    print(f"gateway      {gateway.stats()}")
+
+
+if __name__ == "__main__":
+    main()
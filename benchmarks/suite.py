@@ -0,0 +1,263 @@
+# Offline benchmark suite: the app under uvicorn against the fake model server.
+#
+#   python benchmarks/suite.py                                   # every scenario
+#   python benchmarks/suite.py --scenarios quiz,dashboard --sizes 1000 50000
+#   python benchmarks/suite.py --save-baseline                   # -> benchmarks/baselines/baseline.json
+#   python benchmarks/suite.py --compare benchmarks/baselines/baseline.json
+#
+# Model-bound scenarios (one server, fake model with --latency /
+# --tokens-per-second / --failure-rate):
+#   upload_txt, upload_pdf, upload_docx  POST /upload with the fixtures in
+#       benchmarks/fixtures/, timed until the job is done (extraction + model)
+#   quiz, flashcards                     POST /generate_quiz, /generate_flashcards
+# Each request carries unique content, so the result cache and the
+# near-duplicate shortcut never answer it.
+# Read scenarios (a fresh server per --sizes entry, database seeded with that
+# many scored quizzes, a tenth of them for the dashboard user):
+#   leaderboard, leaderboard_best_weekly, dashboard
+# Reports throughput and p50/p99 per scenario, after --warmup untimed requests
+# (the first call in a fresh server pays for lazy imports). The reference
+# numbers are in benchmarks/baselines/baseline.json, with the machine that
+# produced them in its meta; baselines are machine-specific, so re-save one on
+# the machine you compare on. --compare exits 1 when a latency grows or
+# throughput drops by more than --tolerance.
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import zipfile
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from harness import (
+    ROOT, app_env, percentile, post_file, post_json, request, run_load, serve, start_model_server, stop
+)
+from storage import Storage
+
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "baseline.json")
+MARKER = b"VARIANT-0000"
+MODEL_SCENARIOS = ("upload_txt", "upload_pdf", "upload_docx", "quiz", "flashcards")
+READ_SCENARIOS = ("leaderboard", "leaderboard_best_weekly", "dashboard")
+
+
+# ---- Fixtures ----
+
+def load_fixtures():
+    fixtures = {}
+    for ext in ("txt", "pdf", "docx"):
+        with open(os.path.join(FIXTURES, f"lecture.{ext}"), "rb") as f:
+            fixtures[ext] = f.read()
+    return fixtures
+
+
+def variant(fixtures, ext, n):
+    marker = f"VARIANT-{n % 10000:04d}".encode()
+    if ext != "docx":
+        return fixtures[ext].replace(MARKER, marker)
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(fixtures[ext])) as src, zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as dst:
+        for info in src.infolist():
+            dst.writestr(info, src.read(info).replace(MARKER, marker))
+    return out.getvalue()
+
+
+# ---- Scenarios ----
+
+async def upload(port, filename, data):
+    status, _, body = await post_file(port, "/upload", filename, data, {"difficulty": "Easy"})
+    if status != 202:
+        return status
+    status_url = json.loads(body)["status_url"]
+    while True:
+        await asyncio.sleep(0.05)
+        status, _, body = await request(port, "GET", status_url)
+        if status != 200:
+            return status
+        job = json.loads(body)
+        if job["status"] in ("done", "failed"):
+            return job["status"]
+
+
+def model_scenario(name, port, fixtures, tag):
+    if name.startswith("upload_"):
+        ext = name.split("_", 1)[1]
+        return lambda i: upload(port, f"lecture-{i}.{ext}", variant(fixtures, ext, i))
+    path = "/generate_quiz" if name == "quiz" else "/generate_flashcards"
+
+    async def one(i):
+        summary = f"- {tag} lecture {i}: membranes, diffusion, osmosis and active transport"
+        status, _, _ = await post_json(port, path, {"summary": summary, "difficulty": "Easy"})
+        return status
+    return one
+
+
+def read_scenario(name, port):
+    path = {
+        "leaderboard": "/leaderboard?limit=20",
+        "leaderboard_best_weekly": "/leaderboard?board=best&period=weekly&limit=20",
+        "dashboard": "/dashboard?format=json&limit=20",
+    }[name]
+
+    async def one(i):
+        status, _, _ = await request(port, "GET", path, headers=[("Accept", "application/json")])
+        return status
+    return one
+
+
+def seed(path, quizzes, users=200):
+    # User 1 is the AUTO_LOGIN user whose dashboard is read
+    storage = Storage(path)
+    storage.seed_user(1, "John Doe", "john@example.com", "x")
+    names = {1: "John Doe"}
+    for u in range(2, users + 1):
+        names[storage.create_user(f"Student {u}", f"s{u}@example.com", "x")["id"]] = f"Student {u}"
+    questions = [{"question": f"Question {q} about membranes?", "options": {"A": "a", "B": "b", "C": "c", "D": "d"},
+                  "answer": "ABCD"[q % 4]} for q in range(10)]
+    rng = random.Random(7)
+    now = datetime.now()
+    ids = list(names)
+    attempts = []
+    for n in range(quizzes):
+        user_id = 1 if n % 10 == 0 else rng.choice(ids[1:])
+        date = (now - timedelta(minutes=rng.randrange(30 * 24 * 60))).isoformat()
+        quiz = storage.add_quiz(user_id, date, questions, summary="- seeded", difficulty="Medium")
+        attempts.append(dict(user_id=user_id, name=names[user_id], quiz_id=quiz["id"], date=date,
+                             score=rng.randrange(11), total=10, difficulty="Medium", graded=[]))
+        if len(attempts) == 500:
+            storage.save_attempts(attempts)
+            attempts = []
+    if attempts:
+        storage.save_attempts(attempts)
+
+
+def measure(name, requests, concurrency, one, warmup=0):
+    # Untimed warm-up first: the first call in a fresh worker pays for lazy imports
+    if warmup:
+        asyncio.run(run_load(warmup, concurrency, lambda i: one(requests + i)))
+    elapsed, latencies, statuses = asyncio.run(run_load(requests, concurrency, one))
+    ok = sum(count for status, count in statuses.items() if status in (200, "done"))
+    result = {
+        "requests": requests,
+        "throughput": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "errors": requests - ok,
+    }
+    print(f"{name:34} {result['throughput']:9.1f} req/s   p50 {result['p50_ms']:9.1f}ms   "
+          f"p99 {result['p99_ms']:9.1f}ms   errors {result['errors']}"
+          + (f"   {statuses}" if result["errors"] else ""))
+    return result
+
+
+# ---- Baselines ----
+
+def compare(results, baseline, tolerance, args):
+    regressions = []
+    print(f"\ncompared with baseline from {baseline['meta'].get('date', '?')}:")
+    saved = baseline["meta"].get("args", {})
+    for key in ("requests", "concurrency", "latency", "tokens_per_second", "failure_rate", "target"):
+        if key in saved and saved[key] != getattr(args, key):
+            print(f"  note: baseline ran with {key}={saved[key]}, this run {getattr(args, key)}")
+    for name, now in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        changes = []
+        for metric, worse_if_higher in (("p50_ms", True), ("p99_ms", True), ("throughput", False)):
+            if not base[metric]:
+                continue
+            delta = (now[metric] - base[metric]) / base[metric]
+            changes.append(f"{metric} {delta:+.0%}")
+            if (delta > tolerance) if worse_if_higher else (delta < -tolerance):
+                regressions.append(f"{name} {metric}: {base[metric]} -> {now[metric]}")
+        if now["errors"] > base["errors"]:
+            regressions.append(f"{name} errors: {base['errors']} -> {now['errors']}")
+        print(f"  {name:32} " + "   ".join(changes))
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite against a fake model server")
+    parser.add_argument("--scenarios", default=",".join(MODEL_SCENARIOS + READ_SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2, help="untimed requests before each scenario")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="seeded quizzes for reads")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--target", default="asgi:application", help="asgi:application or asgi:wsgi")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE, help="write results to this file")
+    parser.add_argument("--compare", help="baseline file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(MODEL_SCENARIOS + READ_SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    print(f"{args.requests} requests per scenario, {args.concurrency} concurrent, model latency {args.latency}s, "
+          f"{args.target}")
+
+    results = {}
+    model, model_port = start_model_server(args.latency, args.failure_rate, args.tokens_per_second)
+    try:
+        model_runs = [s for s in scenarios if s in MODEL_SCENARIOS]
+        if model_runs:
+            fixtures = load_fixtures()
+            with tempfile.TemporaryDirectory() as workdir:
+                env = app_env(workdir, model_port, NEAR_DUP_THRESHOLD=1.01,
+                              UPLOAD_QUEUE_LIMIT=max(100, args.requests))
+                proc, port = serve(args.target, env)
+                try:
+                    for name in model_runs:
+                        one = model_scenario(name, port, fixtures, f"{name}-{time.time()}")
+                        results[name] = measure(name, args.requests, args.concurrency, one, args.warmup)
+                finally:
+                    stop(proc)
+
+        read_runs = [s for s in scenarios if s in READ_SCENARIOS]
+        for size in args.sizes if read_runs else ():
+            with tempfile.TemporaryDirectory() as workdir:
+                env = app_env(workdir, model_port)
+                start = time.perf_counter()
+                seed(env["DATABASE_PATH"], size)
+                print(f"-- {size} quizzes (seeded in {time.perf_counter() - start:.1f}s)")
+                proc, port = serve(args.target, env)
+                try:
+                    for name in read_runs:
+                        key = f"{name}@{size}"
+                        results[key] = measure(key, args.requests, args.concurrency, read_scenario(name, port),
+                                               args.warmup)
+                finally:
+                    stop(proc)
+    finally:
+        stop(model)
+
+    ok = True
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            ok = compare(results, json.load(f), args.tolerance, args)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        meta = {"date": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                "platform": platform.platform(), "cpus": os.cpu_count(),
+                "args": {k: v for k, v in vars(args).items() if k not in ("save_baseline", "compare")}}
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=1, sort_keys=True)
+        print(f"baseline saved to {args.save_baseline}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+# --- Content-addressed result cache (SQLite, TTL + size eviction) ---
+# Values are JSON-serialisable model results (summaries, quizzes, flashcards)
+# keyed on a hash of everything that influences the completion.
+
+
+def make_key(*parts):
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    PRUNE_EVERY = 50  # run eviction every N writes instead of on each one
+
+    def __init__(self, path, ttl_seconds=7 * 24 * 3600, max_entries=5000, max_bytes=200 * 1024 * 1024,
+                 touch_seconds=300):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.touch_seconds = touch_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            " key TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_result_cache_accessed ON result_cache(accessed)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        # Reads stay read-only: expired rows are left for prune(), and the access
+        # time (only used to rank LRU eviction) is refreshed at most once per
+        # touch_seconds, so hot keys don't take the write lock on every hit
+        conn = self._conn()
+        row = conn.execute("SELECT value, created, accessed FROM result_cache WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+            self._count(False)
+            return None
+        if now - row[2] > self.touch_seconds:
+            conn.execute("UPDATE result_cache SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+        self._count(True)
+        return json.loads(row[0])
+
+    def set(self, key, value, kind=""):
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO result_cache (key, kind, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, kind, data, len(data), now, now)
+        )
+        conn.commit()
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        conn = self._conn()
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM result_cache WHERE created < ?", (time.time() - self.ttl_seconds,))
+        if self.max_entries:
+            conn.execute(
+                "DELETE FROM result_cache WHERE key IN ("
+                " SELECT key FROM result_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        if self.max_bytes:
+            # Drop least recently used entries until the total payload fits.
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM result_cache").fetchone()[0]
+            if total > self.max_bytes:
+                freed = 0
+                victims = []
+                for key, size in conn.execute("SELECT key, size FROM result_cache ORDER BY accessed ASC"):
+                    victims.append((key,))
+                    freed += size
+                    if total - freed <= self.max_bytes:
+                        break
+                conn.executemany("DELETE FROM result_cache WHERE key = ?", victims)
+        conn.commit()
+
+    def stats(self):
+        conn = self._conn()
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache").fetchone()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size
+        }
@@ -0,0 +1,102 @@
+import re
+import zlib
+import threading
+from array import array
+
+# --- Near-duplicate detection: MinHash signatures + LSH banding ---
+# Signatures use one-permutation hashing (one hash per shingle, min per bin)
+# so computing one is linear in the document length, even for 16MB uploads.
+
+NUM_PERM = 128
+BANDS = 16          # 16 bands x 8 rows: pairs above ~0.9 Jaccard collide with p > 0.999
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+
+_MIX = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+_EMPTY = 0xFFFFFFFF
+
+_normalize_re = re.compile(r"[^a-z]+")
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    # Letters only: page numbers, dates and punctuation differences between
+    # PDF producers/footers should not change the shingle set.
+    words = _normalize_re.sub(" ", text.lower()).split()
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def signature(text):
+    bins = [_EMPTY] * NUM_PERM
+    for shingle in shingles(text):
+        h = (zlib.crc32(shingle.encode("utf-8")) * _MIX) & _MASK64
+        b = h % NUM_PERM
+        v = h >> 32
+        if v < bins[b]:
+            bins[b] = v
+    # Densify: empty bins borrow from the next filled bin (short documents)
+    if _EMPTY in bins and any(v != _EMPTY for v in bins):
+        for i in range(NUM_PERM):
+            j = i
+            while bins[j] == _EMPTY:
+                j = (j + 1) % NUM_PERM
+            if j != i:
+                bins[i] = bins[j]
+    return array("I", bins)
+
+
+def similarity(sig_a, sig_b):
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def _band_keys(sig):
+    return [hash((band, tuple(sig[band * ROWS:(band + 1) * ROWS]))) for band in range(BANDS)]
+
+
+class LSHIndex:
+    def __init__(self):
+        self._buckets = {}
+        self._signatures = {}
+        self._lock = threading.Lock()
+        self.last_id = 0
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def add(self, doc_id, sig):
+        sig = bytes(sig) if isinstance(sig, array) else sig
+        with self._lock:
+            self._signatures[doc_id] = sig
+            for key in _band_keys(array("I", sig)):
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    self._buckets[key] = doc_id
+                elif isinstance(bucket, list):
+                    bucket.append(doc_id)
+                else:
+                    # Most buckets hold one document; only promote to a list on collision
+                    self._buckets[key] = [bucket, doc_id]
+            self.last_id = max(self.last_id, doc_id)
+
+    def query(self, sig, threshold=0.9):
+        # Returns [(similarity, doc_id)] above threshold, best first
+        candidates = set()
+        with self._lock:
+            for key in _band_keys(sig):
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                if isinstance(bucket, list):
+                    candidates.update(bucket)
+                else:
+                    candidates.add(bucket)
+            stored = [(doc_id, self._signatures[doc_id]) for doc_id in candidates]
+        matches = []
+        for doc_id, raw in stored:
+            score = similarity(sig, array("I", raw))
+            if score >= threshold:
+                matches.append((score, doc_id))
+        matches.sort(reverse=True)
+        return matches
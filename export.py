@@ -0,0 +1,239 @@
+import os
+import io
+import json
+import time
+import zipfile
+import tempfile
+import threading
+from xml.sax.saxutils import escape
+
+from cache import make_key
+
+# --- PDF export: summaries and quiz reviews rendered from stored quiz records ---
+# Pages are laid out with platypus flowables (wrapped + paginated), and the
+# rendered files are cached on disk under quiz id + content hash, so repeat
+# downloads are served as-is and an edited quiz gets a fresh render.
+# reportlab is imported on first render, not when the app starts.
+
+EXPORT_VERSION = 1  # bump when the layout changes to invalidate cached PDFs
+INCH = 72  # points
+MARGIN = 0.9 * INCH
+
+_styles = None
+
+
+def _get_styles():
+    global _styles
+    if _styles is None:
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+        base = getSampleStyleSheet()
+        _styles = {
+            "title": base["Title"],
+            "meta": ParagraphStyle("meta", parent=base["Normal"], textColor=colors.grey, spaceAfter=12),
+            "body": ParagraphStyle("body", parent=base["Normal"], fontSize=11, leading=15, spaceAfter=6),
+            "bullet": ParagraphStyle("bullet", parent=base["Normal"], fontSize=11, leading=15,
+                                     leftIndent=14, bulletIndent=2, spaceAfter=4),
+            "question": ParagraphStyle("question", parent=base["Normal"], fontName="Helvetica-Bold",
+                                       fontSize=11, leading=15, spaceAfter=4),
+            "option": ParagraphStyle("option", parent=base["Normal"], fontSize=10.5, leading=14, leftIndent=18),
+            "answer": ParagraphStyle("answer", parent=base["Normal"], fontSize=10.5, leading=14,
+                                     leftIndent=18, spaceBefore=3, textColor=colors.HexColor("#1a7f37")),
+        }
+    return _styles
+
+
+def _para(text, style, **kwargs):
+    from reportlab.platypus import Paragraph
+
+    return Paragraph(escape(str(text)).replace("\n", "<br/>"), style, **kwargs)
+
+
+def _page_number(canvas, doc):
+    from reportlab.lib.pagesizes import letter
+
+    canvas.saveState()
+    canvas.setFont("Helvetica", 8)
+    canvas.drawRightString(letter[0] - MARGIN, 0.5 * INCH, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+def _build(title, story):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=letter, title=title,
+        leftMargin=MARGIN, rightMargin=MARGIN, topMargin=MARGIN, bottomMargin=MARGIN
+    )
+    doc.build(story, onFirstPage=_page_number, onLaterPages=_page_number)
+    return buffer.getvalue()
+
+
+def _meta_line(quiz):
+    parts = [f"Date: {quiz.get('date', '')[:10]}"]
+    if quiz.get("difficulty"):
+        parts.append(f"Difficulty: {quiz['difficulty']}")
+    if quiz.get("score") is not None:
+        parts.append(f"Score: {quiz['score']}/{quiz.get('total', '?')}")
+    return "   ".join(parts)
+
+
+def render_summary(quiz):
+    styles = _get_styles()
+    story = [_para("Notes Summary", styles["title"]), _para(_meta_line(quiz), styles["meta"])]
+    for line in (quiz.get("summary") or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line[0] in "-*•":
+            story.append(_para(line[1:].strip(), styles["bullet"], bulletText="•"))
+        else:
+            story.append(_para(line, styles["body"]))
+    return _build("Notes Summary", story)
+
+
+def _options(q):
+    # Bank/upload questions map letters to text; client-saved ones may use a list
+    options = q.get("options") or {}
+    if isinstance(options, dict):
+        return list(options.items())
+    return [("ABCDEFGH"[i] if i < 8 else str(i + 1), opt) for i, opt in enumerate(options)]
+
+
+def render_quiz_review(quiz):
+    from reportlab.platypus import Spacer, KeepTogether
+
+    styles = _get_styles()
+    title = f"Quiz Review - {quiz.get('date', '')[:10]}"
+    story = [_para(title, styles["title"]), _para(_meta_line(quiz), styles["meta"])]
+    for i, q in enumerate(quiz.get("questions") or [], 1):
+        if not isinstance(q, dict):
+            continue
+        block = [_para(f"Q{i}: {q.get('question', '')}", styles["question"])]
+        block += [_para(f"{letter_}. {text}", styles["option"]) for letter_, text in _options(q)]
+        chosen = q.get("user_answer", q.get("chosen"))
+        if chosen is not None:
+            block.append(_para(f"Your answer: {chosen}", styles["option"]))
+        correct = q.get("answer", q.get("correct_answer"))
+        if correct:
+            block.append(_para(f"Correct answer: {correct}", styles["answer"]))
+        # Keep a question with its options unless it is longer than a page
+        story += [KeepTogether(block), Spacer(1, 10)]
+    return _build(title, story)
+
+
+RENDERERS = {"summary": render_summary, "quiz": render_quiz_review}
+
+
+def content_hash(quiz, kind):
+    body = quiz.get("summary") if kind == "summary" else quiz.get("questions")
+    return make_key("export", EXPORT_VERSION, kind, quiz.get("date"), quiz.get("difficulty"),
+                    quiz.get("score"), quiz.get("total"), body)
+
+
+class PdfCache:
+    # Renders live under <directory>/<quiz id>/, so replacing a stale render only
+    # lists that quiz's folder. Every SWEEP_EVERY renders the whole cache is
+    # trimmed: files older than max_age_seconds go first, then the oldest renders
+    # until it fits in max_bytes (0 disables either limit).
+    SWEEP_EVERY = 50
+
+    def __init__(self, directory, max_bytes=0, max_age_seconds=0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._renders = 0
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, quiz, kind):
+        return os.path.join(self.directory, str(quiz["id"]), f"{kind}-{content_hash(quiz, kind)[:16]}.pdf")
+
+    def get_or_render(self, quiz, kind):
+        path = self.path_for(quiz, kind)
+        if os.path.exists(path):
+            with self._lock:
+                self.hits += 1
+            return path
+        with self._lock:
+            self.misses += 1
+            self._renders += 1
+            sweep = self._renders % self.SWEEP_EVERY == 0
+        data = RENDERERS[kind](quiz)
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._drop_stale(folder, kind, path)
+        if sweep and (self.max_bytes or self.max_age_seconds):
+            self.evict()
+        return path
+
+    def _drop_stale(self, folder, kind, keep):
+        # Older renders of the same quiz (content changed since)
+        prefix = f"{kind}-"
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.startswith(prefix) and entry.path != keep:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def evict(self):
+        files = []
+        with os.scandir(self.directory) as folders:
+            for folder in folders:
+                if not folder.is_dir():
+                    continue
+                with os.scandir(folder.path) as entries:
+                    for entry in entries:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        files.append((st.st_mtime, st.st_size, entry.path))
+        files.sort()
+        cutoff = time.time() - self.max_age_seconds if self.max_age_seconds else None
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            too_old = cutoff is not None and mtime < cutoff
+            too_big = self.max_bytes and total > self.max_bytes
+            if not (too_old or too_big):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            try:
+                os.rmdir(os.path.dirname(path))  # only succeeds once the quiz folder is empty
+            except OSError:
+                pass
+        return removed
+
+
+def write_export_zip(path, quizzes, pdf_cache):
+    # PDFs are already compressed, so entries are stored rather than deflated
+    index = []
+    tmp = path + ".part"
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zf:
+        for quiz in quizzes:
+            folder = f"quiz-{quiz['id']}-{(quiz.get('date') or '')[:10]}"
+            if quiz.get("summary"):
+                zf.write(pdf_cache.get_or_render(quiz, "summary"), f"{folder}/summary.pdf")
+            if quiz.get("questions"):
+                zf.write(pdf_cache.get_or_render(quiz, "quiz"), f"{folder}/quiz.pdf")
+            index.append({k: quiz.get(k) for k in ("id", "date", "difficulty", "score", "total")})
+        zf.writestr("quizzes.json", json.dumps(index, indent=2))
+    os.replace(tmp, path)
+    return len(index)
@@ -0,0 +1,43 @@
+import os
+import importlib
+
+# gunicorn -c gunicorn.conf.py
+# Workers build the app through the factory. The app itself is not preloaded
+# in the master, so no SQLite connection or background thread crosses a fork.
+# Sessions and job status live in SQLite (SESSION_PATH, JOB_PATH), so a job
+# polled on /jobs/<id> can be answered by any worker.
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("BIND", "0.0.0.0:" + os.getenv("PORT", "5000"))
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+
+# --- Pre-fork warm-up ---
+# The heavy libraries are imported lazily by the app. Importing them once here,
+# in the master, lets every worker inherit them instead of paying for the
+# import on its first upload, export or model call. Set WARM_UP=false to skip.
+WARM_UP = os.getenv("WARM_UP", "true").lower() == "true"
+WARM_MODULES = ("openai", "PyPDF2", "docx2txt", "reportlab.platypus", "reportlab.lib.styles", "summarize")
+
+# Content-hashed, precompressed static files (see assets.py); BUILD_ASSETS=false
+# when the deploy runs `python assets.py` itself.
+BUILD_ASSETS = os.getenv("BUILD_ASSETS", "true").lower() == "true"
+
+
+def on_starting(server):
+    if BUILD_ASSETS:
+        import assets
+
+        manifest, written = assets.build(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+        server.log.info("assets: %d files, %d new", len(manifest), written)
+    if not WARM_UP:
+        return
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            server.log.warning("warm-up: could not import %s: %s", name, e)
+    # Loads the tiktoken encoding when it is installed
+    importlib.import_module("summarize").count_tokens("warm-up")
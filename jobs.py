@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Background job queue (bounded worker pool + pollable status) ---
+# A job function receives the Job as its first argument so it can report
+# which stage it is in; its return value becomes the job result.
+# With a JobStore, every status change is also written to SQLite, so a poll
+# that lands on another worker process still finds the job.
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, owner=None, observer=None, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.observer = observer
+        self.on_change = on_change
+        self.timings = {}
+        self._stage_started = None
+        self.status = "queued"
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.updated = self.created
+
+    def set_stage(self, stage):
+        self._close_stage()
+        self.stage = stage
+        self._stage_started = time.perf_counter()
+        self.updated = time.time()
+        self._changed()
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self)
+
+    def _close_stage(self):
+        if self._stage_started is None:
+            return
+        elapsed = time.perf_counter() - self._stage_started
+        self.timings[self.stage] = round(self.timings.get(self.stage, 0) + elapsed, 6)
+        self._stage_started = None
+        if self.observer:
+            self.observer(self.stage, elapsed)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "result": self.result,
+            "error": self.error,
+            "timings": self.timings,
+            "created": self.created,
+            "updated": self.updated
+        }
+
+    @classmethod
+    def from_dict(cls, data, owner=None):
+        # Read-only snapshot of a job another worker process is running
+        job = cls(owner)
+        job.id = data["id"]
+        for field in ("status", "stage", "result", "error", "timings", "created", "updated"):
+            setattr(job, field, data[field])
+        return job
+
+
+class JobStore:
+    PRUNE_EVERY = 200  # drop finished jobs past their TTL every N writes
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job ("
+            " id TEXT PRIMARY KEY,"
+            " queue TEXT NOT NULL,"
+            " owner INTEGER,"
+            " data TEXT NOT NULL,"
+            " expires REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_job_expires ON job(expires)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, queue, job, expires):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO job (id, queue, owner, data, expires) VALUES (?, ?, ?, ?, ?)",
+            (job.id, queue, job.owner, json.dumps(job.to_dict()), expires)
+        )
+        conn.commit()
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def get(self, queue, job_id):
+        row = self._conn().execute(
+            "SELECT owner, data FROM job WHERE id = ? AND queue = ? AND expires >= ?",
+            (job_id, queue, time.time())
+        ).fetchone()
+        return Job.from_dict(json.loads(row[1]), row[0]) if row else None
+
+    def prune(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM job WHERE expires < ?", (time.time(),))
+        conn.commit()
+
+
+class JobQueue:
+    def __init__(self, max_workers=4, max_pending=100, ttl_seconds=3600, name="job", observer=None, store=None):
+        # observer(stage, seconds) is called each time a job leaves a stage
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self.observer = observer
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, owner=None, **kwargs):
+        job = Job(owner, self.observer, self._save if self.store else None)
+        with self._lock:
+            self._expire()
+            if self._count_pending() >= self.max_pending:
+                raise QueueFull("Too many jobs queued, try again shortly")
+            self._jobs[job.id] = job
+        job._changed()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _save(self, job):
+        # Every change pushes the expiry out, so only abandoned jobs age out mid-run
+        self.store.save(self.name, job, job.updated + self.ttl_seconds)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.updated = time.time()
+        job._changed()
+        try:
+            result = fn(job, *args, **kwargs)
+            job._close_stage()
+            job.result = result
+            job.status = "done"
+        except Exception as e:
+            print(f"Job {job.id} failed in stage {job.stage}:", e)
+            job._close_stage()
+            job.error = str(e)
+            job.status = "failed"
+        job.updated = time.time()
+        try:
+            job._changed()
+        except Exception as e:
+            print(f"Job {job.id} status could not be saved:", e)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.get(self.name, job_id)
+        return job
+
+    def pending(self):
+        with self._lock:
+            return self._count_pending()
+
+    def _count_pending(self):
+        return sum(1 for j in self._jobs.values() if j.status in ("queued", "running"))
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        for job_id in [k for k, j in self._jobs.items() if j.status in ("done", "failed") and j.updated < cutoff]:
+            del self._jobs[job_id]
@@ -0,0 +1,453 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from types import SimpleNamespace
+from collections import OrderedDict
+
+from cache import make_key
+from metrics import LLM_CALL_SECONDS, LLM_TOKENS
+
+# --- Model gateway: rate limiting, retry/backoff and request coalescing ---
+# Every completion goes through ModelGateway.chat() (or achat() in ASGI mode),
+# which takes the same keyword arguments as client.chat.completions.create().
+
+# User on whose behalf the current call is made (per-user rate limit)
+current_user = contextvars.ContextVar("llm_current_user", default=None)
+
+
+class RateLimited(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout):
+        # Same bucket, but waits without holding a thread (ASGI mode)
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def release(self):
+        # Give back a token taken for a call that was never made
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ModelGateway:
+    RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+    MAX_USER_BUCKETS = 10000
+
+    def __init__(self, backend, rate=10, burst=20, user_rate=2, user_burst=20,
+                 max_retries=4, base_delay=0.5, max_delay=20, timeout=60, acquire_timeout=30,
+                 async_backend=None):
+        self.backend = backend
+        # AsyncOpenAI-style client for achat(); limits and stats are shared with chat()
+        self.async_backend = async_backend
+        self.bucket = TokenBucket(rate, burst)
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self._user_buckets = OrderedDict()
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "upstream": 0, "retries": 0, "coalesced": 0, "rate_limited": 0, "errors": 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, in_flight=len(self._flights) + len(self._async_flights))
+
+    def _user_bucket(self, user_id):
+        with self._lock:
+            bucket = self._user_buckets.get(user_id)
+            if bucket is None:
+                bucket = TokenBucket(self.user_rate, self.user_burst)
+                self._user_buckets[user_id] = bucket
+                if len(self._user_buckets) > self.MAX_USER_BUCKETS:
+                    self._user_buckets.popitem(last=False)
+            else:
+                self._user_buckets.move_to_end(user_id)
+            return bucket
+
+    def chat(self, user_id=None, **kwargs):
+        self._count("calls")
+        user_id = current_user.get() if user_id is None else user_id
+        if kwargs.get("stream"):
+            return self._call(user_id, kwargs)
+
+        # Single-flight: identical prompts already in flight share one upstream call
+        key = make_key("chat", kwargs)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+        if not leader:
+            self._count("coalesced")
+            if not flight.done.wait(self._flight_timeout()):
+                raise TimeoutError("Timed out waiting for an identical model call in flight")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._call(user_id, kwargs)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.result
+
+    def _call(self, user_id, kwargs):
+        user_bucket = self._user_bucket(user_id) if user_id is not None else None
+        if user_bucket and not user_bucket.acquire(self.acquire_timeout):
+            self._count("rate_limited")
+            raise RateLimited("Too many requests for this user, slow down")
+        if not self.bucket.acquire(self.acquire_timeout):
+            if user_bucket:
+                user_bucket.release()
+            self._count("rate_limited")
+            raise RateLimited("Model capacity exhausted, try again shortly")
+
+        model = kwargs.get("model", "")
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                self._count("upstream")
+                resp = self.backend.chat.completions.create(timeout=self.timeout, **kwargs)
+                self._record_ok(resp, model, start)
+                return resp
+            except Exception as e:
+                if not self._should_retry(e, model, start, attempt):
+                    raise
+                attempt += 1
+                time.sleep(self._backoff(attempt, e))
+                # Every retry is another upstream call, so it pays the shared bucket too
+                if not self.bucket.acquire(self.acquire_timeout):
+                    self._count("rate_limited")
+                    raise RateLimited("Model capacity exhausted, try again shortly")
+
+    # ---- Async path (ASGI mode): same limits, retries and coalescing, no thread held ----
+
+    async def achat(self, user_id=None, **kwargs):
+        self._count("calls")
+        user_id = current_user.get() if user_id is None else user_id
+        if kwargs.get("stream"):
+            return await self._acall(user_id, kwargs)
+
+        key = make_key("chat", kwargs)
+        flight = self._async_flights.get(key)
+        if flight is not None:
+            self._count("coalesced")
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight), self._flight_timeout())
+            except asyncio.TimeoutError:
+                raise TimeoutError("Timed out waiting for an identical model call in flight")
+
+        flight = asyncio.get_running_loop().create_future()
+        self._async_flights[key] = flight
+        try:
+            result = await self._acall(user_id, kwargs)
+            flight.set_result(result)
+            return result
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._async_flights.pop(key, None)
+            if not flight.done():
+                flight.cancel()  # leader's request was cancelled
+
+    async def _acall(self, user_id, kwargs):
+        user_bucket = self._user_bucket(user_id) if user_id is not None else None
+        if user_bucket and not await user_bucket.acquire_async(self.acquire_timeout):
+            self._count("rate_limited")
+            raise RateLimited("Too many requests for this user, slow down")
+        if not await self.bucket.acquire_async(self.acquire_timeout):
+            if user_bucket:
+                user_bucket.release()
+            self._count("rate_limited")
+            raise RateLimited("Model capacity exhausted, try again shortly")
+
+        model = kwargs.get("model", "")
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                self._count("upstream")
+                resp = await self.async_backend.chat.completions.create(timeout=self.timeout, **kwargs)
+                self._record_ok(resp, model, start)
+                return resp
+            except Exception as e:
+                if not self._should_retry(e, model, start, attempt):
+                    raise
+                attempt += 1
+                await asyncio.sleep(self._backoff(attempt, e))
+                if not await self.bucket.acquire_async(self.acquire_timeout):
+                    self._count("rate_limited")
+                    raise RateLimited("Model capacity exhausted, try again shortly")
+
+    def _flight_timeout(self):
+        # Longest a leader can take: every attempt may wait for the bucket, the call and a backoff
+        return (self.max_retries + 1) * (self.acquire_timeout + self.timeout + self.max_delay)
+
+    def _record_ok(self, resp, model, start):
+        LLM_CALL_SECONDS.observe(time.perf_counter() - start, model=model, outcome="ok")
+        usage = getattr(resp, "usage", None)
+        if usage is not None:
+            LLM_TOKENS.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+            LLM_TOKENS.inc(usage.completion_tokens or 0, model=model, kind="completion")
+
+    def _should_retry(self, error, model, start, attempt):
+        LLM_CALL_SECONDS.observe(time.perf_counter() - start, model=model, outcome="error")
+        status = getattr(error, "status_code", None)
+        retryable = status in self.RETRY_STATUSES or (status is None and _is_transport_error(error))
+        if not retryable or attempt >= self.max_retries:
+            self._count("errors")
+            return False
+        self._count("retries")
+        return True
+
+    def _backoff(self, attempt, error):
+        # Full jitter, but never sooner than the server's Retry-After
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+        try:
+            delay = max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+        return min(delay, self.max_delay)
+
+
+def _is_transport_error(error):
+    name = type(error).__name__
+    return name in ("APIConnectionError", "APITimeoutError") or isinstance(error, (ConnectionError, TimeoutError))
+
+
+# --- Stub backend for offline load tests (LLM_BACKEND=stub) ---
+
+class StubError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"Stub backend injected HTTP {status_code}")
+        self.status_code = status_code
+
+
+class StubBackend:
+    def __init__(self, latency=0.2, failure_rate=0.0, tokens_per_second=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.tokens_per_second = tokens_per_second
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model=None, messages=(), stream=False, timeout=None, **kwargs):
+        time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise StubError(random.choice([429, 500, 503]))
+        text = stub_reply(messages[-1]["content"] if messages else "")
+        usage = SimpleNamespace(prompt_tokens=sum(len(m["content"]) // 4 for m in messages),
+                                completion_tokens=len(text) // 4, total_tokens=0)
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        if stream:
+            return self._stream(text)
+        if self.tokens_per_second:
+            time.sleep(usage.completion_tokens / self.tokens_per_second)
+        message = SimpleNamespace(role="assistant", content=text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage, model=model)
+
+    def _stream(self, text):
+        step = 16
+        for i in range(0, len(text), step):
+            if self.tokens_per_second:
+                time.sleep(step / 4 / self.tokens_per_second)
+            delta = SimpleNamespace(content=text[i:i + step])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+
+class AsyncStubBackend(StubBackend):
+    # Same replies as StubBackend, awaited like AsyncOpenAI
+    def __init__(self, latency=0.2, failure_rate=0.0, tokens_per_second=0):
+        super().__init__(latency, failure_rate, tokens_per_second)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate))
+
+    async def acreate(self, model=None, messages=(), stream=False, timeout=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise StubError(random.choice([429, 500, 503]))
+        text = stub_reply(messages[-1]["content"] if messages else "")
+        usage = SimpleNamespace(prompt_tokens=sum(len(m["content"]) // 4 for m in messages),
+                                completion_tokens=len(text) // 4, total_tokens=0)
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        if stream:
+            return self._astream(text)
+        if self.tokens_per_second:
+            await asyncio.sleep(usage.completion_tokens / self.tokens_per_second)
+        message = SimpleNamespace(role="assistant", content=text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage, model=model)
+
+    async def _astream(self, text):
+        step = 16
+        for i in range(0, len(text), step):
+            if self.tokens_per_second:
+                await asyncio.sleep(step / 4 / self.tokens_per_second)
+            delta = SimpleNamespace(content=text[i:i + step])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+
+def stub_reply(prompt):
+    questions = [
+        {"question": f"Stub question {i + 1}?",
+         "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
+         "answer": "ABCD"[i % 4]}
+        for i in range(10)
+    ]
+    flashcards = [{"question": f"Stub term {i + 1}", "answer": f"Stub definition {i + 1}"} for i in range(10)]
+    if '"explanation"' in prompt:
+        ids = [int(n) for n in re.findall(r"^(\d+)\. Question:", prompt, re.MULTILINE)]
+        return json.dumps([{"id": n, "explanation": f"Stub explanation {n}."} for n in ids])
+    if '"flashcards"' in prompt and '"summary"' in prompt:
+        return json.dumps({"summary": ["Stub summary point one", "Stub summary point two"],
+                           "questions": questions, "flashcards": flashcards})
+    if "multiple-choice" in prompt:
+        return json.dumps(questions)
+    if "flashcards" in prompt:
+        return json.dumps(flashcards)
+    return "- Stub summary point one\n- Stub summary point two"
+
+
+class LazyClient:
+    # Builds the SDK client on first use: importing the app needs neither the
+    # openai package nor an API key, and a missing key fails the first call.
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._client is not None
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def _api_key():
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY environment variable missing. Add it to .env before running.")
+    return api_key
+
+
+def _openai_client():
+    from openai import OpenAI
+
+    # Retries are handled by the gateway, not the SDK
+    return OpenAI(api_key=_api_key(), max_retries=0)
+
+
+def _async_openai_client():
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=_api_key(), max_retries=0)
+
+
+def create_backend():
+    if os.getenv("LLM_BACKEND", "openai").lower() == "stub":
+        return StubBackend(
+            latency=float(os.getenv("LLM_STUB_LATENCY", 0.2)),
+            failure_rate=float(os.getenv("LLM_STUB_FAILURE_RATE", 0)),
+            tokens_per_second=float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", 0))
+        )
+    return LazyClient(_openai_client)
+
+
+def create_async_backend():
+    if os.getenv("LLM_BACKEND", "openai").lower() == "stub":
+        return AsyncStubBackend(
+            latency=float(os.getenv("LLM_STUB_LATENCY", 0.2)),
+            failure_rate=float(os.getenv("LLM_STUB_FAILURE_RATE", 0)),
+            tokens_per_second=float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", 0))
+        )
+    return LazyClient(_async_openai_client)
+
+
+def create_gateway(backend=None, async_backend=None):
+    return ModelGateway(
+        backend or create_backend(),
+        async_backend=async_backend,
+        rate=float(os.getenv("LLM_RATE", 10)),
+        burst=float(os.getenv("LLM_BURST", 20)),
+        user_rate=float(os.getenv("LLM_USER_RATE", 2)),
+        user_burst=float(os.getenv("LLM_USER_BURST", 20)),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", 4)),
+        base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5)),
+        max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", 20)),
+        timeout=float(os.getenv("LLM_TIMEOUT", 60)),
+        acquire_timeout=float(os.getenv("LLM_ACQUIRE_TIMEOUT", 30))
+    )
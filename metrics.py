@@ -0,0 +1,167 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- Minimal Prometheus-format metrics (no client library needed) ---
+# Metrics are per process; scrape each worker or run a single worker.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+
+# Stage breakdown for the current request when profiling was asked for
+_breakdown = contextvars.ContextVar("stage_breakdown", default=None)
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _num(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _labels(self.label_names, k), v) for k, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self._values.items()]
+        out = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                out.append((f"{self.name}_bucket", _labels(self.label_names, key, ("le", _num(bound))), cumulative))
+            out.append((f"{self.name}_sum", _labels(self.label_names, key), total))
+            out.append((f"{self.name}_count", _labels(self.label_names, key), count))
+        return out
+
+
+class GaugeCallback:
+    # Value(s) read at scrape time: fn returns a number or {label_value: number}
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, label=None, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label = label
+        self.kind = kind
+        _registry.append(self)
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        if isinstance(value, dict):
+            return [(self.name, _labels((self.label,), (k,)), v) for k, v in value.items()]
+        return [(self.name, "", value)]
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_num(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---- Application metrics ----
+REQUEST_SECONDS = Histogram("notes2quiz_request_seconds", "HTTP request latency", ("endpoint", "method", "status"))
+STAGE_SECONDS = Histogram("notes2quiz_stage_seconds", "Time spent per processing stage", ("stage",))
+LLM_CALL_SECONDS = Histogram("notes2quiz_llm_call_seconds", "Upstream model call latency", ("model", "outcome"))
+LLM_TOKENS = Counter("notes2quiz_llm_tokens_total", "Tokens used by model calls", ("model", "kind"))
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown.append((name, seconds))
+
+
+def start_profile():
+    breakdown = []
+    _breakdown.set(breakdown)
+    return breakdown
+
+
+def add_to_profile(name, seconds):
+    # Adds timings measured elsewhere (e.g. a background job) to the breakdown only
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown.append((name, seconds))
+
+
+def stop_profile():
+    _breakdown.set(None)
+
+
+def server_timing(breakdown):
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in breakdown)
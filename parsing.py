@@ -0,0 +1,330 @@
+import re
+import json
+from json.decoder import scanstring
+
+# --- Parsing of model output: streamed arrays + tolerant quiz/flashcard replies ---
+
+
+class JsonArrayStreamParser:
+    # Feed text chunks of a streamed JSON array (possibly wrapped in ``` fences
+    # or prose) and get back each top-level object as soon as its closing brace
+    # arrives. Only completed objects are decoded; nothing is re-scanned.
+
+    def __init__(self):
+        self._buf = []
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.done = False
+
+    def feed(self, chunk):
+        items = []
+        for ch in chunk:
+            if self.done:
+                break
+            if not self._in_array:
+                if ch == "[":
+                    self._in_array = True
+                continue
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._buf = [ch]
+                elif ch == "]":
+                    self.done = True
+                continue
+
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = "".join(self._buf)
+                    self._buf = []
+                    try:
+                        items.append(json.loads(raw))
+                    except ValueError:
+                        item = _loads_relaxed(raw)
+                        if item is not None:
+                            items.append(item)
+        return items
+
+    def close(self):
+        # End of stream: salvage the object a max_tokens cut-off left open
+        if self.done or self._depth == 0:
+            return []
+        item = _tolerant_item("".join(self._buf))
+        self._buf = []
+        self._depth = 0
+        return [item] if item is not None else []
+
+
+# ---- Tolerant JSON (trailing commas, missing commas, truncation, stray text) ----
+# The common replies (clean, fenced, or with trailing commas) are decoded in
+# one json.loads call, after a regex pass that drops trailing commas. Anything
+# still rejected is walked object by object: well-formed objects go through
+# the C decoder and only a broken one is re-read by the small recursive-descent
+# parser below. A value cut off by the end of the text raises _Truncated
+# carrying whatever was complete up to that point.
+
+_decoder = json.JSONDecoder()
+_trailing_comma_re = re.compile(r",(?=\s*[\]}])")
+_fence_re = re.compile(r"```(?:json)?")
+_ws_re = re.compile(r"\s*")
+_number_re = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?")
+_next_re = re.compile(r"[{\]]")
+_LITERALS = (("true", True), ("false", False), ("null", None))
+
+
+class _Truncated(Exception):
+    def __init__(self, partial=None):
+        self.partial = partial
+
+
+class _Malformed(Exception):
+    def __init__(self, pos):
+        self.pos = pos
+
+
+def _value(text, pos):
+    pos = _ws_re.match(text, pos).end()
+    if pos >= len(text):
+        raise _Truncated()
+    ch = text[pos]
+    if ch == "{":
+        return _object(text, pos + 1)
+    if ch == "[":
+        return _array(text, pos + 1)
+    if ch == '"':
+        return _string(text, pos + 1)
+    match = _number_re.match(text, pos)
+    if match:
+        if match.end() == len(text):
+            raise _Truncated()  # digits may have been cut off
+        return json.loads(match.group()), match.end()
+    for word, value in _LITERALS:
+        if text.startswith(word, pos):
+            return value, pos + len(word)
+        if word.startswith(text[pos:]):
+            raise _Truncated()
+    raise _Malformed(pos)
+
+
+def _string(text, pos):
+    try:
+        return scanstring(text, pos)
+    except ValueError:
+        if text.find('"', pos) == -1:
+            raise _Truncated()
+        raise _Malformed(pos)
+
+
+def _object(text, pos):
+    obj = {}
+    while True:
+        pos = _ws_re.match(text, pos).end()
+        if pos >= len(text):
+            raise _Truncated(obj)
+        ch = text[pos]
+        if ch == "}":
+            return obj, pos + 1
+        if ch == ",":
+            pos += 1
+            continue
+        if ch != '"':
+            raise _Malformed(pos)
+        try:
+            key, pos = _string(text, pos + 1)
+        except _Truncated:
+            raise _Truncated(obj)
+        pos = _ws_re.match(text, pos).end()
+        if pos >= len(text):
+            raise _Truncated(obj)
+        if text[pos] != ":":
+            raise _Malformed(pos)
+        try:
+            obj[key], pos = _value(text, pos + 1)
+        except _Truncated as e:
+            if e.partial is not None:
+                obj[key] = e.partial
+            raise _Truncated(obj)
+
+
+def _array(text, pos):
+    arr = []
+    while True:
+        pos = _ws_re.match(text, pos).end()
+        if pos >= len(text):
+            raise _Truncated(arr)
+        ch = text[pos]
+        if ch == "]":
+            return arr, pos + 1
+        if ch == ",":
+            pos += 1
+            continue
+        try:
+            value, pos = _value(text, pos)
+        except _Truncated as e:
+            if e.partial is not None:
+                arr.append(e.partial)
+            raise _Truncated(arr)
+        arr.append(value)
+
+
+def _loads_relaxed(raw):
+    # json.loads with trailing commas allowed; anything else broken goes to _tolerant_item
+    try:
+        return json.loads(_trailing_comma_re.sub("", raw))
+    except ValueError:
+        return _tolerant_item(raw)
+
+
+def _whole_array(text):
+    # Fast path: the outermost [...] decodes in one call as a list of objects
+    if "```" in text:
+        text = _fence_re.sub("", text)
+    start = text.find("[")
+    end = text.rfind("]")
+    if start == -1 or end < start:
+        return None
+    raw = text[start:end + 1]
+    try:
+        items = json.loads(raw)
+    except ValueError:
+        try:
+            items = json.loads(_trailing_comma_re.sub("", raw))
+        except ValueError:
+            return None
+    if isinstance(items, list) and items and all(isinstance(item, dict) for item in items):
+        return items
+    return None
+
+
+def _tolerant_item(raw):
+    # One object's text (e.g. from the stream parser) -> dict, or None
+    try:
+        return _object(raw, raw.index("{") + 1)[0]
+    except _Truncated as e:
+        return e.partial
+    except (_Malformed, ValueError):
+        return None
+
+
+def parse_json_array(text):
+    # Items of the first JSON array in `text` that holds any objects.
+    # Returns (items, complete); a truncated last object is included as far as
+    # it got, so callers must validate items before using them.
+    items = _whole_array(text)
+    if items is not None:
+        return items, True
+    start = text.find("[")
+    while start != -1:
+        items = []
+        pos = start + 1
+        while True:
+            match = _next_re.search(text, pos)
+            if match is None:
+                return items, False
+            pos = match.start()
+            if text[pos] == "]":
+                break
+            try:
+                item, pos = _decoder.raw_decode(text, pos)
+            except ValueError:
+                try:
+                    item, pos = _object(text, pos + 1)
+                except _Truncated as e:
+                    items.append(e.partial)
+                    return items, False
+                except _Malformed as e:
+                    pos = e.pos + 1  # skip the broken object, resync on the next one
+                    continue
+            items.append(item)
+        if items:
+            return items, True
+        start = text.find("[", pos + 1)  # e.g. "[10 questions]" in prose before the JSON
+    return [], False
+
+
+def parse_json_object(text):
+    # First JSON object in `text`, tolerating the same damage; {} if none
+    start = text.find("{")
+    if start == -1:
+        return {}
+    try:
+        return _decoder.raw_decode(text, start)[0]
+    except ValueError:
+        pass
+    try:
+        return _object(text, start + 1)[0]
+    except _Truncated as e:
+        return e.partial
+    except _Malformed:
+        return {}
+
+
+# ---- Quiz / flashcard schema ----
+
+# A bare option letter: "B", "(B)", "B)", "B." or "B:", optionally followed by the option text
+_answer_re = re.compile(r"^\(?([A-Za-z])(?:\)?$|[.):](?:\s|$))")
+
+
+def clean_question(item):
+    # Normalised question dict, or None if it isn't a usable question
+    if not isinstance(item, dict):
+        return None
+    question = item.get("question")
+    options = item.get("options")
+    answer = item.get("answer")
+    if not isinstance(question, str) or not question.strip():
+        return None
+    if isinstance(options, list):
+        options = {"ABCDEFGH"[i]: opt for i, opt in enumerate(options[:8])}
+    if not isinstance(options, dict) or len(options) < 2:
+        return None
+    options = {str(k).strip(): v for k, v in options.items() if isinstance(v, (str, int, float))}
+    if len(options) < 2 or answer is None:
+        return None
+    answer = str(answer).strip()
+    if answer not in options:
+        # The answer spelled out as the option text wins over a leading letter,
+        # so "A nucleus" is the option that says so, not option A
+        spelled = next((k for k, v in options.items() if str(v).strip().lower() == answer.lower()), None)
+        if spelled is None:
+            match = _answer_re.match(answer)
+            spelled = match.group(1).upper() if match else None
+        if spelled not in options:
+            return None
+        answer = spelled
+    return dict(item, question=question.strip(), options=options, answer=answer)
+
+
+def clean_flashcard(item):
+    if not isinstance(item, dict):
+        return None
+    question = item.get("question")
+    answer = item.get("answer")
+    if not isinstance(question, str) or not isinstance(answer, str) or not question.strip() or not answer.strip():
+        return None
+    return dict(item, question=question.strip(), answer=answer.strip())
+
+
+def parse_quiz_items(text):
+    items, _ = parse_json_array(text)
+    return [q for q in map(clean_question, items) if q is not None]
+
+
+def parse_flashcard_items(text):
+    items, _ = parse_json_array(text)
+    return [c for c in map(clean_flashcard, items) if c is not None]
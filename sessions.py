@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+# --- Server-side sessions ---
+# The cookie carries only a random session id; the data lives in a store.
+#   memory: in-process LRU (single worker / dev)
+#   sqlite: SQLite table shared by every worker, fronted by a short-lived
+#           per-process LRU so most requests never touch the database
+# Stores expose get/set/delete, so another backend (e.g. Redis) only has to
+# implement those three. Expiry is sliding: a session used within the TTL
+# is kept, one left idle longer is dropped.
+
+
+class MemorySessionStore:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sid -> (data, expires)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return entry
+
+    def set(self, sid, data, expires):
+        with self._lock:
+            self._entries[sid] = (data, expires)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+
+class SqliteSessionStore:
+    PRUNE_EVERY = 500  # drop expired rows every N writes
+
+    def __init__(self, path, local_entries=10000, local_ttl=5):
+        # local_ttl bounds how long another worker's logout can go unnoticed here
+        self.path = path
+        self.local_ttl = local_ttl
+        self._local_cache = MemorySessionStore(local_entries) if local_ttl > 0 else None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS session ("
+            " sid TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " expires REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_session_expires ON session(expires)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        if self._local_cache is not None:
+            cached = self._local_cache.get(sid)
+            if cached is not None:
+                return cached[0]
+        row = self._conn().execute(
+            "SELECT data, expires FROM session WHERE sid = ? AND expires >= ?", (sid, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1])
+        self._remember(sid, entry)
+        return entry
+
+    def set(self, sid, data, expires):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO session (sid, data, expires) VALUES (?, ?, ?)",
+            (sid, json.dumps(data), expires)
+        )
+        conn.commit()
+        self._remember(sid, (data, expires))
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def delete(self, sid):
+        conn = self._conn()
+        conn.execute("DELETE FROM session WHERE sid = ?", (sid,))
+        conn.commit()
+        if self._local_cache is not None:
+            self._local_cache.delete(sid)
+
+    def _remember(self, sid, entry):
+        # The local copy expires after local_ttl, whatever the session's own expiry
+        if self._local_cache is not None:
+            self._local_cache.set(sid, entry, min(entry[1], time.time() + self.local_ttl))
+
+    def prune(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM session WHERE expires < ?", (time.time(),))
+        conn.commit()
+
+
+def create_session_store(backend, path, max_entries=10000, local_ttl=5):
+    if backend == "memory":
+        return MemorySessionStore(max_entries)
+    if backend == "sqlite":
+        return SqliteSessionStore(path, max_entries, local_ttl)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, sid, data=None, expires=0.0, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(data, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.new = new
+        self.modified = False
+        self.rotated_from = None
+
+    def set_unsaved(self, key, value):
+        # Visible to this request only; stored only if something else changes the session
+        dict.__setitem__(self, key, value)
+
+    def regenerate(self):
+        # New id on login, so an id issued before authentication is never reused
+        if self.sid is not None:
+            self.rotated_from = self.sid
+            self.sid = None
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store, ttl_seconds=7 * 24 * 3600, skip_prefixes=()):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        # Requests under these paths (static assets) get an empty session with no store lookup
+        self.skip_prefixes = tuple(skip_prefixes)
+
+    def open_session(self, app, request):
+        if self.skip_prefixes and request.path.startswith(self.skip_prefixes):
+            return ServerSession(None, new=True)
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and len(sid) <= 64:
+            entry = self.store.get(sid)
+            if entry is not None:
+                return ServerSession(sid, entry[0], entry[1])
+        return ServerSession(None, new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if session.rotated_from:
+            self.store.delete(session.rotated_from)
+        if not session:
+            if session.modified and (session.sid or session.rotated_from):
+                if session.sid:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add("Cookie")
+            return
+
+        if session.sid is None and not session.modified:
+            return  # nothing but set_unsaved values (e.g. AUTO_LOGIN); no row, no cookie
+
+        now = time.time()
+        # Unchanged sessions are only rewritten once half their TTL has passed
+        refresh = session.expires - now < self.ttl_seconds / 2
+        if not (session.modified or refresh):
+            return
+
+        new_cookie = session.sid is None
+        if new_cookie:
+            session.sid = secrets.token_urlsafe(32)
+        session.expires = now + self.ttl_seconds
+        self.store.set(session.sid, dict(session), session.expires)
+        if new_cookie or refresh or session.permanent:
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite)
+            response.vary.add("Cookie")
@@ -101,7 +101,7 @@ document.addEventListener("DOMContentLoaded", () => {
       const data = await res.json();
       if (!res.ok) return setStatus(data.error || "Quiz generation failed", true);
 
-      buildQuizUI(data.quiz.questions);
+      buildQuizUI(data.quiz.questions, data.quiz_id);
       setStatus("Quiz ready!");
       smoothScrollTo(quizSection);
     } catch (err) {
@@ -109,7 +109,7 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   });
 
-  function buildQuizUI(questions) {
+  function buildQuizUI(questions, quizId) {
     quizForm.innerHTML = "";
     questions.forEach((q, idx) => {
       const div = document.createElement("div");
@@ -129,20 +129,21 @@ document.addEventListener("DOMContentLoaded", () => {
     const submitBtn = document.createElement("button");
     submitBtn.textContent = "Submit Quiz";
     submitBtn.type = "button";
-    submitBtn.addEventListener("click", () => checkAnswers(questions));
+    submitBtn.addEventListener("click", () => checkAnswers(questions, quizId));
     quizForm.appendChild(submitBtn);
   }
 
-  function checkAnswers(questions) {
-    let score = 0;
-    questions.forEach((q, idx) => {
+  function checkAnswers(questions, quizId) {
+    const answers = questions.map((q, idx) => {
       const selected = document.querySelector(`input[name="q${idx}"]:checked`);
-      if (selected && selected.value === q.answer) {
-        score++;
-      }
+      return selected ? selected.value : null;
     });
-    animateScore(score, questions.length);
-    saveQuizResult(score, questions.length, questions); // auto-save after scoring
+    if (!quizId) {
+      // Not logged in: nothing is saved, so score locally
+      const score = answers.filter((a, idx) => a === questions[idx].answer).length;
+      return animateScore(score, questions.length);
+    }
+    submitAttempt(quizId, answers);
   }
 
   function animateScore(score, total) {
@@ -164,22 +165,24 @@ document.addEventListener("DOMContentLoaded", () => {
     }, 100);
   }
 
-  async function saveQuizResult(score, total, questions) {
+  // Graded on the server against the stored answer key
+  async function submitAttempt(quizId, answers) {
     try {
-      const res = await fetch("/save_quiz", {
+      const res = await fetch("/save_attempt", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ score, total, questions }),
+        body: JSON.stringify({ quiz_id: quizId, answers }),
       });
 
       const data = await res.json();
       if (!res.ok) {
-        console.error("Error saving quiz:", data.error || "Unknown error");
+        setStatus(data.error || "Could not save your answers", true);
       } else {
-        console.log("Quiz saved successfully:", data);
+        animateScore(data.attempt.score, data.attempt.total);
       }
     } catch (err) {
-      console.error("Network error while saving quiz:", err);
+      console.error("Network error while saving attempt:", err);
+      setStatus("An error occurred while saving your answers.", true);
     }
   }
 
@@ -0,0 +1,626 @@
+import os
+import json
+import sqlite3
+import datetime
+import threading
+
+# --- SQLite repository for users, quizzes and leaderboard entries ---
+# One connection per thread, WAL journal so several gunicorn workers can read
+# while one writes. Schema is created idempotently on startup.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user (
+    id INTEGER NOT NULL,
+    email VARCHAR(120) NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    password_hash VARCHAR(256) NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (email)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_user_email_lower ON user (lower(email));
+
+CREATE TABLE IF NOT EXISTS quiz (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES user (id),
+    date TEXT NOT NULL,
+    score INTEGER,
+    total INTEGER,
+    summary TEXT,
+    questions TEXT,
+    flashcards TEXT,
+    difficulty TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_quiz_user_date ON quiz (user_id, date);
+CREATE INDEX IF NOT EXISTS ix_quiz_user_id ON quiz (user_id, id);
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES user (id),
+    quizzes INTEGER NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    question_sum INTEGER NOT NULL DEFAULT 0,
+    best_score INTEGER,
+    streak INTEGER NOT NULL DEFAULT 0,
+    best_streak INTEGER NOT NULL DEFAULT 0,
+    last_day TEXT,
+    by_difficulty TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE TABLE IF NOT EXISTS leaderboard (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    name TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_leaderboard_score ON leaderboard (score DESC, date DESC);
+CREATE INDEX IF NOT EXISTS ix_leaderboard_date ON leaderboard (date);
+
+CREATE TABLE IF NOT EXISTS leaderboard_best (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_leaderboard_best_score ON leaderboard_best (score DESC, date DESC);
+
+CREATE TABLE IF NOT EXISTS document (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    text_hash TEXT NOT NULL,
+    minhash BLOB NOT NULL,
+    difficulty TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    questions TEXT NOT NULL,
+    flashcards TEXT,
+    created TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_document_text_hash ON document (text_hash);
+
+CREATE TABLE IF NOT EXISTS question (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    question_hash TEXT NOT NULL,
+    body TEXT NOT NULL,
+    created TEXT NOT NULL,
+    UNIQUE (source, difficulty, question_hash)
+);
+
+CREATE TABLE IF NOT EXISTS batch (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER,
+    difficulty TEXT NOT NULL,
+    created TEXT NOT NULL,
+    provider_ref TEXT
+);
+
+CREATE TABLE IF NOT EXISTS batch_item (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL REFERENCES batch (id),
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    error TEXT,
+    quiz_id INTEGER,
+    document_id INTEGER,
+    updated TEXT,
+    UNIQUE (batch_id, name)
+);
+CREATE INDEX IF NOT EXISTS ix_batch_item_status ON batch_item (batch_id, status, id);
+
+CREATE TABLE IF NOT EXISTS attempt (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES user (id),
+    quiz_id INTEGER NOT NULL REFERENCES quiz (id),
+    date TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    answers TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_attempt_quiz ON attempt (quiz_id, id);
+
+CREATE TABLE IF NOT EXISTS question_stats (
+    question_hash TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+QUIZ_FIELDS = ("id", "date", "score", "total", "difficulty", "summary", "questions", "flashcards")
+
+
+class DuplicateEmail(Exception):
+    pass
+
+
+class Storage:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        columns = [r["name"] for r in conn.execute("PRAGMA table_info(quiz)")]
+        if "flashcards" not in columns:
+            conn.execute("ALTER TABLE quiz ADD COLUMN flashcards TEXT")
+        if "difficulty" not in columns:
+            conn.execute("ALTER TABLE quiz ADD COLUMN difficulty TEXT")
+        # Backfill per-user bests for databases created before the table existed
+        if conn.execute("SELECT 1 FROM leaderboard_best LIMIT 1").fetchone() is None:
+            conn.execute(
+                "INSERT OR IGNORE INTO leaderboard_best (user_id, name, score, total, date)"
+                " SELECT user_id, name, score, total, date FROM leaderboard"
+                " WHERE user_id IS NOT NULL ORDER BY score DESC, date DESC"
+            )
+        # Same for running dashboard stats: replay scored quizzes once
+        if conn.execute("SELECT 1 FROM user_stats LIMIT 1").fetchone() is None:
+            for row in conn.execute(
+                "SELECT user_id, date, score, total, difficulty FROM quiz WHERE score IS NOT NULL ORDER BY id"
+            ).fetchall():
+                self._update_stats(conn, row["user_id"], row["date"], row["score"], row["total"], row["difficulty"])
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    # ---- Users ----
+    @staticmethod
+    def _user(row):
+        if row is None:
+            return None
+        return {"id": row["id"], "name": row["name"], "email": row["email"], "password": row["password_hash"]}
+
+    def get_user(self, user_id):
+        if user_id is None:
+            return None
+        row = self._conn().execute("SELECT * FROM user WHERE id = ?", (user_id,)).fetchone()
+        return self._user(row)
+
+    def get_user_by_email(self, email):
+        row = self._conn().execute("SELECT * FROM user WHERE lower(email) = lower(?)", (email,)).fetchone()
+        return self._user(row)
+
+    def create_user(self, name, email, password_hash):
+        conn = self._conn()
+        try:
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO user (email, name, password_hash) VALUES (?, ?, ?)",
+                    (email, name, password_hash)
+                )
+        except sqlite3.IntegrityError:
+            raise DuplicateEmail(email)
+        return self.get_user(cur.lastrowid)
+
+    def has_users(self):
+        return self._conn().execute("SELECT 1 FROM user LIMIT 1").fetchone() is not None
+
+    def seed_user(self, user_id, name, email, password_hash):
+        # Dev convenience: only seeds an empty database
+        conn = self._conn()
+        with conn:
+            if conn.execute("SELECT 1 FROM user LIMIT 1").fetchone() is None:
+                conn.execute(
+                    "INSERT INTO user (id, email, name, password_hash) VALUES (?, ?, ?, ?)",
+                    (user_id, email, name, password_hash)
+                )
+
+    # ---- Quizzes ----
+    @staticmethod
+    def _quiz(row):
+        if row is None:
+            return None
+        record = {"id": row["id"], "date": row["date"]}
+        for field in ("score", "total", "summary", "difficulty"):
+            if row[field] is not None:
+                record[field] = row[field]
+        record["questions"] = json.loads(row["questions"]) if row["questions"] else []
+        if row["flashcards"]:
+            record["flashcards"] = json.loads(row["flashcards"])
+        return record
+
+    def add_quiz(self, user_id, date, questions, summary=None, score=None, total=None, flashcards=None,
+                 difficulty=None):
+        conn = self._conn()
+        with conn:
+            if score is not None:
+                # Stats are read-modify-write; take the write lock up front
+                conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute(
+                "INSERT INTO quiz (user_id, date, score, total, summary, questions, flashcards, difficulty)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, date, score, total, summary, json.dumps(questions),
+                 json.dumps(flashcards) if flashcards else None, difficulty)
+            )
+            if score is not None:
+                self._update_stats(conn, user_id, date, score, total, difficulty)
+        return self.get_quiz(user_id, cur.lastrowid)
+
+    def get_quiz(self, user_id, quiz_id):
+        row = self._conn().execute(
+            "SELECT * FROM quiz WHERE id = ? AND user_id = ?", (quiz_id, user_id)
+        ).fetchone()
+        return self._quiz(row)
+
+    def latest_quiz(self, user_id):
+        row = self._conn().execute(
+            "SELECT * FROM quiz WHERE user_id = ? ORDER BY id DESC LIMIT 1", (user_id,)
+        ).fetchone()
+        return self._quiz(row)
+
+    def latest_summary(self, user_id):
+        row = self._conn().execute(
+            "SELECT summary FROM quiz WHERE user_id = ? AND summary IS NOT NULL ORDER BY id DESC LIMIT 1",
+            (user_id,)
+        ).fetchone()
+        return row["summary"] if row else None
+
+    def find_flashcards(self, user_id, summary):
+        row = self._conn().execute(
+            "SELECT flashcards FROM quiz WHERE user_id = ? AND summary = ? AND flashcards IS NOT NULL"
+            " ORDER BY id DESC LIMIT 1",
+            (user_id, summary)
+        ).fetchone()
+        return json.loads(row["flashcards"]) if row else None
+
+    def list_quizzes(self, user_id, fields=QUIZ_FIELDS, limit=20, before_id=None):
+        # Newest first, one page at a time; only the requested columns are read.
+        # Returns (records, next_cursor) where the cursor is the last id returned.
+        columns = [f for f in QUIZ_FIELDS if f in fields or f == "id"]
+        sql = f"SELECT {', '.join(columns)} FROM quiz WHERE user_id = ?"
+        params = [user_id]
+        if before_id is not None:
+            sql += " AND id < ?"
+            params.append(before_id)
+        rows = self._conn().execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit + 1]).fetchall()
+        records = []
+        for row in rows[:limit]:
+            record = {}
+            for field in columns:
+                value = row[field]
+                if field in ("questions", "flashcards"):
+                    value = json.loads(value) if value else ([] if field == "questions" else None)
+                if field in fields:
+                    record[field] = value
+            records.append(record)
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return records, next_cursor
+
+    # ---- Running dashboard stats (updated as scored quizzes are saved) ----
+    @staticmethod
+    def _update_stats(conn, user_id, date, score, total, difficulty):
+        row = conn.execute("SELECT * FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            stats = {"quizzes": 0, "score_sum": 0, "question_sum": 0, "best_score": None,
+                     "streak": 0, "best_streak": 0, "last_day": None, "by_difficulty": {}}
+        else:
+            stats = dict(row)
+            stats["by_difficulty"] = json.loads(row["by_difficulty"])
+        total = total or 0
+        stats["quizzes"] += 1
+        stats["score_sum"] += score
+        stats["question_sum"] += total
+        stats["best_score"] = score if stats["best_score"] is None else max(stats["best_score"], score)
+
+        # Streak of consecutive days with at least one quiz
+        day = date[:10]
+        last_day = stats["last_day"]
+        if last_day is None or day > last_day:
+            yesterday = (datetime.date.fromisoformat(day) - datetime.timedelta(days=1)).isoformat()
+            stats["streak"] = stats["streak"] + 1 if last_day == yesterday else 1
+            stats["last_day"] = day
+        stats["best_streak"] = max(stats["best_streak"], stats["streak"])
+
+        if difficulty:
+            bucket = stats["by_difficulty"].setdefault(difficulty, {"correct": 0, "total": 0, "quizzes": 0})
+            bucket["correct"] += score
+            bucket["total"] += total
+            bucket["quizzes"] += 1
+
+        conn.execute(
+            "INSERT OR REPLACE INTO user_stats (user_id, quizzes, score_sum, question_sum, best_score,"
+            " streak, best_streak, last_day, by_difficulty) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, stats["quizzes"], stats["score_sum"], stats["question_sum"], stats["best_score"],
+             stats["streak"], stats["best_streak"], stats["last_day"], json.dumps(stats["by_difficulty"]))
+        )
+
+    def get_user_stats(self, user_id, today=None):
+        row = self._conn().execute("SELECT * FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return {"total_quizzes": 0, "average_score": 0, "accuracy": 0, "best_score": 0,
+                    "current_streak": 0, "best_streak": 0, "by_difficulty": {}}
+        # The stored streak only counts while it reaches today or yesterday
+        today = today or datetime.date.today()
+        streak = row["streak"] if row["last_day"] >= (today - datetime.timedelta(days=1)).isoformat() else 0
+        by_difficulty = {
+            name: dict(b, accuracy=round(b["correct"] / b["total"], 4) if b["total"] else 0)
+            for name, b in json.loads(row["by_difficulty"]).items()
+        }
+        return {
+            "total_quizzes": row["quizzes"],
+            "average_score": round(row["score_sum"] / row["quizzes"], 2),
+            "accuracy": round(row["score_sum"] / row["question_sum"], 4) if row["question_sum"] else 0,
+            "best_score": row["best_score"],
+            "current_streak": streak,
+            "best_streak": row["best_streak"],
+            "by_difficulty": by_difficulty
+        }
+
+    # ---- Leaderboard ----
+    # Reads walk the (score DESC, date DESC) indexes and stop after `limit`
+    # rows, so the board is never re-sorted as it grows.
+    @staticmethod
+    def _add_leaderboard_entry(conn, user_id, name, score, total, date):
+        conn.execute(
+            "INSERT INTO leaderboard (user_id, name, score, total, date) VALUES (?, ?, ?, ?, ?)",
+            (user_id, name, score, total, date)
+        )
+        if user_id is not None:
+            conn.execute(
+                "INSERT INTO leaderboard_best (user_id, name, score, total, date) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (user_id) DO UPDATE SET"
+                " name = excluded.name, score = excluded.score, total = excluded.total, date = excluded.date"
+                " WHERE excluded.score > leaderboard_best.score",
+                (user_id, name, score, total, date)
+            )
+
+    def top_scores(self, limit=20, since=None):
+        if since is None:
+            rows = self._conn().execute(
+                "SELECT name, score, total, date FROM leaderboard ORDER BY score DESC, date DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        else:
+            rows = self._conn().execute(
+                "SELECT name, score, total, date FROM leaderboard WHERE date >= ?"
+                " ORDER BY score DESC, date DESC LIMIT ?",
+                (since, limit)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def top_user_bests(self, limit=20, since=None):
+        if since is None:
+            rows = self._conn().execute(
+                "SELECT name, score, total, date FROM leaderboard_best ORDER BY score DESC, date DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        else:
+            # Period boards only aggregate the entries inside the period
+            rows = self._conn().execute(
+                "SELECT name, MAX(score) AS score, total, date FROM leaderboard"
+                " WHERE date >= ? AND user_id IS NOT NULL GROUP BY user_id"
+                " ORDER BY score DESC, date DESC LIMIT ?",
+                (since, limit)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def leaderboard_version(self):
+        # Entries are append-only, so the newest row id identifies the board state
+        row = self._conn().execute(
+            "SELECT id, date FROM leaderboard ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        return (row["id"], row["date"]) if row else (0, None)
+
+    # ---- Attempts (append-only) and per-question stats ----
+    def save_attempts(self, attempts):
+        # One transaction for a whole batch from the attempt writer.
+        # attempts: [{user_id, name, quiz_id, date, score, total, difficulty, graded: [(hash, chosen, correct)]}]
+        # The first attempt at a quiz scores it (history, stats, leaderboard);
+        # later attempts are logged and only feed the question stats.
+        deltas = {}
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO attempt (user_id, quiz_id, date, score, total, answers) VALUES (?, ?, ?, ?, ?, ?)",
+                [(a["user_id"], a["quiz_id"], a["date"], a["score"], a["total"],
+                  json.dumps([[chosen, correct] for _, chosen, correct in a["graded"]])) for a in attempts]
+            )
+            for a in attempts:
+                scored = conn.execute(
+                    "UPDATE quiz SET score = ?, total = ? WHERE id = ? AND score IS NULL",
+                    (a["score"], a["total"], a["quiz_id"])
+                ).rowcount
+                if scored:
+                    self._update_stats(conn, a["user_id"], a["date"], a["score"], a["total"], a["difficulty"])
+                    self._add_leaderboard_entry(conn, a["user_id"], a["name"], a["score"], a["total"], a["date"])
+                for question_hash, _, correct in a["graded"]:
+                    d = deltas.setdefault(question_hash, [0, 0])
+                    d[0] += 1
+                    d[1] += correct
+            conn.executemany(
+                "INSERT INTO question_stats (question_hash, attempts, correct) VALUES (?, ?, ?)"
+                " ON CONFLICT (question_hash) DO UPDATE SET"
+                " attempts = attempts + excluded.attempts, correct = correct + excluded.correct",
+                [(h, n, c) for h, (n, c) in deltas.items()]
+            )
+
+    def first_attempt_answers(self, user_id, quiz_ids):
+        # The attempt that scored each quiz -> [chosen option per graded question]
+        ids = list(quiz_ids)
+        if not ids:
+            return {}
+        rows = self._conn().execute(
+            "SELECT quiz_id, answers FROM attempt WHERE id IN ("
+            " SELECT MIN(id) FROM attempt WHERE user_id = ? AND quiz_id IN (%s) GROUP BY quiz_id)"
+            % ",".join("?" * len(ids)),
+            [user_id] + ids
+        ).fetchall()
+        return {r["quiz_id"]: [chosen for chosen, _ in json.loads(r["answers"])] for r in rows}
+
+    def question_stats(self, question_hashes):
+        hashes = list(question_hashes)
+        if not hashes:
+            return {}
+        rows = self._conn().execute(
+            f"SELECT * FROM question_stats WHERE question_hash IN ({', '.join('?' * len(hashes))})", hashes
+        ).fetchall()
+        return {
+            r["question_hash"]: {"attempts": r["attempts"], "correct": r["correct"],
+                                 "p_correct": round(r["correct"] / r["attempts"], 4) if r["attempts"] else None}
+            for r in rows
+        }
+
+    # ---- Documents (processed uploads, reused for near-duplicates) ----
+    def add_document(self, text_hash, minhash, difficulty, summary, questions, flashcards, created):
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO document (text_hash, minhash, difficulty, summary, questions, flashcards, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (text_hash, bytes(minhash), difficulty, summary, json.dumps(questions),
+                 json.dumps(flashcards) if flashcards else None, created)
+            )
+        return cur.lastrowid
+
+    def get_document(self, doc_id):
+        row = self._conn().execute("SELECT * FROM document WHERE id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "difficulty": row["difficulty"],
+            "summary": row["summary"],
+            "questions": json.loads(row["questions"]),
+            "flashcards": json.loads(row["flashcards"]) if row["flashcards"] else None
+        }
+
+    def iter_document_signatures(self, after_id=0):
+        # Streams (id, minhash) for rebuilding / catching up the in-memory LSH index
+        cur = self._conn().execute(
+            "SELECT id, minhash FROM document WHERE id > ? ORDER BY id", (after_id,)
+        )
+        for row in cur:
+            yield row["id"], row["minhash"]
+
+    # ---- Question bank (shared across users, per source text + difficulty) ----
+    def add_bank_questions(self, source, difficulty, questions, created):
+        # questions: [(question_hash, question)]; already-banked hashes are ignored
+        conn = self._conn()
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO question (source, difficulty, question_hash, body, created)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(source, difficulty, h, json.dumps(q), created) for h, q in questions]
+            )
+            return conn.total_changes - before
+
+    def bank_questions(self, source, difficulty):
+        rows = self._conn().execute(
+            "SELECT body FROM question WHERE source = ? AND difficulty = ? ORDER BY id",
+            (source, difficulty)
+        ).fetchall()
+        return [json.loads(r["body"]) for r in rows]
+
+    # ---- Batch ingestion manifest (one row per input file, for resume) ----
+    def create_batch(self, batch_id, user_id, difficulty, items, created):
+        # Idempotent: re-registering a batch only adds files it didn't have
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO batch (id, user_id, difficulty, created) VALUES (?, ?, ?, ?)",
+                (batch_id, user_id, difficulty, created)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO batch_item (batch_id, name, path, updated) VALUES (?, ?, ?, ?)",
+                [(batch_id, name, path, created) for name, path in items]
+            )
+
+    def get_batch(self, batch_id):
+        row = self._conn().execute("SELECT * FROM batch WHERE id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        batch = dict(row)
+        batch["provider_ref"] = json.loads(row["provider_ref"]) if row["provider_ref"] else None
+        return batch
+
+    def set_batch_provider_ref(self, batch_id, ref):
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE batch SET provider_ref = ? WHERE id = ?", (json.dumps(ref), batch_id))
+
+    def pending_batch_items(self, batch_id, limit):
+        rows = self._conn().execute(
+            "SELECT id, name, path FROM batch_item WHERE batch_id = ? AND status = 'pending' ORDER BY id LIMIT ?",
+            (batch_id, limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def reset_failed_batch_items(self, batch_id):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE batch_item SET status = 'pending', error = NULL WHERE batch_id = ? AND status = 'failed'",
+                (batch_id,)
+            )
+
+    def batch_progress(self, batch_id):
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) AS n FROM batch_item WHERE batch_id = ? GROUP BY status", (batch_id,)
+        ).fetchall()
+        progress = {"pending": 0, "done": 0, "failed": 0}
+        progress.update({r["status"]: r["n"] for r in rows})
+        progress["total"] = sum(progress.values())
+        return progress
+
+    def batch_failures(self, batch_id, limit=50):
+        rows = self._conn().execute(
+            "SELECT name, error FROM batch_item WHERE batch_id = ? AND status = 'failed' ORDER BY id LIMIT ?",
+            (batch_id, limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def save_batch_results(self, user_id, results, failures, date):
+        # One transaction per window: quizzes, documents, banked questions and
+        # the manifest rows are written together, so a crash never leaves a
+        # file marked done without its results (or results without the mark).
+        # results: [{item_id, difficulty, summary, questions, flashcards, text_hash,
+        #            minhash, document_id (reused), bank_source, bank_questions}]
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for r in results:
+                quiz_id = None
+                if user_id is not None:
+                    quiz_id = conn.execute(
+                        "INSERT INTO quiz (user_id, date, summary, questions, flashcards, difficulty)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (user_id, date, r["summary"], json.dumps(r["questions"]),
+                         json.dumps(r["flashcards"]) if r["flashcards"] else None, r["difficulty"])
+                    ).lastrowid
+                document_id = r.get("document_id")
+                if document_id is None:
+                    document_id = conn.execute(
+                        "INSERT INTO document (text_hash, minhash, difficulty, summary, questions, flashcards, created)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (r["text_hash"], bytes(r["minhash"]), r["difficulty"], r["summary"],
+                         json.dumps(r["questions"]), json.dumps(r["flashcards"]) if r["flashcards"] else None, date)
+                    ).lastrowid
+                conn.executemany(
+                    "INSERT OR IGNORE INTO question (source, difficulty, question_hash, body, created)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    [(r["bank_source"], r["difficulty"], h, json.dumps(q), date) for h, q in r["bank_questions"]]
+                )
+                conn.execute(
+                    "UPDATE batch_item SET status = 'done', error = NULL, quiz_id = ?, document_id = ?, updated = ?"
+                    " WHERE id = ?",
+                    (quiz_id, document_id, date, r["item_id"])
+                )
+            conn.executemany(
+                "UPDATE batch_item SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                [(error, date, item_id) for item_id, error in failures]
+            )
@@ -0,0 +1,125 @@
+import re
+import zlib
+import contextvars
+
+# Optional: exact token counts when tiktoken is installed
+try:
+    import tiktoken
+    HAVE_TIKTOKEN = True
+except Exception:
+    HAVE_TIKTOKEN = False
+
+# --- Token-aware chunking + map-reduce summarization for large notes ---
+
+_encoding = None
+
+
+def count_tokens(text):
+    global _encoding
+    if HAVE_TIKTOKEN:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    # Rough estimate: ~4 characters per token for English prose
+    return (len(text) + 3) // 4
+
+
+def _hard_cut(text, max_tokens):
+    # Start from ~4 characters per token and halve the cut until the piece fits,
+    # so CJK or symbol-heavy text (far more tokens per character) stays in budget
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + max_tokens * 4)
+        while end - start > 1 and count_tokens(text[start:end]) > max_tokens:
+            end = start + (end - start) // 2
+        yield text[start:end]
+        start = end
+
+
+def _split_paragraphs(text, max_tokens):
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        if count_tokens(para) <= max_tokens:
+            yield para
+            continue
+        # Oversized paragraph: fall back to sentences, then hard character cuts
+        piece = []
+        size = 0
+        for sentence in re.split(r"(?<=[.!?])\s+", para):
+            tokens = count_tokens(sentence)
+            if tokens > max_tokens:
+                # Flush what came before so the hard cuts stay in document order
+                if piece:
+                    yield " ".join(piece)
+                    piece, size = [], 0
+                yield from _hard_cut(sentence, max_tokens)
+                continue
+            if piece and size + tokens > max_tokens:
+                yield " ".join(piece)
+                piece, size = [], 0
+            piece.append(sentence)
+            size += tokens
+        if piece:
+            yield " ".join(piece)
+
+
+def chunk_text(text, max_tokens=3000):
+    # Boundaries are content-defined: once a chunk is at least half full it is
+    # closed after any paragraph whose hash hits the boundary condition. An edit
+    # therefore only moves the boundaries around the edited section, and every
+    # other chunk keeps the same text (and the same cache key).
+    min_tokens = max_tokens // 2
+    chunks = []
+    current = []
+    size = 0
+    for para in _split_paragraphs(text, max_tokens):
+        tokens = count_tokens(para)
+        if current and size + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(para)
+        size += tokens
+        if size >= min_tokens and zlib.crc32(para.encode("utf-8")) % 4 == 0:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _in_context(fn):
+    # Run pool tasks with the caller's context vars (e.g. the current user)
+    ctx = contextvars.copy_context()
+    return lambda *args: ctx.copy().run(fn, *args)
+
+
+def map_reduce_summary(text, summarize_chunk, merge_summaries, executor, chunk_tokens=3000):
+    chunks = chunk_text(text, chunk_tokens)
+    if len(chunks) <= 1:
+        return summarize_chunk(text)
+
+    # Map: per-chunk summaries in parallel (executor bounds concurrency)
+    summaries = list(executor.map(_in_context(summarize_chunk), chunks))
+
+    # Reduce: merge groups that fit in one prompt until a single summary is left
+    while len(summaries) > 1:
+        groups = []
+        group = []
+        size = 0
+        for summary in summaries:
+            tokens = count_tokens(summary)
+            if group and size + tokens > chunk_tokens:
+                groups.append(group)
+                group, size = [], 0
+            group.append(summary)
+            size += tokens
+        groups.append(group)
+        if len(groups) == len(summaries):
+            # Every summary is already prompt-sized; merge pairwise to make progress
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        if len(groups) == 1:
+            return merge_summaries(groups[0])
+        summaries = list(executor.map(_in_context(lambda g: g[0] if len(g) == 1 else merge_summaries(g)), groups))
+    return summaries[0]
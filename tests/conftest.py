@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Everything the app writes goes to a throwaway directory; no model calls
+_workdir = tempfile.mkdtemp(prefix="notes2quiz-tests-")
+for _name, _path in (("DATABASE_PATH", "students.db"), ("CACHE_PATH", "cache.db"), ("SESSION_PATH", "sessions.db"),
+                     ("JOB_PATH", "jobs.db"), ("UPLOAD_FOLDER", "uploads"), ("EXPORT_FOLDER", "exports"),
+                     ("BATCH_FOLDER", "batches")):
+    os.environ[_name] = os.path.join(_workdir, _path)
+os.environ["LLM_BACKEND"] = "stub"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+@pytest.fixture()
+def client():
+    import app as notes2quiz
+
+    notes2quiz.create_app()
+    return notes2quiz.app.test_client()
@@ -0,0 +1,29 @@
+import app as notes2quiz
+import export
+
+QUESTIONS = [
+    {"question": "What is osmosis?", "options": {"A": "Water movement", "B": "Respiration"}, "answer": "A"},
+    {"question": "Where is ATP made?", "options": {"A": "Nucleus", "B": "Mitochondria"}, "answer": "B"},
+]
+
+
+def test_attempt_is_graded_on_the_server(client):
+    quiz_id = notes2quiz.storage.add_quiz(1, "2026-01-01T00:00:00", QUESTIONS)["id"]
+    response = client.post("/save_attempt", json={"quiz_id": quiz_id, "answers": ["A", "A"], "score": 2})
+    assert response.status_code == 200
+    attempt = response.get_json()["attempt"]
+    assert (attempt["score"], attempt["total"]) == (1, 2)
+
+
+def test_client_scored_save_route_is_gone(client):
+    assert client.post("/save_quiz", json={"score": 10, "total": 10, "questions": []}).status_code == 404
+
+
+def test_quiz_review_shows_answers_from_the_scoring_attempt(client, monkeypatch):
+    rendered = []
+    monkeypatch.setitem(export.RENDERERS, "quiz", lambda quiz: rendered.append(quiz) or b"%PDF")
+    quiz_id = notes2quiz.storage.add_quiz(1, "2026-01-01T00:00:00", QUESTIONS)["id"]
+    client.post("/save_attempt", json={"quiz_id": quiz_id, "answers": ["B", None]})
+    client.post("/save_attempt", json={"quiz_id": quiz_id, "answers": ["A", "B"]})
+    assert client.get(f"/download_quiz/{quiz_id}").status_code == 200
+    assert [q.get("user_answer") for q in rendered[-1]["questions"]] == ["B", None]
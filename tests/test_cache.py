@@ -0,0 +1,41 @@
+import cache as cache_module
+from cache import ResultCache, make_key
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def accessed(cache, key):
+    return cache._conn().execute("SELECT accessed FROM result_cache WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    cache = ResultCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+    key = make_key("quiz", "notes")
+    cache.set(key, {"questions": [1]}, "quiz")
+    clock.now += 59
+    assert cache.get(key) == {"questions": [1]}
+    clock.now += 2
+    assert cache.get(key) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_hits_touch_access_time_at_most_once_per_window(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    cache = ResultCache(str(tmp_path / "cache.db"), ttl_seconds=0, touch_seconds=300)
+    cache.set("k", "v")
+    written = accessed(cache, "k")
+    clock.now += 100
+    cache.get("k")
+    assert accessed(cache, "k") == written
+    clock.now += 201
+    cache.get("k")
+    assert accessed(cache, "k") == clock.now
@@ -0,0 +1,32 @@
+import os
+
+import export
+from export import PdfCache
+
+
+def fake_render(quiz):
+    return b"%PDF " + quiz["summary"].encode() * 100
+
+
+def test_edited_quiz_replaces_only_its_own_render(tmp_path, monkeypatch):
+    monkeypatch.setitem(export.RENDERERS, "summary", fake_render)
+    cache = PdfCache(str(tmp_path))
+    first = cache.get_or_render({"id": 1, "summary": "one"}, "summary")
+    other = cache.get_or_render({"id": 2, "summary": "two"}, "summary")
+    assert cache.get_or_render({"id": 1, "summary": "one"}, "summary") == first
+    edited = cache.get_or_render({"id": 1, "summary": "edited"}, "summary")
+    assert edited != first and not os.path.exists(first)
+    assert os.path.exists(other)
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_evict_drops_oldest_renders_over_the_size_cap(tmp_path, monkeypatch):
+    monkeypatch.setitem(export.RENDERERS, "summary", fake_render)
+    cache = PdfCache(str(tmp_path), max_bytes=1000)
+    paths = []
+    for n in range(5):
+        paths.append(cache.get_or_render({"id": n, "summary": "abc"}, "summary"))
+        os.utime(paths[-1], (n, n))
+    assert cache.evict() == 2
+    assert [os.path.exists(p) for p in paths] == [False, False, True, True, True]
+    assert not os.path.exists(os.path.dirname(paths[0]))
@@ -0,0 +1,24 @@
+import time
+
+from jobs import JobQueue, JobStore
+
+
+def test_job_status_visible_to_another_queue_on_the_same_store(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    running = JobQueue(max_workers=1, name="upload-job", store=JobStore(path))
+    other_worker = JobQueue(max_workers=1, name="upload-job", store=JobStore(path))
+
+    def work(job):
+        job.set_stage("generate")
+        return {"quiz_id": 7}
+
+    job = running.submit(work, owner=3)
+    for _ in range(100):
+        seen = other_worker.get(job.id)
+        if seen is not None and seen.status == "done":
+            break
+        time.sleep(0.01)
+    assert seen.owner == 3
+    assert seen.result == {"quiz_id": 7}
+    assert "generate" in seen.timings
+    assert JobQueue(name="export-job", store=JobStore(path)).get(job.id) is None
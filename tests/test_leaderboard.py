@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import app as notes2quiz
+
+QUESTIONS = [{"question": "What is osmosis?", "options": {"A": "Water movement", "B": "Respiration"}, "answer": "A"}]
+
+
+def record_score(name, score, date):
+    storage = notes2quiz.storage
+    user = storage.get_user_by_email(f"{name}@example.com") or storage.create_user(name, f"{name}@example.com", "x")
+    quiz = storage.add_quiz(user["id"], date, QUESTIONS)
+    storage.save_attempts([dict(user_id=user["id"], name=name, quiz_id=quiz["id"], date=date, score=score,
+                                total=10, difficulty="Easy", graded=[])])
+
+
+def names(client, query):
+    return [row["name"] for row in client.get(f"/leaderboard?limit=100&{query}").get_json()["leaderboard"]]
+
+
+def best_scores(client, query):
+    rows = client.get(f"/leaderboard?limit=100&board=best&{query}").get_json()["leaderboard"]
+    return {row["name"]: row["score"] for row in rows}
+
+
+def test_period_boards_only_count_entries_inside_the_period(client):
+    now = datetime.now()
+    record_score("lb-veteran", 10, (now - timedelta(days=40)).isoformat())
+    record_score("lb-veteran", 4, now.isoformat())
+    record_score("lb-newcomer", 7, now.isoformat())
+
+    assert "lb-veteran" in names(client, "period=all")
+    daily = names(client, "period=daily")
+    assert daily.index("lb-newcomer") < daily.index("lb-veteran")
+    assert best_scores(client, "period=daily")["lb-veteran"] == 4
+    assert best_scores(client, "period=all")["lb-veteran"] == 10
+
+
+def test_unchanged_board_answers_304_until_a_new_score_lands(client):
+    record_score("lb-etag", 5, datetime.now().isoformat())
+    first = client.get("/leaderboard")
+    etag = first.headers["ETag"]
+    assert client.get("/leaderboard", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/leaderboard?period=weekly", headers={"If-None-Match": etag}).status_code == 200
+
+    record_score("lb-etag", 6, datetime.now().isoformat())
+    again = client.get("/leaderboard", headers={"If-None-Match": etag})
+    assert again.status_code == 200 and again.headers["ETag"] != etag
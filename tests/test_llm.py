@@ -0,0 +1,94 @@
+import time
+import threading
+
+import pytest
+
+from llm import ModelGateway, RateLimited, StubBackend, StubError
+
+MESSAGES = [{"role": "user", "content": "Summarize the notes"}]
+
+
+class Flaky(StubBackend):
+    # Fails the first `failures` calls with the given status, then answers
+    def __init__(self, failures, status=429, **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.failures = failures
+        self.status = status
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise StubError(self.status)
+        return super().create(**kwargs)
+
+
+def gateway(backend, **kwargs):
+    kwargs = dict(dict(rate=1000, burst=100, user_rate=1000, user_burst=100, base_delay=0.001, max_delay=0.01,
+                       acquire_timeout=1), **kwargs)
+    return ModelGateway(backend, **kwargs)
+
+
+def call_in_threads(gw, n):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gw.chat(model="m", messages=MESSAGES)))
+               for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_identical_calls_in_flight_share_one_upstream_call():
+    gw = gateway(StubBackend(latency=0.2))
+    results = call_in_threads(gw, 4)
+    assert len(results) == 4 and all(r is results[0] for r in results)
+    assert gw.stats()["upstream"] == 1 and gw.stats()["coalesced"] == 3
+
+
+def test_followers_stop_waiting_after_the_flight_timeout():
+    gw = gateway(StubBackend(latency=0.5), max_retries=0, timeout=0, acquire_timeout=0, max_delay=0.05)
+    leader = threading.Thread(target=lambda: gw.chat(model="m", messages=MESSAGES))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(TimeoutError):
+        gw.chat(model="m", messages=MESSAGES)
+    leader.join()
+
+
+def test_429_is_retried_until_the_call_succeeds():
+    backend = Flaky(2)
+    gw = gateway(backend)
+    assert gw.chat(model="m", messages=MESSAGES).choices[0].message.content
+    assert backend.calls == 3 and gw.stats()["retries"] == 2
+
+
+def test_non_retryable_errors_are_raised_at_once():
+    backend = Flaky(1, status=400)
+    with pytest.raises(StubError):
+        gateway(backend).chat(model="m", messages=MESSAGES)
+    assert backend.calls == 1
+
+
+def test_retries_take_a_token_from_the_shared_bucket():
+    backend = Flaky(1)
+    gw = gateway(backend, rate=0.001, burst=1, acquire_timeout=0)
+    with pytest.raises(RateLimited):
+        gw.chat(model="m", messages=MESSAGES)
+    assert backend.calls == 1 and gw.stats()["rate_limited"] == 1
+
+
+def test_calls_wait_for_the_bucket_to_refill():
+    gw = gateway(StubBackend(latency=0), rate=10, burst=1)
+    gw.chat(model="m", messages=[{"role": "user", "content": "one"}])
+    start = time.monotonic()
+    gw.chat(model="m", messages=[{"role": "user", "content": "two"}])
+    assert time.monotonic() - start >= 0.08
+
+
+def test_calls_beyond_the_acquire_timeout_are_rate_limited():
+    gw = gateway(StubBackend(latency=0), rate=0.001, burst=1, acquire_timeout=0.01)
+    gw.chat(model="m", messages=[{"role": "user", "content": "one"}])
+    with pytest.raises(RateLimited):
+        gw.chat(model="m", messages=[{"role": "user", "content": "two"}])
@@ -0,0 +1,29 @@
+from parsing import JsonArrayStreamParser, clean_question, parse_json_array, parse_quiz_items
+
+QUESTION = '{"question": "Q%d?", "options": {"A": "a", "B": "b"}, "answer": "A"%s}'
+
+
+def test_trailing_commas_and_fences():
+    text = "```json\n[" + ",".join(QUESTION % (i, ",") for i in range(3)) + ",]\n```"
+    assert [q["question"] for q in parse_quiz_items(text)] == ["Q0?", "Q1?", "Q2?"]
+
+
+def test_truncated_reply_keeps_complete_items():
+    text = "[" + ",".join(QUESTION % (i, "") for i in range(3)) + ', {"question": "Q3'
+    items, complete = parse_json_array(text)
+    assert not complete
+    assert len(parse_quiz_items(text)) == 3
+
+
+def test_stream_parser_tolerates_trailing_comma():
+    parser = JsonArrayStreamParser()
+    items = parser.feed("[" + QUESTION % (0, ",") + ",")
+    assert items[0]["answer"] == "A"
+
+
+def test_answer_spelled_out_wins_over_leading_letter():
+    options = {"A": "Mitochondria", "B": "A nucleus"}
+    assert clean_question({"question": "Q?", "options": options, "answer": "A nucleus"})["answer"] == "B"
+    assert clean_question({"question": "Q?", "options": options, "answer": "(b)"})["answer"] == "B"
+    assert clean_question({"question": "Q?", "options": options, "answer": "A) Mitochondria"})["answer"] == "A"
+    assert clean_question({"question": "Q?", "options": options, "answer": "Apple"}) is None
@@ -0,0 +1,19 @@
+import re
+
+import app as notes2quiz
+
+
+def test_quiz_page_download_links_resolve(client):
+    questions = [{"question": "What is osmosis?", "options": {"A": "Water movement", "B": "Respiration"}, "answer": "A"}]
+    notes2quiz.storage.add_quiz(1, "2026-01-01T00:00:00", questions, summary="- osmosis moves water")
+
+    page = client.get("/quiz.html").get_data(as_text=True)
+    assert "{{" not in page
+    links = re.findall(r'data-href="([^"]+)"', page)
+    assert links == ["/download_summary/", "/download_quiz/"]
+
+    quiz_id = client.get("/api/quiz").get_json()["quiz_id"]
+    for link in links:
+        response = client.get(link + str(quiz_id))
+        assert response.status_code == 200
+        assert response.mimetype == "application/pdf"
@@ -0,0 +1,36 @@
+import app as notes2quiz
+
+
+def session_rows():
+    store = notes2quiz.app.session_interface.store
+    return store._conn().execute("SELECT COUNT(*) FROM session").fetchone()[0]
+
+
+def test_auto_login_does_not_store_a_session(client):
+    before = session_rows()
+    for _ in range(3):
+        response = client.get("/me")
+        assert response.get_json()["user"]["id"] == 1
+        assert "Set-Cookie" not in response.headers
+    assert session_rows() == before
+
+
+def session_cookie(client):
+    return client.get_cookie(notes2quiz.app.config["SESSION_COOKIE_NAME"]).value
+
+
+def test_login_rotates_the_session_id(client, monkeypatch):
+    monkeypatch.setattr(notes2quiz, "AUTO_LOGIN", False)
+    credentials = {"email": "rotate@example.com", "password": "correct horse"}
+    assert client.post("/signup", json=dict(credentials, name="Rotate")).status_code == 200
+    user_id = client.get("/me").get_json()["user"]["id"]
+    signup_sid = session_cookie(client)
+
+    assert client.post("/login", json=credentials).status_code == 200
+    login_sid = session_cookie(client)
+    assert login_sid != signup_sid
+    assert client.get("/me").get_json()["user"]["id"] == user_id
+
+    # The pre-login id no longer authenticates anyone
+    client.set_cookie(notes2quiz.app.config["SESSION_COOKIE_NAME"], signup_sid)
+    assert client.get("/me").get_json()["user"] is None
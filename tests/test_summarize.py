@@ -0,0 +1,25 @@
+import summarize
+from summarize import _split_paragraphs, chunk_text
+
+
+def test_oversized_sentence_keeps_document_order():
+    text = "Alpha first sentence. Beta second sentence. " + "X" * 200 + ". Omega last sentence."
+    pieces = list(_split_paragraphs(text, 10))
+    assert "".join(pieces).replace(" ", "") == text.replace(" ", "")
+    assert pieces[0].startswith("Alpha")
+    assert pieces[-1].endswith("Omega last sentence.")
+
+
+def test_chunks_keep_every_paragraph_in_order():
+    paragraphs = [f"Paragraph {i} about membranes and transport." for i in range(50)]
+    chunks = chunk_text("\n\n".join(paragraphs), max_tokens=40)
+    assert "\n\n".join(chunks).split("\n\n") == paragraphs
+
+
+def test_hard_cuts_respect_the_token_budget_for_dense_text(monkeypatch):
+    # CJK text runs at about a token per character, not four characters per token
+    monkeypatch.setattr(summarize, "count_tokens", len)
+    text = "细胞膜控制物质进出细胞" * 30
+    pieces = list(_split_paragraphs(text, 16))
+    assert "".join(pieces) == text
+    assert all(len(piece) <= 16 for piece in pieces)
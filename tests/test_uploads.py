@@ -0,0 +1,15 @@
+import os
+
+import app as notes2quiz
+
+
+def test_orphaned_spool_files_are_pruned(client, monkeypatch):
+    old = os.path.join(notes2quiz.UPLOAD_SPOOL_DIR, "upload-orphan.pdf")
+    fresh = os.path.join(notes2quiz.UPLOAD_SPOOL_DIR, "upload-live.pdf")
+    for path in (old, fresh):
+        with open(path, "wb") as f:
+            f.write(b"%PDF")
+    os.utime(old, (0, 0))
+    monkeypatch.setattr(notes2quiz, "_last_upload_prune", 0.0)
+    notes2quiz.maybe_prune_uploads()
+    assert not os.path.exists(old) and os.path.exists(fresh)
@@ -1,27 +1,84 @@
+import io
 import os
-import docx2txt
-from PyPDF2 import PdfReader
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt'}
 
+# PyPDF2 and docx2txt are imported on first extraction, so starting the app
+# (and routes that never parse a document) doesn't load them.
+
+# --- Parallel PDF extraction settings ---
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 32))
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _get_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # spawn, not fork: the web app is multi-threaded
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_pool
+
+def _extract_page_range(path, start, stop):
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+def iter_pdf_pages(source, workers=None):
+    # Yields (page_index, text) as pages finish; ranges complete out of order.
+    # `source` is a path or a seekable binary stream; streams are read in-process.
+    from PyPDF2 import PdfReader
+
+    workers = PDF_WORKERS if workers is None else workers
+    reader = PdfReader(source)
+    page_count = len(reader.pages)
+    if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES or not isinstance(source, str):
+        for i, page in enumerate(reader.pages):
+            yield i, page.extract_text() or ""
+        return
+
+    pool = _get_pdf_pool()
+    futures = [
+        pool.submit(_extract_page_range, source, start, min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    ]
+    try:
+        for future in as_completed(futures):
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+def extract_pdf_text(source, workers=None):
+    pages = {}
+    for i, page_text in iter_pdf_pages(source, workers):
+        pages[i] = page_text
+    return "".join(pages[i] + "\n" for i in sorted(pages) if pages[i])
+
 def extract_text_from_file(path, filename):
     ext = filename.rsplit('.', 1)[1].lower()
     if ext == 'pdf':
-        text = ""
         try:
-            reader = PdfReader(path)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+            return extract_pdf_text(path)
         except Exception as e:
             raise RuntimeError(f"PDF read error: {e}")
-        return text
     elif ext == 'docx':
         try:
+            import docx2txt
             text = docx2txt.process(path)
             return text or ""
         except Exception as e:
@@ -31,3 +88,45 @@ def extract_text_from_file(path, filename):
             return f.read()
     else:
         raise ValueError("Unsupported file type")
+
+def extract_text_from_stream(stream, filename):
+    # Parse an upload straight from its (seekable) request stream, no copy to disk.
+    # A stream backed by a named file on disk (large spooled PDFs) is passed by
+    # path so the parallel extractor can open it from the worker processes.
+    ext = filename.rsplit('.', 1)[1].lower()
+    stream.seek(0)
+    if ext == 'pdf':
+        name = getattr(stream, "name", None)
+        source = name if isinstance(name, str) and os.path.isfile(name) else stream
+        try:
+            return extract_pdf_text(source)
+        except Exception as e:
+            raise RuntimeError(f"PDF read error: {e}")
+    elif ext == 'docx':
+        try:
+            import docx2txt
+            return docx2txt.process(stream) or ""
+        except Exception as e:
+            raise RuntimeError(f"DOCX read error: {e}")
+    elif ext == 'txt':
+        reader = io.TextIOWrapper(stream, encoding='utf-8', errors='ignore')
+        try:
+            return reader.read()
+        finally:
+            reader.detach()  # leave the request stream open for its owner
+    else:
+        raise ValueError("Unsupported file type")
+
+def prune_old_files(folder, max_age_seconds):
+    # Retention policy for raw uploads: drop files older than max_age_seconds
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed